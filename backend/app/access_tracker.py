@@ -0,0 +1,200 @@
+# app/access_tracker.py
+
+import atexit
+import threading
+import time
+from datetime import datetime, timezone
+from flask import url_for
+from sqlalchemy import select, insert, update, func
+from app.db import db
+from app.models import TickerAccess
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class AccessTracker:
+    # Exponentially decayed request counts per (ticker, endpoint). Requests only touch
+    # an in-memory dict; a background thread merges the counts into ticker_access in
+    # batches, and every flush reloads the per-ticker totals all processes have written.
+    # A flush decays all rows of the tickers it touches to the same time, so a ticker's
+    # total is the plain sum of its rows
+
+    HALF_LIFE_HOURS = 168
+    FLUSH_INTERVAL = 60  # seconds
+    FLUSH_SIZE = 500  # pending (ticker, endpoint) pairs
+
+    def __init__(self, half_life_hours=None):
+        self.half_life = (half_life_hours or self.HALF_LIFE_HOURS) * 3600
+        self.lock = threading.Lock()
+        self.pending = {}  # (ticker, endpoint) -> [score, as of]
+        self.pending_totals = {}  # ticker -> [score, as of]
+        self.flush_requested = threading.Event()
+        self.flusher = None
+        self.totals = {}  # ticker -> decayed score, as of totals_at
+        self.totals_at = None
+
+    def decay(self, seconds):
+        return 0.5 ** (max(seconds, 0) / self.half_life)
+
+    def decayed(self, score, at, now):
+        return score * self.decay((now - at).total_seconds())
+
+    def add(self, counts, key, now):
+        entry = counts.get(key)
+        if entry is None:
+            counts[key] = [1.0, now]
+        else:
+            entry[0] = self.decayed(entry[0], entry[1], now) + 1.0
+            entry[1] = now
+
+    def record(self, ticker, endpoint):
+        # Never touches the database: a full batch wakes the flusher early
+        now = utcnow()
+        with self.lock:
+            self.add(self.pending, (ticker, endpoint), now)
+            self.add(self.pending_totals, ticker, now)
+            full = len(self.pending) >= self.FLUSH_SIZE
+        if full:
+            self.flush_requested.set()
+
+    def flush(self):
+        # Needs an app context. Concurrent flushes from other processes can drop a batch
+        # of increments, which is fine for a popularity signal
+        with self.lock:
+            pending, self.pending, self.pending_totals = self.pending, {}, {}
+        now = utcnow()
+
+        if pending:
+            # Every stored row of the touched tickers, so all of them move to the same time
+            tickers = list({ticker for ticker, endpoint in pending})
+            stored = {}
+            for start in range(0, len(tickers), 500):
+                rows = db.session.execute(
+                    select(TickerAccess.ticker, TickerAccess.endpoint, TickerAccess.score, TickerAccess.updated_at)
+                    .where(TickerAccess.ticker.in_(tickers[start:start + 500]))
+                ).all()
+                stored.update({(ticker, endpoint): (score, at) for ticker, endpoint, score, at in rows})
+
+            inserts, updates = [], []
+            for key in pending.keys() | stored.keys():
+                ticker, endpoint = key
+                score = self.decayed(*pending[key], now) if key in pending else 0.0
+                record = {"ticker": ticker, "endpoint": endpoint, "score": score, "updated_at": now}
+                if key in stored:
+                    record["score"] += self.decayed(*stored[key], now)
+                    updates.append(record)
+                else:
+                    inserts.append(record)
+            if inserts:
+                db.session.execute(insert(TickerAccess), inserts)
+            if updates:
+                # Bulk UPDATE by primary key
+                db.session.execute(update(TickerAccess), updates)
+            db.session.commit()
+        self.load(now)
+
+    def load(self, now=None):
+        # Per-ticker totals across all endpoints, decayed to now
+        now = now or utcnow()
+        rows = db.session.execute(
+            select(TickerAccess.ticker, func.sum(TickerAccess.score), func.max(TickerAccess.updated_at))
+            .group_by(TickerAccess.ticker)
+        )
+        totals = {ticker: self.decayed(score, at, now) for ticker, score, at in rows}
+        with self.lock:
+            self.totals, self.totals_at = totals, now
+
+    def score(self, ticker):
+        # Cheap enough for every cache eviction: the stored total plus this process's pending hits
+        now = utcnow()
+        with self.lock:
+            total = self.decayed(self.totals.get(ticker, 0.0), self.totals_at, now) if self.totals_at else 0.0
+            if ticker in self.pending_totals:
+                total += self.decayed(*self.pending_totals[ticker], now)
+        return total
+
+    def popularity(self):
+        # ticker -> score relative to the most requested ticker, between 0 and 1
+        if self.totals_at is None:
+            self.load()
+        with self.lock:
+            tickers = set(self.totals) | set(self.pending_totals)
+        scores = {ticker: self.score(ticker) for ticker in tickers}
+        top = max(scores.values(), default=0.0)
+        return {ticker: score / top for ticker, score in scores.items()} if top else {}
+
+    def hot(self, limit, endpoints=None):
+        # The most requested (ticker, endpoint) pairs, for warming the cache
+        now = utcnow()
+        query = select(TickerAccess.ticker, TickerAccess.endpoint, TickerAccess.score, TickerAccess.updated_at)
+        if endpoints is not None:
+            query = query.where(TickerAccess.endpoint.in_(endpoints))
+        rows = db.session.execute(query).all()
+        ranked = sorted(rows, key=lambda row: self.decayed(row.score, row.updated_at, now), reverse=True)
+        return [(row.ticker, row.endpoint) for row in ranked[:limit]]
+
+
+access_tracker = AccessTracker()
+
+
+def init_access_tracker(app):
+    access_tracker.half_life = app.config.get('ACCESS_HALF_LIFE_HOURS', AccessTracker.HALF_LIFE_HOURS) * 3600
+
+    # Eviction keeps the tickers people request (the refresh scheduler ranks by the same scores)
+    from app.cache import ticker_cache
+    ticker_cache.weight = access_tracker.score
+
+    def flush():
+        try:
+            with app.app_context():
+                access_tracker.flush()
+        except Exception as e:
+            print(f"Could not flush access counts: {e}")
+
+    # Flushes every FLUSH_INTERVAL seconds, or as soon as a batch is full
+    def run():
+        while True:
+            access_tracker.flush_requested.wait(AccessTracker.FLUSH_INTERVAL)
+            access_tracker.flush_requested.clear()
+            flush()
+
+    if access_tracker.flusher is None:
+        access_tracker.flusher = threading.Thread(target=run, daemon=True, name='access-flush')
+        access_tracker.flusher.start()
+
+    atexit.register(flush)
+
+    # Loading the totals and warming the cache run after boot, off the request path
+    warm_entries = app.config.get('CACHE_WARM_ENTRIES', 0)
+    thread = threading.Thread(target=warm_cache, args=(app, warm_entries), daemon=True, name='cache-warm')
+    thread.start()
+
+
+def warm_cache(app, limit):
+    # Builds the cached responses of the most requested tickers through the normal routes;
+    # only routes that serve stored data, so warming never spends upstream requests
+    from app.financial_controller import CACHED_ENDPOINTS
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            access_tracker.load()
+            hot = access_tracker.hot(limit, CACHED_ENDPOINTS) if limit else []
+    except Exception as e:
+        print(f"Could not load access counts: {e}")
+        return
+
+    warmed = 0
+    client = app.test_client()
+    for ticker, endpoint in hot:
+        try:
+            with app.test_request_context():
+                url = url_for(endpoint, ticker=ticker)
+            # Marked so warming requests aren't counted as demand
+            if client.get(url, environ_base={'lh7.cache_warm': True}).status_code < 400:
+                warmed += 1
+        except Exception as e:
+            print(f"Could not warm {endpoint} for {ticker}: {e}")
+    if hot:
+        print(f"Cache warming: {warmed} of {len(hot)} responses in {time.perf_counter() - started:.1f}s")
@@ -2,14 +2,14 @@
 
 import pandas as pd
 import numpy as np
-from app.models import Company, BalanceSheet, IncomeStatement, CashFlow
+from app.models import Company, BalanceSheet, IncomeStatement, CashFlow, annual_statements
 
 class AnalysisService:
     def get_financial_data_as_dataframe(self, ticker):
         # Query the relevant data
-        balance_sheets = BalanceSheet.query.filter_by(ticker=ticker).all()
-        income_statements = IncomeStatement.query.filter_by(ticker=ticker).all()
-        cash_flows = CashFlow.query.filter_by(ticker=ticker).all()
+        balance_sheets = BalanceSheet.query.filter_by(ticker=ticker).filter(annual_statements(BalanceSheet)).all()
+        income_statements = IncomeStatement.query.filter_by(ticker=ticker).filter(annual_statements(IncomeStatement)).all()
+        cash_flows = CashFlow.query.filter_by(ticker=ticker).filter(annual_statements(CashFlow)).all()
 
         # Initialize dictionary to store data
         data = {
@@ -0,0 +1,157 @@
+# app/asgi.py
+
+import os
+import re
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+import httpx
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from . import create_app
+from .financial_service import FinancialService
+from .ingest_writer import ingest_writer, IngestWriter
+from .access_tracker import access_tracker
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    # asgiref's bridge runs every WSGI call through a thread-sensitive sync_to_async, i.e.
+    # one request at a time on a single shared thread; this one runs them on a given pool
+
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        await PooledWsgiToAsgiInstance(self.wsgi_application, self.executor)(scope, receive, send)
+
+
+class PooledWsgiToAsgiInstance(WsgiToAsgiInstance):
+
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        # The undecorated body of WsgiToAsgiInstance.run_wsgi_app
+        run = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+        await sync_to_async(run, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+class AsyncFinancialApp:
+
+    # Routes served natively on the event loop; everything else goes to the Flask app
+    FINANCIAL_DATA_ROUTE = re.compile(r'^/financialData/(?P<ticker>[^/]+)/?$')
+    # The Flask endpoint of the same route, under which its accesses are counted
+    FINANCIAL_DATA_ENDPOINT = 'financial.get_all_financial_data'
+
+    def __init__(self, flask_app=None, db_workers=None, http_connections=None):
+        self.flask_app = flask_app or create_app()
+        self.financial_service = FinancialService()
+
+        # DB and pandas work run on a bounded pool so slow queries can't exhaust threads
+        self.db_executor = ThreadPoolExecutor(
+            max_workers=db_workers or int(os.environ.get('ASGI_DB_WORKERS', 8)),
+            thread_name_prefix='asgi-db',
+        )
+        # Upstream FMP calls are awaited on the event loop; only the connection pool bounds
+        # how many are in flight
+        self.http_connections = http_connections or int(os.environ.get('ASGI_HTTP_CONNECTIONS', 200))
+        self.http = None
+        # Flask views share the DB pool, since that is what they spend their time on
+        self.wsgi = PooledWsgiToAsgi(self.flask_app, self.db_executor)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            match = self.FINANCIAL_DATA_ROUTE.match(scope['path'])
+            # Quarterly ingestion (?period=quarter) stays on the Flask route; like
+            # request.args.get, the first period given counts
+            args = parse_qs(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+            if match and args.get('period', [None])[0] != 'quarter':
+                return await self.financial_data(match.group('ticker'), send)
+
+        # The rest of financial_bp runs through the WSGI bridge on the bounded pool
+        return await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.http_client()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.http is not None:
+                    await self.http.aclose()
+                self.db_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def http_client(self):
+        # Created on the event loop, at startup or on the first request when the server
+        # doesn't send lifespan events
+        if self.http is None:
+            self.http = httpx.AsyncClient(limits=httpx.Limits(
+                max_connections=self.http_connections, max_keepalive_connections=self.http_connections))
+        return self.http
+
+    async def run_db(self, function, *args):
+        def call():
+            with self.flask_app.app_context():
+                return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.db_executor, call)
+
+    async def financial_data(self, ticker, send):
+        # FinancialService.fetch_all_data with the upstream calls awaited, so no thread is
+        # held while they are in flight, and with financial_bp's request hooks
+        await self.wait_for_ingest(ticker)
+
+        service = self.financial_service
+        data = await self.run_db(service.local_data, ticker)
+        if data is None:
+            # The profile decides whether the ticker exists before spending three more calls
+            client = self.http_client()
+            company_data = await service.fetch_profile_async(client, ticker)
+            if not company_data:
+                data = await self.run_db(service.missing_profile, ticker, company_data)
+            else:
+                statements = await service.fetch_statements_async(client, ticker)
+                # The pool thread is only held while the writer's queue is full
+                data = await self.run_db(service.ingest, ticker, company_data, *statements)
+
+        self.record_access(ticker)
+        return await self.send_json(send, data)
+
+    async def wait_for_ingest(self, ticker):
+        # As financial_bp's before_request: a write of the ticker queued by another request
+        # is waited for, rather than fetched again. Shielded, so a timeout leaves the write be
+        future = ingest_writer.queued(ticker)
+        if future is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), IngestWriter.WAIT_TIMEOUT)
+            except Exception:
+                pass  # The read sees whatever is stored
+
+    def record_access(self, ticker):
+        # As financial_bp's after_request; in memory only, so it runs on the loop
+        access_tracker.record(ticker, self.FINANCIAL_DATA_ENDPOINT)
+
+    async def send_json(self, send, payload, status=200):
+        body = self.flask_app.json.dumps(payload).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                # Match the CORS policy the Flask app applies to every route
+                (b'access-control-allow-origin', b'*'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def create_asgi_app():
+    return AsyncFinancialApp()
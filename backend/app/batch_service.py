@@ -0,0 +1,110 @@
+# app/batch_service.py
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from sqlalchemy import select, delete
+from app.db import db
+from app.bulk_load import bulk_insert
+from app.models import Company, AnalysisResult
+
+# Flask app of the current worker process, built once by init_worker
+worker_app = None
+
+
+def init_worker(database_uri):
+    global worker_app
+    from app import create_app
+
+    # Workers only read, so they skip schema creation and use a read-only connection
+    worker_app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'CREATE_SCHEMA': False,
+        'CACHE_SNAPSHOT_PATH': None,
+        'CACHE_WARM_ENTRIES': 0,
+        'CHANGE_LOG_COMPACT_INTERVAL': 0,
+    })
+
+
+def analyze_tickers(tickers):
+    # Red flags and positive indicators for each ticker, in the current app context
+    from app.redflags_service import RedFlagsService
+    from app.positive_indicators_service import PositiveIndicatorsService
+
+    redflags_service = RedFlagsService()
+    positive_indicators_service = PositiveIndicatorsService()
+
+    results = []
+    for ticker in tickers:
+        result = {"ticker": ticker, "red_flags": None, "positive_indicators": None, "error": None}
+        try:
+            result["red_flags"] = redflags_service.analyze_red_flags(ticker)
+            result["positive_indicators"] = positive_indicators_service.analyze_positive_indicators(ticker)
+        except Exception as e:
+            # One bad ticker must not sink the rest of the chunk
+            result["error"] = f"{type(e).__name__}: {e}"
+        results.append(result)
+    return results
+
+
+def analyze_chunk(tickers):
+    with worker_app.app_context():
+        return analyze_tickers(tickers)
+
+
+class BatchAnalysisService:
+
+    DEFAULT_CHUNK_SIZE = 16
+
+    def __init__(self, workers=None, chunk_size=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+
+    def read_only_uri(self):
+        url = db.engine.url
+        if url.get_backend_name() != 'sqlite' or not url.database:
+            return url.render_as_string(hide_password=False)
+        # SQLite URI filename so the workers open the file with mode=ro
+        return f"sqlite:///file:{os.path.abspath(url.database)}?mode=ro&uri=true"
+
+    def chunks(self, tickers):
+        for start in range(0, len(tickers), self.chunk_size):
+            yield tickers[start:start + self.chunk_size]
+
+    def run(self, tickers=None, on_progress=None):
+        if tickers is None:
+            tickers = list(db.session.execute(select(Company.ticker).order_by(Company.ticker)).scalars())
+
+        summary = {"tickers": len(tickers), "analyzed": 0, "failed": 0}
+        if not tickers:
+            return summary
+
+        # Spawned workers start from a clean interpreter instead of inheriting the
+        # parent's open database connections
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(tickers)),
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(self.read_only_uri(),),
+        ) as executor:
+            futures = [executor.submit(analyze_chunk, chunk) for chunk in self.chunks(tickers)]
+
+            # This process is the single writer: each chunk is stored as soon as it arrives
+            for future in as_completed(futures):
+                results = future.result()
+                self.save_results(results)
+                summary["analyzed"] += sum(1 for result in results if not result["error"])
+                summary["failed"] += sum(1 for result in results if result["error"])
+                if on_progress:
+                    on_progress(summary)
+
+        return summary
+
+    def save_results(self, results):
+        computed_at = datetime.now(timezone.utc)
+        tickers = [result["ticker"] for result in results]
+        db.session.execute(delete(AnalysisResult).where(AnalysisResult.ticker.in_(tickers)))
+        bulk_insert(AnalysisResult, [dict(result, computed_at=computed_at) for result in results])
+        db.session.commit()
@@ -0,0 +1,105 @@
+# app/bulk_load.py
+
+import io
+import math
+import os
+import tempfile
+from datetime import date, datetime, timezone
+from flask import current_app
+from sqlalchemy import insert
+from app.db import db
+
+# Below this many rows an executemany INSERT is as fast as a server-side load
+BULK_LOAD_MIN_ROWS = 1000
+
+
+def bulk_insert(model, records):
+    # Inserts a list of column -> value dicts in the current transaction, through the
+    # fastest path of the database: COPY on PostgreSQL, LOAD DATA on MySQL, and an
+    # executemany INSERT on SQLite, for small batches and when DB_BULK_LOAD is off
+    if not records:
+        return 0
+    loader = LOADERS.get(db.session.get_bind().dialect.name)
+    if loader is None or len(records) < BULK_LOAD_MIN_ROWS or not current_app.config.get('DB_BULK_LOAD', True):
+        db.session.execute(insert(model), records)
+        return len(records)
+
+    table = model.__table__
+    columns = [column for column in table.columns if column.name in records[0]]
+    connection = db.session.connection()
+    loader(connection, table, columns, records)
+    return len(records)
+
+
+def text_value(value):
+    # A value as it reads in a load file; None for SQL NULL. NaN is stored as NULL, as
+    # SQLite and the executemany path do
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        return None if math.isnan(value) else repr(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return text_value(value.item())  # numpy scalars from DataFrame records
+    return str(value)
+
+
+def csv_lines(columns, records, null):
+    # Strings are always quoted so that only the unquoted null marker reads as NULL
+    for record in records:
+        fields = []
+        for column in columns:
+            value = text_value(record.get(column.name))
+            if value is None:
+                fields.append(null)
+            elif isinstance(record.get(column.name), str):
+                fields.append('"' + value.replace('"', '""') + '"')
+            else:
+                fields.append(value)
+        yield ','.join(fields) + '\n'
+
+
+def copy_postgresql(connection, table, columns, records):
+    # COPY FROM STDIN in CSV format, where an unquoted empty field is NULL
+    names = ', '.join(connection.dialect.identifier_preparer.quote(column.name) for column in columns)
+    statement = f"COPY {connection.dialect.identifier_preparer.format_table(table)} ({names}) FROM STDIN WITH (FORMAT csv)"
+    data = ''.join(csv_lines(columns, records, null=''))
+    cursor = connection.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):  # psycopg2
+            cursor.copy_expert(statement, io.StringIO(data))
+        else:  # psycopg 3
+            with cursor.copy(statement) as copy:
+                copy.write(data)
+    finally:
+        cursor.close()
+
+
+def load_data_mysql(connection, table, columns, records):
+    # LOAD DATA LOCAL INFILE from a temporary file; the connection only allows local
+    # files under the temp directory (see engine_options)
+    names = ', '.join(connection.dialect.identifier_preparer.quote(column.name) for column in columns)
+    handle, path = tempfile.mkstemp(suffix='.csv', dir=tempfile.gettempdir())
+    try:
+        with os.fdopen(handle, 'w', encoding='utf-8', newline='') as file:
+            file.writelines(csv_lines(columns, records, null='NULL'))
+        connection.exec_driver_sql(
+            f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE {connection.dialect.identifier_preparer.format_table(table)} "
+            "CHARACTER SET utf8mb4 FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+            f"LINES TERMINATED BY '\\n' ({names})"
+        )
+    finally:
+        os.remove(path)
+
+
+LOADERS = {
+    'postgresql': copy_postgresql,
+    'mysql': load_data_mysql,
+}
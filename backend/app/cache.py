@@ -0,0 +1,369 @@
+# app/cache.py
+
+import atexit
+import base64
+import json
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from itertools import islice
+from datetime import datetime, timezone
+from sqlalchemy import select, update, insert
+from app.db import db
+from app.models import DataVersion
+
+# Returned by TickerCache.get when there is no usable entry (None is a valid cached value)
+MISS = object()
+
+
+def data_versions(tickers):
+    # Tickers that were never written through save_ingested are at version 0
+    versions = dict.fromkeys(tickers, 0)
+    if versions:
+        rows = db.session.execute(
+            select(DataVersion.ticker, DataVersion.version).where(DataVersion.ticker.in_(list(versions)))
+        )
+        versions.update(dict(rows.all()))
+    return versions
+
+
+def data_version(ticker):
+    return data_versions([ticker])[ticker]
+
+
+def bump_data_versions(tickers):
+    # Runs inside the caller's transaction so the new versions commit with the data
+    tickers = set(tickers)
+    if not tickers:
+        return
+    now = datetime.now(timezone.utc)
+    existing = set(db.session.execute(
+        select(DataVersion.ticker).where(DataVersion.ticker.in_(list(tickers)))
+    ).scalars())
+    if existing:
+        db.session.execute(
+            update(DataVersion).where(DataVersion.ticker.in_(list(existing)))
+            .values(version=DataVersion.version + 1, updated_at=now)
+        )
+    if tickers - existing:
+        db.session.execute(insert(DataVersion), [
+            {"ticker": ticker, "version": 1, "updated_at": now} for ticker in tickers - existing
+        ])
+
+
+# Values in the shared tiers are JSON, never pickles: anyone who can write to a Redis
+# shared between services must not be able to run code in this process. Cached values are
+# analysis results and (body, status) responses; bodies are bytes, kept as base64, and
+# tuples come back as lists, which unpack the same
+def dumps_shared(value):
+    return json.dumps(value, default=encode_shared, separators=(',', ':')).encode('utf-8')
+
+
+def encode_shared(value):
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode('ascii')}
+    raise TypeError(f"{type(value).__name__} can't be kept in the shared cache")
+
+
+def loads_shared(data):
+    return json.loads(data, object_hook=decode_shared)
+
+
+def decode_shared(value):
+    if value.keys() == {"__bytes__"}:
+        return base64.b64decode(value["__bytes__"])
+    return value
+
+
+class RedisCacheBackend:
+    # Shared L2 tier on anything speaking the Redis protocol. Each ticker version is one
+    # hash, lh7:<ticker>:v<version>, with a field per cached value.
+
+    PREFIX = 'lh7'
+
+    def __init__(self, url=None, client=None, ttl=None):
+        if client is None:
+            # Optional dependency, only needed when a redis:// L2 is configured
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+
+    def key(self, ticker, version):
+        return f"{self.PREFIX}:{ticker}:v{version}"
+
+    def get(self, ticker, version, name):
+        value = self.client.hget(self.key(ticker, version), name)
+        return MISS if value is None else loads_shared(value)
+
+    def set(self, ticker, version, name, value):
+        key = self.key(ticker, version)
+        pipeline = self.client.pipeline()
+        pipeline.hset(key, name, dumps_shared(value))
+        if self.ttl:
+            pipeline.expire(key, self.ttl)
+        pipeline.execute()
+
+    def invalidate(self, ticker):
+        keys = list(self.client.scan_iter(match=f"{self.PREFIX}:{ticker}:v*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self, namespace=None):
+        for key in self.client.scan_iter(match=f"{self.PREFIX}:*"):
+            if namespace is None:
+                self.client.delete(key)
+                continue
+            names = [name for name in self.client.hkeys(key) if name.decode().startswith(f"{namespace}:")]
+            if names:
+                self.client.hdel(key, *names)
+
+
+class SQLiteCacheBackend:
+    # Shared L2 tier in a local SQLite file, for workers on one host without a Redis server
+
+    def __init__(self, path, ttl=None):
+        self.path = path
+        self.ttl = ttl
+        self.local = threading.local()
+        with self.connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entry ("
+                "ticker TEXT NOT NULL, version INTEGER NOT NULL, name TEXT NOT NULL, "
+                "value BLOB NOT NULL, expires_at REAL, PRIMARY KEY (ticker, version, name))"
+            )
+
+    def connection(self):
+        # sqlite3 connections can't be shared across threads, so each thread opens its own
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.local.connection = connection
+        return connection
+
+    def get(self, ticker, version, name):
+        row = self.connection().execute(
+            "SELECT value FROM cache_entry WHERE ticker = ? AND version = ? AND name = ? "
+            "AND (expires_at IS NULL OR expires_at > ?)",
+            (ticker, version, name, time.time()),
+        ).fetchone()
+        return MISS if row is None else loads_shared(row[0])
+
+    def set(self, ticker, version, name, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self.connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entry (ticker, version, name, value, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (ticker, version, name, dumps_shared(value), expires_at),
+            )
+
+    def invalidate(self, ticker):
+        with self.connection() as connection:
+            connection.execute("DELETE FROM cache_entry WHERE ticker = ?", (ticker,))
+
+    def clear(self, namespace=None):
+        with self.connection() as connection:
+            if namespace is None:
+                connection.execute("DELETE FROM cache_entry")
+            else:
+                connection.execute("DELETE FROM cache_entry WHERE name LIKE ?", (f"{namespace}:%",))
+
+
+def create_shared_backend(url, ttl=None):
+    # redis:// (or rediss://, unix://) for a Redis-protocol server, sqlite:///<path> for a local file
+    if not url:
+        return None
+    if url.startswith('sqlite:///'):
+        return SQLiteCacheBackend(url[len('sqlite:///'):], ttl=ttl)
+    return RedisCacheBackend(url, ttl=ttl)
+
+
+class TickerCache:
+    # In-process LRU for per-ticker values: statement frames, analysis results and
+    # serialized responses. Every entry carries the ticker's data version, so an entry
+    # written before the ticker's statements changed is never served.
+    # Analyses and responses are also kept in an optional shared L2 backend behind it.
+
+    NAMESPACES = ('frames', 'analysis', 'responses')
+    SHARED_NAMESPACES = ('analysis', 'responses')
+    MAX_ENTRIES = 4096
+    # With a weight function, eviction picks the least requested ticker among this many
+    # of the least recently used entries, so hot tickers stay resident
+    EVICTION_SAMPLE = 8
+
+    # Snapshot file: magic, format version, then the zlib-compressed pickle of the entries
+    SNAPSHOT_MAGIC = b'LH7CACHE'
+    SNAPSHOT_FORMAT = 1
+    SNAPSHOT_HEADER = struct.Struct('>8sH')
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.environ.get('CACHE_MAX_ENTRIES', self.MAX_ENTRIES))
+        self.entries = OrderedDict()  # (namespace, ticker, key) -> (version, value)
+        self.lock = threading.RLock()
+        self.shared = None
+        self.weight = None  # ticker -> demand score, set by init_access_tracker
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+
+    def get(self, namespace, ticker, key, version):
+        entry_key = (namespace, ticker, key)
+        with self.lock:
+            entry = self.entries.get(entry_key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return MISS
+            self.entries.move_to_end(entry_key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, namespace, ticker, key, version, value):
+        with self.lock:
+            self.entries[(namespace, ticker, key)] = (version, value)
+            self.entries.move_to_end((namespace, ticker, key))
+            self.evict()
+
+    def evict(self):
+        with self.lock:
+            while len(self.entries) > self.max_entries:
+                if self.weight is None:
+                    self.entries.popitem(last=False)
+                    continue
+                oldest = list(islice(self.entries, self.EVICTION_SAMPLE))
+                del self.entries[min(oldest, key=lambda entry_key: self.weight(entry_key[1]))]
+
+    def cached(self, namespace, ticker, key, build):
+        version = data_version(ticker)
+        value = self.get(namespace, ticker, key, version)
+        if value is not MISS:
+            return value
+
+        shared = self.shared if namespace in self.SHARED_NAMESPACES else None
+        if shared is not None:
+            value = self.shared_call(shared.get, ticker, version, f"{namespace}:{key}")
+            if value is not MISS:
+                self.shared_hits += 1
+                self.set(namespace, ticker, key, version, value)
+                return value
+
+        value = build()
+        self.set(namespace, ticker, key, version, value)
+        if shared is not None:
+            self.shared_call(shared.set, ticker, version, f"{namespace}:{key}", value)
+        return value
+
+    def shared_call(self, function, *args):
+        # An unreachable L2 degrades to L1-only caching instead of failing the request
+        try:
+            return function(*args)
+        except Exception as e:
+            print(f"Shared cache error: {e}")
+            return MISS
+
+    def invalidate(self, ticker):
+        with self.lock:
+            for entry_key in [entry_key for entry_key in self.entries if entry_key[1] == ticker]:
+                del self.entries[entry_key]
+        if self.shared is not None:
+            self.shared_call(self.shared.invalidate, ticker)
+
+    def clear(self, namespace=None):
+        with self.lock:
+            if namespace is None:
+                self.entries.clear()
+            else:
+                for entry_key in [entry_key for entry_key in self.entries if entry_key[0] == namespace]:
+                    del self.entries[entry_key]
+        if self.shared is not None and (namespace is None or namespace in self.SHARED_NAMESPACES):
+            self.shared_call(self.shared.clear, namespace)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                    "sharedHits": self.shared_hits}
+
+    def save_snapshot(self, path):
+        with self.lock:
+            entries = list(self.entries.items())
+
+        payload = zlib.compress(pickle.dumps(entries, protocol=pickle.HIGHEST_PROTOCOL))
+
+        # Write beside the target and swap it in, so a crash or a second worker
+        # saving at the same time never leaves a torn file
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as snapshot:
+            snapshot.write(self.SNAPSHOT_HEADER.pack(self.SNAPSHOT_MAGIC, self.SNAPSHOT_FORMAT))
+            snapshot.write(payload)
+        os.replace(temporary_path, path)
+        return len(entries)
+
+    def load_snapshot(self, path):
+        try:
+            with open(path, 'rb') as snapshot:
+                magic, snapshot_format = self.SNAPSHOT_HEADER.unpack(snapshot.read(self.SNAPSHOT_HEADER.size))
+                if magic != self.SNAPSHOT_MAGIC or snapshot_format != self.SNAPSHOT_FORMAT:
+                    return 0
+                entries = pickle.loads(zlib.decompress(snapshot.read()))
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            # A snapshot from an incompatible build is only a lost warm-up, never a boot failure
+            print(f"Ignoring cache snapshot {path}: {e}")
+            return 0
+
+        # Only entries still at their ticker's current data version are restored
+        versions = data_versions({entry_key[1] for entry_key, _ in entries})
+        restored = 0
+        with self.lock:
+            for entry_key, (version, value) in entries:
+                if entry_key[0] in self.NAMESPACES and versions[entry_key[1]] == version \
+                        and entry_key not in self.entries:
+                    self.entries[entry_key] = (version, value)
+                    restored += 1
+        self.evict()
+        return restored
+
+
+ticker_cache = TickerCache()
+
+
+def init_shared_cache(app):
+    ticker_cache.shared = create_shared_backend(app.config.get('CACHE_L2_URL'), app.config.get('CACHE_L2_TTL'))
+
+
+def init_cache_snapshot(app):
+    # Restores the warm cache on boot and saves it periodically and at exit
+    path = app.config.get('CACHE_SNAPSHOT_PATH')
+    if not path:
+        return
+
+    with app.app_context():
+        restored = ticker_cache.load_snapshot(path)
+    print(f"Cache snapshot: restored {restored} entries from {path}")
+
+    def save():
+        try:
+            ticker_cache.save_snapshot(path)
+        except OSError as e:
+            print(f"Could not save cache snapshot {path}: {e}")
+
+    interval = app.config.get('CACHE_SNAPSHOT_INTERVAL')
+    if interval:
+        def save_periodically():
+            save()
+            schedule()
+
+        def schedule():
+            timer = threading.Timer(interval, save_periodically)
+            timer.daemon = True
+            timer.start()
+
+        schedule()
+
+    atexit.register(save)
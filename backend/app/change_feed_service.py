@@ -0,0 +1,139 @@
+# app/change_feed_service.py
+
+import threading
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete, func, null
+from app.db import db
+from app.models import ChangeLog, DataVersion, BalanceSheet, IncomeStatement, CashFlow, TTMFlow, FinancialRatio
+from app.bulk_load import bulk_insert
+from app.streaming import stream_rows
+
+
+class ChangeFeedError(ValueError):
+    pass
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def log_changes(statement, keys, change):
+    # Runs inside the caller's transaction, after bump_data_versions, so every entry carries
+    # the data version it commits with. keys: (ticker, date, period) of the changed rows
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return 0
+    tickers = list({ticker for ticker, date, period in keys})
+    versions = {}
+    for start in range(0, len(tickers), 500):
+        versions.update(db.session.execute(
+            select(DataVersion.ticker, DataVersion.version).where(DataVersion.ticker.in_(tickers[start:start + 500]))
+        ).all())
+    now = utcnow()
+    return bulk_insert(ChangeLog, [
+        {"ticker": ticker, "statement": statement, "date": date, "period": period, "change": change,
+         "data_version": versions.get(ticker, 0), "changed_at": now}
+        for ticker, date, period in keys
+    ])
+
+
+class ChangeFeedService:
+    # Incremental sync for downstream consumers: every entry of change_log names a changed
+    # (ticker, statement, period) row, in id order. A consumer keeps the last id it read and
+    # asks for what came after it. Compaction only drops entries superseded by a later one for
+    # the same row, so a consumer that is behind still gets the latest change of every row.
+    # Rows stored before the log existed get an entry from backfill() when the table is
+    # created, so one starting from 0 gets every row that exists
+
+    DEFAULT_LIMIT = 1000
+    MAX_LIMIT = 10000
+    # On server databases concurrent transactions can commit out of id order; entries younger
+    # than this are held back so a consumer never moves its cursor past one still committing.
+    # SQLite serializes writers, so ids there are always in commit order
+    SETTLE_SECONDS = 5
+
+    def changes(self, since=0, limit=None):
+        # Validated up front so bad arguments fail before the response starts
+        limit = self.DEFAULT_LIMIT if limit is None else limit
+        if since is None or since < 0:
+            raise ChangeFeedError("since must be a cursor (a non-negative integer).")
+        if not 1 <= limit <= self.MAX_LIMIT:
+            raise ChangeFeedError(f"limit must be between 1 and {self.MAX_LIMIT}.")
+
+        query = select(
+            ChangeLog.id.label('cursor'),
+            ChangeLog.ticker,
+            ChangeLog.statement,
+            ChangeLog.date,
+            ChangeLog.period,
+            ChangeLog.change,
+            ChangeLog.data_version.label('dataVersion'),
+            ChangeLog.changed_at.label('changedAt'),
+        ).where(ChangeLog.id > since)
+        if db.session.get_bind().dialect.name != 'sqlite':
+            query = query.where(ChangeLog.changed_at <= utcnow() - timedelta(seconds=self.SETTLE_SECONDS))
+        query = query.order_by(ChangeLog.id).limit(limit)
+        return (dict(row._mapping) for row in stream_rows(query))
+
+    # Logged tables and the change of their entries
+    LOGGED = [
+        (BalanceSheet, 'insert'),
+        (IncomeStatement, 'insert'),
+        (CashFlow, 'insert'),
+        (TTMFlow, 'refresh'),
+        (FinancialRatio, 'refresh'),
+    ]
+
+    def backfill(self):
+        # One entry for every stored row, for databases that had rows before the log; run
+        # once when change_log is created. Ratios are keyed by fiscal year, as refresh_ratios logs them
+        logged = 0
+        for model, change in self.LOGGED:
+            if model is FinancialRatio:
+                query = select(model.ticker, model.calendar_year, null())
+            else:
+                query = select(model.ticker, model.date, model.period)
+            keys = [tuple(row) for row in db.session.execute(query.order_by(model.id))]
+            logged += log_changes(model.__tablename__, keys, change)
+        db.session.commit()
+        return logged
+
+    def compact(self):
+        # Keeps the latest entry of every (ticker, statement, date, period); the derived table
+        # lets MySQL delete from the table it selects from
+        latest = select(func.max(ChangeLog.id).label('id')).group_by(
+            ChangeLog.ticker, ChangeLog.statement, ChangeLog.date, ChangeLog.period).subquery()
+        removed = db.session.execute(
+            delete(ChangeLog).where(ChangeLog.id.notin_(select(latest.c.id)))
+        ).rowcount
+        db.session.commit()
+        return removed
+
+    def stats(self):
+        count, first, last = db.session.execute(
+            select(func.count(ChangeLog.id), func.min(ChangeLog.id), func.max(ChangeLog.id))
+        ).one()
+        return {"entries": count, "firstCursor": first, "lastCursor": last}
+
+
+def init_change_feed(app):
+    # Compacts the change log every CHANGE_LOG_COMPACT_INTERVAL seconds; off when 0. Running it
+    # in several processes at once is harmless
+    interval = app.config.get('CHANGE_LOG_COMPACT_INTERVAL')
+    if not interval:
+        return
+
+    def run_periodically():
+        try:
+            with app.app_context():
+                ChangeFeedService().compact()
+        except Exception as e:
+            print(f"Change log compaction failed: {e}")
+        schedule()
+
+    def schedule():
+        timer = threading.Timer(interval, run_periodically)
+        timer.daemon = True
+        timer.start()
+
+    schedule()
@@ -1,5 +1,87 @@
 # app/db.py
 
+import tempfile
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect
+from sqlalchemy.engine import make_url
 
 db = SQLAlchemy()
+
+
+def engine_options(uri, environ):
+    # SQLALCHEMY_ENGINE_OPTIONS for the configured database. Pool settings only apply to
+    # server databases; SQLite keeps the Flask-SQLAlchemy defaults
+    options = {}
+    if environ.get('DB_STATEMENT_CACHE_SIZE'):
+        # Compiled SQL kept per engine
+        options['query_cache_size'] = int(environ['DB_STATEMENT_CACHE_SIZE'])
+    backend = make_url(uri).get_backend_name()
+    if backend == 'sqlite':
+        return options
+
+    options['pool_size'] = int(environ.get('DB_POOL_SIZE', 10))
+    options['max_overflow'] = int(environ.get('DB_MAX_OVERFLOW', 20))
+    # Test connections on checkout so a database restart doesn't fail the next requests
+    options['pool_pre_ping'] = environ.get('DB_POOL_PRE_PING', '1') == '1'
+    # Recycled before the server's idle timeout closes them
+    options['pool_recycle'] = int(environ.get('DB_POOL_RECYCLE', 1800))
+    if backend == 'mysql':
+        # LOAD DATA LOCAL INFILE for bulk loads, restricted to files in the temp directory
+        options['connect_args'] = {'allow_local_infile_in_path': tempfile.gettempdir()}
+    return options
+
+
+def missing_tables():
+    # Names of the declared tables the database doesn't have yet, read before create_all so
+    # tables that need filling from existing rows can be told apart
+    existing = set(inspect(db.engine).get_table_names())
+    return {table.name for table in db.metadata.sorted_tables if table.name not in existing}
+
+
+def create_indexes():
+    # create_all only builds indexes together with new tables, so add any
+    # indexes declared since an existing table was first created
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+# Full-text index over company descriptions, kept in sync with the company table by
+# triggers. Porter stemming lets "semiconductor" match "semiconductors".
+# SQLite only; on other databases company text search falls back to LIKE.
+COMPANY_FTS_DDL = [
+    "CREATE VIRTUAL TABLE company_fts USING fts5("
+    "ticker UNINDEXED, name, industry, sector, description, "
+    "content='company', content_rowid='rowid', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS company_fts_insert AFTER INSERT ON company BEGIN "
+    "INSERT INTO company_fts(rowid, ticker, name, industry, sector, description) "
+    "VALUES (new.rowid, new.ticker, new.name, new.industry, new.sector, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS company_fts_delete AFTER DELETE ON company BEGIN "
+    "INSERT INTO company_fts(company_fts, rowid, ticker, name, industry, sector, description) "
+    "VALUES ('delete', old.rowid, old.ticker, old.name, old.industry, old.sector, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS company_fts_update AFTER UPDATE ON company BEGIN "
+    "INSERT INTO company_fts(company_fts, rowid, ticker, name, industry, sector, description) "
+    "VALUES ('delete', old.rowid, old.ticker, old.name, old.industry, old.sector, old.description); "
+    "INSERT INTO company_fts(rowid, ticker, name, industry, sector, description) "
+    "VALUES (new.rowid, new.ticker, new.name, new.industry, new.sector, new.description); END",
+]
+
+
+def create_search_tables():
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    with db.engine.begin() as connection:
+        if connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'company_fts'"
+        ).first():
+            return True
+        try:
+            for statement in COMPANY_FTS_DDL:
+                connection.exec_driver_sql(statement)
+        except Exception as e:
+            # SQLite built without FTS5
+            print(f"Company full-text search unavailable: {e}")
+            return False
+        # Index the companies stored before the table existed
+        connection.exec_driver_sql("INSERT INTO company_fts(company_fts) VALUES ('rebuild')")
+    return True
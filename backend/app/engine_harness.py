@@ -0,0 +1,249 @@
+# app/engine_harness.py
+
+import re
+import time
+from importlib import import_module
+import numpy as np
+import pandas as pd
+from app.ratio_service import RatioService
+
+# Red flag rules in the order every implementation runs them
+RULE_IDS = [f'RF{number}' for number in range(1, 14)]
+
+# rd.py's prototype reads a few inputs under their statement captions
+RD_COLUMNS = {
+    'revenue': 'Revenue',
+    'netIncome': 'Net Income',
+    'costOfRevenue': 'Cost of Revenue',
+    'grossProfit': 'Gross Profit',
+    'operatingExpenses': 'Operating Expenses',
+    'operatingIncome': 'EBIT',
+    'interestExpense': 'Interest Expense',
+}
+
+ZONE_HEADING = re.compile(r'^(Caution Zone|Red Flag|Critical Zone|Negative Interest Coverage)\b')
+FISCAL_YEAR = re.compile(r'FY (\d{4}(?:-\d{2})?)')
+
+
+def flagged(message):
+    # The structured content of a rule's message: which fiscal years it flags and in
+    # which zone, so implementations with different wording can still be compared
+    if not message:
+        return frozenset()
+    flags = set()
+    zone = 'flag'
+    for line in message.splitlines():
+        line = line.strip()
+        heading = ZONE_HEADING.match(line)
+        if heading:
+            zone = heading.group(1).lower()
+        elif 'Persistently Negative' in line:
+            zone = 'negative margin'
+        flags.update((year, zone) for year in FISCAL_YEAR.findall(line))
+    return frozenset(flags)
+
+
+class RedFlagEngines:
+    # Every red flag implementation behind one signature:
+    # engine(panel) -> {ticker: {rule id: message or None}}
+
+    def __init__(self):
+        self.engines = {
+            'methods': self.methods,
+            'rules': self.rules,
+            'rules-panel': self.rules_panel,
+            'rd': self.rd,
+        }
+
+    @staticmethod
+    def frames(panel):
+        for ticker, frame in panel.groupby('ticker', sort=False):
+            yield ticker, frame.drop(columns='ticker').sort_values('calendarYear').reset_index(drop=True)
+
+    def methods(self, panel):
+        from app.redflags_service import RedFlagsService
+        service = RedFlagsService()
+        functions = [
+            service.analyze_declining_revenue_increasing_income, service.analyze_debt_to_equity_ratio,
+            service.analyze_declining_operating_cash_flow_increasing_income, service.analyze_accounts_receivable_vs_sales,
+            service.analyze_gross_profit_margin, service.analyze_inventory_turnover, service.analyze_goodwill_increase,
+            service.analyze_interest_coverage, service.analyze_increasing_dso, service.analyze_negative_free_cash_flow,
+            service.analyze_high_dividend_payout_poor_cash_flow, service.analyze_large_equity_issuances,
+            service.analyze_short_term_debt,
+        ]
+        return {ticker: self.run_functions(functions, frame) for ticker, frame in self.frames(panel)}
+
+    def rd(self, panel):
+        # The standalone prototype, on the same frames with its column names
+        rd = import_module('rd')
+        functions = [
+            rd.analyze_declining_revenue_increasing_income, rd.analyze_debt_to_equity_ratio,
+            rd.analyze_cash_flow_vs_net_income, rd.analyze_accounts_receivable_vs_sales,
+            rd.analyze_gross_profit_margin, rd.analyze_inventory_turnover, rd.analyze_goodwill_increase,
+            rd.analyze_interest_coverage, rd.analyze_increasing_dso, rd.analyze_negative_free_cash_flow,
+            rd.analyze_high_dividend_payout_poor_cash_flow, rd.analyze_frequent_equity_issuances,
+            rd.analyze_short_term_debt,
+        ]
+        return {ticker: self.run_functions(functions, self.rd_frame(frame)) for ticker, frame in self.frames(panel)}
+
+    @staticmethod
+    def rd_frame(frame):
+        # rd.py also does arithmetic on the fiscal year, so it takes them as integers
+        frame = frame.rename(columns=RD_COLUMNS)
+        frame['calendarYear'] = pd.to_numeric(frame['calendarYear'])
+        return frame
+
+    def rules(self, panel):
+        from app.rule_engine import rule_plan
+        plan = rule_plan('redflags')
+        return {ticker: self.by_rule_id(plan, plan.evaluate(frame)) for ticker, frame in self.frames(panel)}
+
+    def rules_panel(self, panel):
+        # One evaluation of the compiled plan over the whole panel
+        from app.rule_engine import rule_plan
+        plan = rule_plan('redflags')
+        return {ticker: self.by_rule_id(plan, messages) for ticker, messages in plan.evaluate(panel, group='ticker').items()}
+
+    @staticmethod
+    def by_rule_id(plan, messages):
+        return {rule_id: messages.get(rule.name) for rule_id, rule in zip(RULE_IDS, plan.rules)}
+
+    @staticmethod
+    def run_functions(functions, frame):
+        messages = {}
+        for rule_id, function in zip(RULE_IDS, functions):
+            try:
+                # Each gets its own copy; several of them add helper columns to the frame
+                messages[rule_id] = function(frame.copy())
+            except Exception as e:
+                messages[rule_id] = f"error: {type(e).__name__}: {e}"
+        return messages
+
+
+class EngineHarness:
+    # Runs red flag engines on the same panel, diffs which fiscal years each rule flags
+    # against a baseline engine, and times them
+
+    def __init__(self, baseline='methods'):
+        self.engines = RedFlagEngines().engines
+        self.baseline = baseline
+
+    def real_panel(self, tickers=None):
+        # Stored companies' annual analysis frames, with the ratio store attached
+        from app.models import Company
+        from app.redflags_service import RedFlagsService
+        service = RedFlagsService()
+        if tickers is None:
+            tickers = [ticker for (ticker,) in Company.query.with_entities(Company.ticker).order_by(Company.ticker)]
+        frames = []
+        for ticker in tickers:
+            try:
+                frame = service.get_financial_data_as_dataframe(ticker)
+            except ValueError:
+                # Statements of different lengths can't be lined up into one frame
+                continue
+            if not frame.empty:
+                frames.append(frame.assign(ticker=ticker))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def generated_panel(self, tickers=200, years=8, seed=0):
+        # Random but plausible statements: trending series with noise, occasional gaps,
+        # zeros and sign flips, so every rule has something to fire on
+        random = np.random.default_rng(seed)
+        rows = tickers * years
+        index = np.repeat(np.arange(tickers), years)
+
+        def trend(scale, growth=0.08, noise=0.15):
+            base = random.lognormal(np.log(scale), 1.0, tickers)[index]
+            steps = random.normal(growth, noise, rows).reshape(tickers, years).cumsum(axis=1).ravel()
+            return base * np.exp(steps)
+
+        revenue = trend(1e9)
+        frame = pd.DataFrame({
+            'ticker': [f'T{number:05d}' for number in index],
+            'calendarYear': [str(2000 + year) for year in np.tile(np.arange(years), tickers)],
+            'revenue': revenue,
+            'costOfRevenue': revenue * random.uniform(0.3, 0.9, rows),
+            'operatingExpenses': revenue * random.uniform(0.05, 0.4, rows),
+            'netReceivables': revenue * random.uniform(0.05, 0.4, rows),
+            'inventory': revenue * random.uniform(0.02, 0.3, rows),
+            'goodwill': trend(2e8, 0.05, 0.2),
+            'intangibleAssets': trend(1e8),
+            'totalAssets': trend(3e9, 0.05, 0.05),
+            'totalCurrentAssets': trend(1e9, 0.05, 0.1),
+            'cashAndCashEquivalents': trend(3e8, 0.05, 0.3),
+            'totalCurrentLiabilities': trend(8e8, 0.05, 0.1),
+            'accountPayables': revenue * random.uniform(0.03, 0.2, rows),
+            'shortTermDebt': trend(1e8, 0.05, 0.3),
+            'totalDebt': trend(1e9, 0.03, 0.2),
+            'deferredRevenue': trend(5e7, 0.05, 0.2),
+            'totalStockholdersEquity': trend(1.5e9, 0.03, 0.2) * np.where(random.random(rows) < 0.03, -1, 1),
+            'interestExpense': trend(5e7, 0.03, 0.2),
+            'weightedAverageShsOut': trend(1e8, 0.02, 0.08),
+            'capitalExpenditure': -trend(1e8, 0.05, 0.2),
+            'dividendsPaid': -trend(5e7, 0.05, 0.2),
+        })
+        frame['grossProfit'] = frame['revenue'] - frame['costOfRevenue']
+        frame['operatingIncome'] = frame['grossProfit'] - frame['operatingExpenses']
+        frame['netIncome'] = (frame['operatingIncome'] - frame['interestExpense']) * random.uniform(0.6, 0.9, rows)
+        frame['operatingCashFlow'] = frame['netIncome'] * random.uniform(0.5, 1.6, rows)
+        frame['freeCashFlow'] = frame['operatingCashFlow'] + frame['capitalExpenditure']
+
+        # Gaps and zeros, as in real filings
+        for column in ['goodwill', 'inventory', 'shortTermDebt', 'deferredRevenue', 'dividendsPaid']:
+            frame.loc[random.random(rows) < 0.05, column] = np.nan
+            frame.loc[random.random(rows) < 0.02, column] = 0.0
+
+        return frame.join(RatioService().compute_ratios(frame, frame['ticker']))
+
+    def run(self, panel, engines=None, repeat=1):
+        engines = engines or list(self.engines)
+        if self.baseline not in engines:
+            engines = [self.baseline, *engines]
+
+        outputs, seconds = {}, {}
+        for name in engines:
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                outputs[name] = self.engines[name](panel)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            seconds[name] = best
+
+        baseline = outputs[self.baseline]
+        report = {
+            "tickers": len(baseline),
+            "rows": len(panel),
+            "baseline": self.baseline,
+            "engines": {},
+        }
+        for name in engines:
+            report["engines"][name] = {
+                "seconds": round(seconds[name], 4),
+                "speedup": round(seconds[self.baseline] / seconds[name], 2) if seconds[name] else None,
+                "rules": self.diff(baseline, outputs[name]),
+            }
+        return report
+
+    def diff(self, expected, actual):
+        # Per rule: tickers whose flagged (year, zone) sets differ, and a few examples
+        rules = {}
+        for rule_id in RULE_IDS:
+            mismatched, errors, examples = 0, 0, []
+            for ticker, messages in expected.items():
+                message = actual.get(ticker, {}).get(rule_id)
+                if isinstance(message, str) and message.startswith('error: '):
+                    errors += 1
+                    continue
+                want, got = flagged(messages.get(rule_id)), flagged(message)
+                if want != got:
+                    mismatched += 1
+                    if len(examples) < 3:
+                        examples.append({
+                            "ticker": ticker,
+                            "missing": sorted(want - got),
+                            "extra": sorted(got - want),
+                        })
+            rules[rule_id] = {"mismatched": mismatched, "errors": errors, "examples": examples}
+        return rules
@@ -0,0 +1,58 @@
+# app/export_service.py
+
+from sqlalchemy import select
+from app.models import BalanceSheet, IncomeStatement, CashFlow, FinancialRatio, AnalysisResult, annual_statements
+from app.financial_service import FinancialService, StatementQueryError
+from app.ratio_service import RatioService
+from app.streaming import stream_rows
+
+
+class ExportService:
+    # Universe-wide exports, one record per (ticker, year), streamed off the cursor
+    # rather than built into a list
+
+    STATEMENTS = {
+        'incomeStatement': (IncomeStatement, FinancialService.INCOME_STATEMENT_FIELDS),
+        'balanceSheet': (BalanceSheet, FinancialService.BALANCE_SHEET_FIELDS),
+        'cashFlow': (CashFlow, FinancialService.CASH_FLOW_FIELDS),
+    }
+
+    # The ratio store, in the field names of /ratiosDB
+    RATIO_FIELDS = {
+        "calendarYear": "calendar_year",
+        **{field: column for name, column in RatioService.RATIO_COLUMNS.items()
+           for field, column in [(name, column), (f'{name}Yoy', f'{column}_yoy')]},
+    }
+
+    DATASETS = ('ratios', *STATEMENTS)
+
+    def records(self, dataset, fields=None, year_from=None, year_to=None, tickers=None):
+        # Validated and built up front so bad arguments fail before the response starts
+        if dataset == 'ratios':
+            model, field_map, conditions = FinancialRatio, self.RATIO_FIELDS, []
+        elif dataset in self.STATEMENTS:
+            model, field_map = self.STATEMENTS[dataset]
+            conditions = [annual_statements(model)]
+        else:
+            raise StatementQueryError(f"dataset must be one of {', '.join(self.DATASETS)}.")
+
+        selected = FinancialService._select_fields(field_map, fields)
+        query = select(model.ticker, *[getattr(model, field_map[name]).label(name) for name in selected]) \
+            .where(*conditions, *FinancialService._year_range(model, year_from, year_to))
+        if tickers:
+            query = query.where(model.ticker.in_(tickers))
+        query = query.order_by(model.ticker, model.calendar_year)
+        return (dict(row._mapping) for row in stream_rows(query))
+
+    def analysis_results(self, tickers=None):
+        # Stored output of the batch analysis run
+        query = select(
+            AnalysisResult.ticker,
+            AnalysisResult.red_flags.label('redFlags'),
+            AnalysisResult.positive_indicators.label('positiveIndicators'),
+            AnalysisResult.error,
+            AnalysisResult.computed_at.label('computedAt'),
+        )
+        if tickers:
+            query = query.where(AnalysisResult.ticker.in_(tickers))
+        return (dict(row._mapping) for row in stream_rows(query.order_by(AnalysisResult.ticker)))
@@ -1,18 +1,144 @@
 # app/financial_controller.py
 
-from flask import Blueprint, jsonify
-from .financial_service import FinancialService
-from .analysis_service import AnalysisService
-from .redflags_service import RedFlagsService
-from .positive_indicators_service import PositiveIndicatorsService
+from importlib import import_module
+from flask import Blueprint, jsonify, request, current_app
+from .financial_service import FinancialService, StatementQueryError
+from .screener_service import ScreenerError
+from .cache import ticker_cache
+from .search_service import search_index, CompanyTextSearchService
+from .ticker_registry import ticker_status
+from .streaming import ndjson_response, wants_ndjson
+from .job_service import JobQueue, JobError
+from .refresh_scheduler import refresh_scheduler
+from .access_tracker import access_tracker
+from .ingest_writer import ingest_writer
+from .point_in_time_service import PointInTimeError
+from .change_feed_service import ChangeFeedService, ChangeFeedError
 financial_bp = Blueprint('financial', __name__)
+
+
+class LazyService:
+    # Imports and builds the service on first use, so booting the app doesn't pay
+    # for pandas and the analysis modules until a route needs them
+
+    def __init__(self, module_name, class_name):
+        self.module_name = module_name
+        self.class_name = class_name
+        self.instance = None
+
+    def __getattr__(self, name):
+        if self.instance is None:
+            service_class = getattr(import_module(self.module_name, __package__), self.class_name)
+            self.instance = service_class()
+        return getattr(self.instance, name)
+
+
+def cached_response(ticker, key, build):
+    # Serialized responses of the per-ticker read endpoints, reused until the ticker's data changes
+    def serialize():
+        response, status = build()
+        return response.get_data(), status
+
+    body, status = ticker_cache.cached('responses', ticker, key, serialize)
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+
+def statement_response(ticker, key, build):
+    # ?fields=revenue,netIncome and ?from=2019&to=2023 narrow a statement endpoint;
+    # each distinct combination is cached as its own response
+    fields, year_from, year_to = request.args.get('fields'), request.args.get('from'), request.args.get('to')
+    if fields or year_from or year_to:
+        key = f"{key}?fields={fields or ''}&from={year_from or ''}&to={year_to or ''}"
+    try:
+        return cached_response(ticker, key, lambda: build(ticker, fields, year_from, year_to))
+    except StatementQueryError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@financial_bp.before_request
+def wait_for_ingest():
+    # A ticker fetched by another request in this process may still be queued for the
+    # ingest writer; its reads wait for the write rather than miss the new rows
+    ticker = (request.view_args or {}).get('ticker')
+    if ticker:
+        ingest_writer.wait(ticker)
+
+
+@financial_bp.after_request
+def record_access(response):
+    # Successful per-ticker requests feed cache warming, eviction and refresh priority
+    ticker = (request.view_args or {}).get('ticker')
+    if ticker and response.status_code < 400 and not request.environ.get('lh7.cache_warm'):
+        access_tracker.record(ticker, request.endpoint)
+    return response
+
+
 financial_service = FinancialService()
-analysis_service = AnalysisService()
-redflags_service = RedFlagsService()
-positive_indicators_service = PositiveIndicatorsService()
+analysis_service = LazyService('.analysis_service', 'AnalysisService')
+redflags_service = LazyService('.redflags_service', 'RedFlagsService')
+positive_indicators_service = LazyService('.positive_indicators_service', 'PositiveIndicatorsService')
+ratio_service = LazyService('.ratio_service', 'RatioService')
+screener_service = LazyService('.screener_service', 'ScreenerService')
+peer_service = LazyService('.peer_service', 'PeerService')
+threshold_service = LazyService('.threshold_service', 'ThresholdService')
+ttm_service = LazyService('.ttm_service', 'TTMService')
+export_service = LazyService('.export_service', 'ExportService')
+point_in_time_service = LazyService('.point_in_time_service', 'PointInTimeService')
+company_text_search_service = CompanyTextSearchService()
+job_queue = JobQueue()
+change_feed = ChangeFeedService()
+
+# Routes serving stored data through the response and analysis caches, which warming may rebuild
+CACHED_ENDPOINTS = [
+    'financial.get_company_db', 'financial.get_cash_flow_db', 'financial.get_income_statement_db',
+    'financial.get_balance_sheet_db', 'financial.get_ratios_db', 'financial.get_ttm',
+    'financial.get_redflags', 'financial.get_positive_indicators',
+]
+# Statement bases the analyses can run on
+BASES = ('annual', 'quarter', 'ttm')
+
+# Reported when a ticker has no rows on a quarterly basis
+MISSING_BASIS = {'quarter': "Quarterly data not found", 'ttm': "TTM data not found"}
+# methods: the services' analyze_* methods; rules: the compiled rule sets in app/rules
+ENGINES = ('methods', 'rules')
+
+@financial_bp.route('/search', methods=['GET'])
+def search():
+    # Ticker and company-name autocomplete, e.g. /search?q=app
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify({"results": search_index.search(request.args.get('q', ''), limit)}), 200
+
+@financial_bp.route('/companies/<ticker>', methods=['GET', 'HEAD'])
+def get_company_status(ticker):
+    # Existence check without upstream calls; HEAD gives the same status code and header without a body
+    status = ticker_status(ticker)
+    code = {'stored': 200, 'listed': 200, 'unknown': 404}.get(status, 204)
+    response = jsonify({"ticker": ticker, "status": status}) if code != 204 else current_app.response_class(status=204)
+    response.status_code = code
+    response.headers['X-Ticker-Status'] = status
+    return response
+
+@financial_bp.route('/companies/search', methods=['GET'])
+def search_companies():
+    # e.g. /companies/search?text=semiconductor equipment&sector=Technology&where=freeCashFlow < 0
+    try:
+        search_data = company_text_search_service.search(
+            request.args.get('text'),
+            filters={name: request.args.get(name) for name in CompanyTextSearchService.FILTERS},
+            where=request.args.get('where'),
+            year=request.args.get('year'),
+            limit=request.args.get('limit', type=int),
+            offset=request.args.get('offset', 0, type=int),
+        )
+    except ScreenerError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(search_data), 200
 
 @financial_bp.route('/companyDB/<ticker>', methods=['GET'])
 def get_company_db(ticker):
+    return cached_response(ticker, 'companyDB', lambda: build_company_db(ticker))
+
+def build_company_db(ticker):
     company_data = FinancialService.get_company_data(ticker)
     if not company_data:
         return jsonify({"error": "Company not found"}), 404
@@ -20,25 +146,215 @@ def get_company_db(ticker):
 
 @financial_bp.route('/cashFlowDB/<ticker>', methods=['GET'])
 def get_cash_flow_db(ticker):
-    cash_flow_data = FinancialService.get_cash_flow_data(ticker)
+    return statement_response(ticker, 'cashFlowDB', build_cash_flow_db)
+
+def build_cash_flow_db(ticker, fields=None, year_from=None, year_to=None):
+    cash_flow_data = FinancialService.get_cash_flow_data(ticker, fields, year_from, year_to)
     if not cash_flow_data:
         return jsonify({"error": "Cash flow data not found"}), 404
     return jsonify({"cashFlow": cash_flow_data}), 200
 
 @financial_bp.route('/incomeStatementDB/<ticker>', methods=['GET'])
 def get_income_statement_db(ticker):
-    income_statement_data = FinancialService.get_income_statement_data(ticker)
+    return statement_response(ticker, 'incomeStatementDB', build_income_statement_db)
+
+def build_income_statement_db(ticker, fields=None, year_from=None, year_to=None):
+    income_statement_data = FinancialService.get_income_statement_data(ticker, fields, year_from, year_to)
     if not income_statement_data:
         return jsonify({"error": "Income statement data not found"}), 404
     return jsonify({"incomeStatement": income_statement_data}), 200
 
 @financial_bp.route('/balanceSheetDB/<ticker>', methods=['GET'])
 def get_balance_sheet_db(ticker):
-    balance_sheet_data = FinancialService.get_balance_sheet_data(ticker)
+    return statement_response(ticker, 'balanceSheetDB', build_balance_sheet_db)
+
+def build_balance_sheet_db(ticker, fields=None, year_from=None, year_to=None):
+    balance_sheet_data = FinancialService.get_balance_sheet_data(ticker, fields, year_from, year_to)
     if not balance_sheet_data:
         return jsonify({"error": "Balance sheet data not found"}), 404
     return jsonify({"balanceSheet": balance_sheet_data}), 200
 
+@financial_bp.route('/ratiosDB/<ticker>', methods=['GET'])
+def get_ratios_db(ticker):
+    return cached_response(ticker, 'ratiosDB', lambda: build_ratios_db(ticker))
+
+def build_ratios_db(ticker):
+    ratios_data = ratio_service.get_ratios_data(ticker)
+    if not ratios_data:
+        return jsonify({"error": "Financial ratios not found"}), 404
+    return jsonify({"ratios": ratios_data}), 200
+
+@financial_bp.route('/ttm/<ticker>', methods=['GET'])
+def get_ttm(ticker):
+    return cached_response(ticker, 'ttm', lambda: build_ttm(ticker))
+
+def build_ttm(ticker):
+    ttm_data = ttm_service.get_ttm_data(ticker)
+    if not ttm_data:
+        return jsonify({"error": "TTM data not found"}), 404
+    return jsonify({"ttm": ttm_data}), 200
+
+@financial_bp.route('/refreshRatios', methods=['POST'])
+def refresh_ratios():
+    # Recompute the ratio store for the whole universe
+    row_count = ratio_service.refresh_ratios()
+    return jsonify({"refreshed": row_count}), 200
+
+@financial_bp.route('/screen', methods=['GET'])
+def screen():
+    # e.g. /screen?where=debt_to_equity > 2 AND free_cash_flow < 0 AND sector = 'Technology'&from=2019&to=2023
+    # ?format=ndjson streams every match, one per line, instead of a page
+    try:
+        if wants_ndjson(request):
+            return ndjson_response(screener_service.stream(
+                where=request.args.get('where'),
+                year_from=request.args.get('from'),
+                year_to=request.args.get('to'),
+            ))
+        screen_data = screener_service.screen(
+            where=request.args.get('where'),
+            year_from=request.args.get('from'),
+            year_to=request.args.get('to'),
+            limit=request.args.get('limit', type=int),
+            offset=request.args.get('offset', 0, type=int),
+        )
+    except ScreenerError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(screen_data), 200
+
+@financial_bp.route('/export/<dataset>', methods=['GET'])
+def export_dataset(dataset):
+    # NDJSON of a whole dataset across the universe, e.g. /export/ratios?fields=roe,netMargin&from=2019
+    tickers = request.args.get('tickers')
+    try:
+        records = export_service.records(
+            dataset,
+            fields=request.args.get('fields'),
+            year_from=request.args.get('from'),
+            year_to=request.args.get('to'),
+            tickers=tickers.split(',') if tickers else None,
+        )
+    except StatementQueryError as e:
+        return jsonify({"error": str(e)}), 400
+    return ndjson_response(records)
+
+@financial_bp.route('/batch/results', methods=['GET'])
+def get_batch_results():
+    # Stored batch analysis output as NDJSON, optionally for ?tickers=aapl,msft
+    tickers = request.args.get('tickers')
+    return ndjson_response(export_service.analysis_results(tickers.split(',') if tickers else None))
+
+@financial_bp.route('/pointInTime/<ticker>', methods=['GET'])
+def get_point_in_time(ticker):
+    # The periods of a statement as they read on a past date, restatements after it left out,
+    # e.g. /pointInTime/aapl?asOf=2021-06-30&statement=balanceSheet
+    as_of = request.args.get('asOf')
+    statement = request.args.get('statement', 'incomeStatement')
+    try:
+        records = point_in_time_service.statements_as_of(ticker, statement, as_of)
+    except PointInTimeError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"asOf": as_of, statement: records}), 200
+
+@financial_bp.route('/pointInTime/analysis', methods=['GET'])
+def get_point_in_time_analysis():
+    # NDJSON of red flags and positive indicators on ?asOf=, from the statements known then
+    tickers = request.args.get('tickers')
+    try:
+        results = point_in_time_service.analyze_as_of(request.args.get('asOf'), tickers.split(',') if tickers else None)
+    except PointInTimeError as e:
+        return jsonify({"error": str(e)}), 400
+    return ndjson_response(results)
+
+@financial_bp.route('/pointInTime/backfill', methods=['POST'])
+def backfill_point_in_time():
+    # First versions for stored periods that have none. Runs on its own when the table is
+    # created; this catches rows written outside the app afterwards
+    return jsonify({"versions": point_in_time_service.backfill()}), 200
+
+@financial_bp.route('/changes', methods=['GET'])
+def get_changes():
+    # NDJSON of the rows changed after ?since=<cursor>, oldest first, at most ?limit= of them;
+    # the next request passes the cursor of the last line. since=0 starts from every stored row
+    try:
+        changes = change_feed.changes(
+            since=request.args.get('since', 0, type=int),
+            limit=request.args.get('limit', type=int),
+        )
+    except ChangeFeedError as e:
+        return jsonify({"error": str(e)}), 400
+    return ndjson_response(changes)
+
+@financial_bp.route('/changes/stats', methods=['GET'])
+def get_change_stats():
+    return jsonify(change_feed.stats()), 200
+
+@financial_bp.route('/changes/compact', methods=['POST'])
+def compact_changes():
+    return jsonify({"removed": change_feed.compact()}), 200
+
+@financial_bp.route('/jobs/<kind>', methods=['POST'])
+def enqueue_job(kind):
+    # /jobs/ingest {"tickers": [...], "period": "quarter"} or /jobs/analyze {"tickers": [...]};
+    # run by worker.py, polled at /jobs/<id>
+    try:
+        job = job_queue.enqueue(kind, request.get_json(silent=True))
+    except JobError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify({"job": job})
+    response.status_code = 202
+    response.headers['Location'] = f"/jobs/{job['id']}"
+    return response
+
+@financial_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"job": job}), 200
+
+@financial_bp.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"job": job}), 200
+
+@financial_bp.route('/scheduler/metrics', methods=['GET'])
+def get_scheduler_metrics():
+    return jsonify(refresh_scheduler.metrics()), 200
+
+@financial_bp.route('/ingest/metrics', methods=['GET'])
+def get_ingest_metrics():
+    return jsonify(ingest_writer.metrics()), 200
+
+@financial_bp.route('/scheduler/run', methods=['POST'])
+def run_scheduler():
+    # One refresh cycle now, optionally with its own ?budget= of FMP requests
+    summary = refresh_scheduler.run_cycle(request.args.get('budget', type=int))
+    if summary is None:
+        return jsonify({"error": "A refresh cycle is already running"}), 409
+    return jsonify(summary), 200
+
+@financial_bp.route('/peers/<ticker>/percentiles', methods=['GET'])
+def get_peer_percentiles(ticker):
+    percentile_data = peer_service.get_percentiles(ticker, request.args.get('year'))
+    if not percentile_data:
+        return jsonify({"error": "Financial ratios not found"}), 404
+    return jsonify(percentile_data), 200
+
+@financial_bp.route('/sectorThresholds', methods=['GET'])
+def get_sector_thresholds():
+    return jsonify({"thresholds": threshold_service.get_thresholds_data()}), 200
+
+@financial_bp.route('/calibrateThresholds', methods=['POST'])
+def calibrate_thresholds():
+    # Derive per-sector rule thresholds from the ratio store distribution
+    threshold_count = threshold_service.calibrate(request.args.get('minObservations', type=int))
+    if threshold_count is None:
+        return jsonify({"calibrated": 0, "message": "Nothing to calibrate: the ratio store is empty."}), 200
+    return jsonify({"calibrated": threshold_count}), 200
+
 
 
 
@@ -50,7 +366,19 @@ def get_balance_sheet_db(ticker):
 
 @financial_bp.route('/redflags/<ticker>', methods=['GET'])
 def get_redflags(ticker):
-    redflags_data = redflags_service.analyze_red_flags(ticker)
+    # ?basis=quarter|ttm runs the rules on quarterly or trailing-twelve-month series
+    basis = request.args.get('basis', 'annual')
+    if basis not in BASES:
+        return jsonify({"error": f"basis must be one of {', '.join(BASES)}"}), 400
+    engine = request.args.get('engine', 'methods')
+    if engine not in ENGINES:
+        return jsonify({"error": f"engine must be one of {', '.join(ENGINES)}"}), 400
+    key = f'redflags:{basis}' if engine == 'methods' else f'redflags:{basis}:{engine}'
+    # Sector thresholds change the result without changing the ticker's data version
+    key = f'{key}:t{threshold_service.version()}'
+    redflags_data = ticker_cache.cached('analysis', ticker, key, lambda: redflags_service.analyze_red_flags(ticker, basis, engine))
+    if redflags_data is None:
+        return jsonify({"error": MISSING_BASIS[basis]}), 404
     return jsonify({'redflags': redflags_data})
 
 # New endpoint to return financial data as a DataFrame in JSON format
@@ -69,7 +397,18 @@ def get_financial_data_as_dataframe(ticker):
 
 @financial_bp.route('/positiveindicators/<ticker>', methods=['GET'])
 def get_positive_indicators(ticker):
-    positive_data = positive_indicators_service.analyze_positive_indicators(ticker)
+    basis = request.args.get('basis', 'annual')
+    if basis not in BASES:
+        return jsonify({"error": f"basis must be one of {', '.join(BASES)}"}), 400
+    engine = request.args.get('engine', 'methods')
+    if engine not in ENGINES:
+        return jsonify({"error": f"engine must be one of {', '.join(ENGINES)}"}), 400
+    key = f'positive:{basis}' if engine == 'methods' else f'positive:{basis}:{engine}'
+    # Sector thresholds change the result without changing the ticker's data version
+    key = f'{key}:t{threshold_service.version()}'
+    positive_data = ticker_cache.cached('analysis', ticker, key, lambda: positive_indicators_service.analyze_positive_indicators(ticker, basis, engine))
+    if positive_data is None:
+        return jsonify({"error": MISSING_BASIS[basis]}), 404
     return jsonify({'positive_indicators': positive_data})
 
 @financial_bp.route('/balanceSheet/<ticker>', methods=['GET'])
@@ -90,4 +429,7 @@ def get_cash_flow(ticker):
 
 @financial_bp.route('/financialData/<ticker>', methods=['GET'])
 def get_all_financial_data(ticker):
+    # ?period=quarter pulls the quarterly statements and rolls the TTM flows forward
+    if request.args.get('period') == 'quarter':
+        return jsonify(financial_service.fetch_quarterly_data(ticker))
     return jsonify(financial_service.fetch_all_data(ticker))
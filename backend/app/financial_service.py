@@ -1,76 +1,363 @@
 # app/financial_service.py
 
-import requests
 import os
+from sqlalchemy import select
 from .db import db
-from .models import Company, BalanceSheet, IncomeStatement, CashFlow
+from .models import Company, BalanceSheet, IncomeStatement, CashFlow, QUARTERLY_PERIODS, annual_statements
+from .cache import ticker_cache, bump_data_versions
+from .search_service import search_index
+from .ticker_registry import unknown_tickers
+from .ingest_writer import ingest_writer, IngestWriter
+from .point_in_time_service import PointInTimeService
+from .change_feed_service import log_changes
 from dotenv import load_dotenv
 
 load_dotenv()
 
+
+class StatementQueryError(ValueError):
+    pass
+
+
 class FinancialService:
+
+    # camelCase field -> CashFlow column served by get_cash_flow_data
+    CASH_FLOW_FIELDS = {
+        "date": "date",
+        # Calendar Year
+        "calendarYear": "calendar_year",
+
+        # Operating Activities (Group 1)
+        "netIncome": "net_income",
+        "depreciationAndAmortization": "depreciation_and_amortization",
+        "deferredIncomeTax": "deferred_income_tax",
+        "stockBasedCompensation": "stock_based_compensation",
+        "changeInWorkingCapital": "change_in_working_capital",
+        "accountsReceivables": "accounts_receivables",
+        "inventory": "inventory",
+        "accountsPayables": "accounts_payables",
+        "otherWorkingCapital": "other_working_capital",
+        "otherNonCashItems": "other_non_cash_items",
+        "netCashProvidedByOperatingActivities": "net_cash_provided_by_operating_activities",
+
+        # Investing Activities (Group 2)
+        "investmentsInPropertyPlantAndEquipment": "investments_in_property_plant_and_equipment",
+        "acquisitionsNet": "acquisitions_net",
+        "purchasesOfInvestments": "purchases_of_investments",
+        "salesMaturitiesOfInvestments": "sales_maturities_of_investments",
+        "otherInvestingActivities": "other_investing_activities",
+        "netCashUsedForInvestingActivities": "net_cash_used_for_investing_activities",
+
+        # Financing Activities (Group 3)
+        "debtRepayment": "debt_repayment",
+        "commonStockIssued": "common_stock_issued",
+        "commonStockRepurchased": "common_stock_repurchased",
+        "dividendsPaid": "dividends_paid",
+        "otherFinancingActivities": "other_financing_activities",
+        "netCashUsedProvidedByFinancingActivities": "net_cash_used_provided_by_financing_activities",
+
+        #  Free Cash Flow (Group 4)
+        "operatingCashFlow": "operating_cash_flow",
+        "capitalExpenditure": "capital_expenditure",
+        "freeCashFlow": "free_cash_flow",
+
+        # Cash Balance & Changes (Group 5)
+        "netChangeInCash": "net_change_in_cash",
+        "cashAtEndOfPeriod": "cash_at_end_of_period",
+        "cashAtBeginningOfPeriod": "cash_at_beginning_of_period",
+    }
+
+    # camelCase field -> IncomeStatement column served by get_income_statement_data
+    INCOME_STATEMENT_FIELDS = {
+        # Date
+        "date": "date",
+
+        # Calendar Year
+        "calendarYear": "calendar_year",
+
+        # Revenue & Gross Profit (Group 1)
+        "revenue": "revenue",
+        "costOfRevenue": "cost_of_revenue",
+        "grossProfit": "gross_profit",
+        "grossProfitRatio": "gross_profit_ratio",
+
+        # Operating Expenses (Group 2)
+        "researchAndDevelopmentExpenses": "research_and_development_expenses",
+        "sellingGeneralAndAdministrativeExpenses": "selling_general_and_administrative_expenses",
+        "operatingExpenses": "operating_expenses",
+        "costAndExpenses": "cost_and_expenses",
+        "depreciationAndAmortization": "depreciation_and_amortization",
+
+        # Operating & Non-Operating Income (Group 3)
+        "operatingIncome": "operating_income",
+        "operatingIncomeRatio": "operating_income_ratio",
+        "interestIncome": "interest_income",
+        "interestExpense": "interest_expense",
+        "totalOtherIncomeExpensesNet": "total_other_income_expenses_net",
+        "ebitda": "ebitda",
+        "ebitdaratio": "ebitda_ratio",
+
+        # Net Income (Group 4)
+        "incomeBeforeTax": "income_before_tax",
+        "incomeBeforeTaxRatio": "income_before_tax_ratio",
+        "incomeTaxExpense": "income_tax_expense",
+        "netIncome": "net_income",
+        "netIncomeRatio": "net_income_ratio",
+
+        # Per Share Data (Group 5)
+        "eps": "eps",
+        "epsDiluted": "eps_diluted",
+        "weightedAverageShsOut": "weighted_average_shs_out",
+        "weightedAverageShsOutDil": "weighted_average_shs_out_dil",
+    }
+
+    # camelCase field -> BalanceSheet column served by get_balance_sheet_data
+    BALANCE_SHEET_FIELDS = {
+        # Date
+        "date": "date",
+
+        # Calendar Year
+        "calendarYear": "calendar_year",
+
+        # Assets
+        "cashAndCashEquivalents": "cash_and_cash_equivalents",
+        "shortTermInvestments": "short_term_investments",
+        "cashAndShortTermInvestments": "cash_and_short_term_investments",
+        "netReceivables": "net_receivables",
+        "inventory": "inventory",
+        "otherCurrentAssets": "other_current_assets",
+        "totalCurrentAssets": "total_current_assets",
+        "propertyPlantEquipmentNet": "property_plant_equipment_net",
+        "goodwill": "goodwill",
+        "intangibleAssets": "intangible_assets",
+        "goodwillAndIntangibleAssets": "goodwill_and_intangible_assets",
+        "longTermInvestments": "long_term_investments",
+        "otherNonCurrentAssets": "other_non_current_assets",
+        "totalNonCurrentAssets": "total_non_current_assets",
+        "totalAssets": "total_assets",
+
+        # Liabilities
+        "accountPayables": "account_payables",
+        "shortTermDebt": "short_term_debt",
+        "deferredRevenue": "deferred_revenue",
+        "otherCurrentLiabilities": "other_current_liabilities",
+        "totalCurrentLiabilities": "total_current_liabilities",
+        "longTermDebt": "long_term_debt",
+        "deferredRevenueNonCurrent": "deferred_revenue_non_current",
+        "deferredTaxLiabilitiesNonCurrent": "deferred_tax_liabilities_non_current",
+        "otherNonCurrentLiabilities": "other_non_current_liabilities",
+        "totalNonCurrentLiabilities": "total_non_current_liabilities",
+        "totalLiabilities": "total_liabilities",
+
+        # Equity
+        "commonStock": "common_stock",
+        "retainedEarnings": "retained_earnings",
+        "accumulatedOtherComprehensiveIncomeLoss": "accumulated_other_comprehensive_income_loss",
+        "totalStockholdersEquity": "total_stockholders_equity",
+        "totalEquity": "total_equity",
+    }
+
     def __init__(self):
         self.api_key = os.getenv('FMP_API_KEY')
         self.base_url = 'https://financialmodelingprep.com/api/v3'
 
-    def fetch_balance_sheet(self, ticker):
-        return self._get_data(f"/balance-sheet-statement/{ticker}")
+    def fetch_balance_sheet(self, ticker, period='annual'):
+        return self._get_data(f"/balance-sheet-statement/{ticker}", period)
 
     def fetch_company_name(self, ticker):
         response = self._get_data(f"/profile/{ticker}")
         return response[0] if response else {}
 
-    def fetch_income_statement(self, ticker):
-        return self._get_data(f"/income-statement/{ticker}")
+    def fetch_profile(self, ticker):
+        return self.profile_from(self._get_data(f"/profile/{ticker}"))
 
-    def fetch_cash_flow(self, ticker):
-        return self._get_data(f"/cash-flow-statement/{ticker}")
+    @staticmethod
+    def profile_from(response):
+        # {} when FMP doesn't know the ticker, None when the call itself failed
+        if isinstance(response, list):
+            return response[0] if response else {}
+        return None
 
-    def fetch_all_data(self, ticker):
-        # Check if data for this ticker already exists
-        existing_company = Company.query.filter_by(ticker=ticker).first()
+    def fetch_income_statement(self, ticker, period='annual'):
+        return self._get_data(f"/income-statement/{ticker}", period)
 
-        if existing_company:
-            # Data exists in the database, retrieve it
-            balance_sheets = BalanceSheet.query.filter_by(ticker=ticker).all()
-            income_statements = IncomeStatement.query.filter_by(ticker=ticker).all()
-            cash_flows = CashFlow.query.filter_by(ticker=ticker).all()
+    def fetch_cash_flow(self, ticker, period='annual'):
+        return self._get_data(f"/cash-flow-statement/{ticker}", period)
 
-            return {
-                "companyName": {"companyName": existing_company.name},
-                "balanceSheet": [{"totalAssets": bs.total_assets, "totalLiabilities": bs.total_liabilities} for bs in balance_sheets],
-                "incomeStatement": [{"revenue": is_.revenue, "netIncome": is_.net_income} for is_ in income_statements],
-                "cashFlow": [{"operatingCashFlow": cf.operating_cash_flow} for cf in cash_flows]
-            }
+    # The ASGI app awaits the same upstream calls on a shared httpx.AsyncClient
 
-        else:
-            # Data does not exist, fetch from API and store in database
-            balance_sheet_data = self.fetch_balance_sheet(ticker)
-            company_data = self.fetch_company_name(ticker)
-            income_statement_data = self.fetch_income_statement(ticker)
-            cash_flow_data = self.fetch_cash_flow(ticker)
-
-            # Save to database
-            self._save_to_db(ticker, company_data, balance_sheet_data, income_statement_data, cash_flow_data)
-
-            return {
-                "balanceSheet": balance_sheet_data,
-                "companyName": company_data,
-                "incomeStatement": income_statement_data,
-                "cashFlow": cash_flow_data
-            }
-
-    def _get_data(self, endpoint):
+    async def fetch_profile_async(self, client, ticker):
+        return self.profile_from(await self._get_data_async(client, f"/profile/{ticker}"))
+
+    async def fetch_statements_async(self, client, ticker):
+        # Balance sheets, income statements and cash flows, requested concurrently
+        import asyncio
+        return await asyncio.gather(
+            self._get_data_async(client, f"/balance-sheet-statement/{ticker}"),
+            self._get_data_async(client, f"/income-statement/{ticker}"),
+            self._get_data_async(client, f"/cash-flow-statement/{ticker}"),
+        )
+
+    def fetch_all_data(self, ticker, wait=False):
+        # The fetched statements are stored by the ingest writer; with wait, this returns
+        # only once they are
+        data = self.local_data(ticker)
+        if data is not None:
+            return data
+
+        # The profile decides whether the ticker exists before spending three more calls
+        company_data = self.fetch_profile(ticker)
+        if not company_data:
+            return self.missing_profile(ticker, company_data)
+
+        # Data does not exist, fetch from API and store in database
+        balance_sheet_data = self.fetch_balance_sheet(ticker)
+        income_statement_data = self.fetch_income_statement(ticker)
+        cash_flow_data = self.fetch_cash_flow(ticker)
+        return self.ingest(ticker, company_data, balance_sheet_data, income_statement_data, cash_flow_data, wait)
+
+    # The steps of fetch_all_data around the upstream calls, shared with the ASGI app
+
+    def local_data(self, ticker):
+        # What fetch_all_data answers without upstream calls, else None. Check if data for
+        # this ticker already exists
+        stored_data = self.get_stored_data(ticker)
+        if stored_data:
+            return stored_data
+
+        # Tickers FMP recently said it doesn't know cost no upstream calls
+        if unknown_tickers.is_unknown(ticker):
+            return self.empty_data()
+        return None
+
+    def missing_profile(self, ticker, company_data):
+        if company_data == {}:
+            unknown_tickers.mark_unknown(ticker)
+        # Nothing is persisted for unknown tickers or failed lookups
+        return self.empty_data()
+
+    def ingest(self, ticker, company_data, balance_sheet_data, income_statement_data, cash_flow_data, wait=False):
+        # Queue for the writer, which stores it with the other tickers fetched meanwhile
+        written = ingest_writer.submit(ticker, company_data, balance_sheet_data, income_statement_data, cash_flow_data)
+        if wait:
+            written.result(IngestWriter.WAIT_TIMEOUT)
+
+        return {
+            "balanceSheet": balance_sheet_data,
+            "companyName": company_data,
+            "incomeStatement": income_statement_data,
+            "cashFlow": cash_flow_data
+        }
+
+    def empty_data(self):
+        # Same shape as a fetch for a ticker FMP has nothing for
+        return {
+            "balanceSheet": [],
+            "companyName": {},
+            "incomeStatement": [],
+            "cashFlow": []
+        }
+
+    def get_stored_data(self, ticker):
+        existing_company = Company.query.filter_by(ticker=ticker).first()
+        if not existing_company:
+            return None
+
+        # Data exists in the database, retrieve it
+        balance_sheets = BalanceSheet.query.filter_by(ticker=ticker).filter(annual_statements(BalanceSheet)).all()
+        income_statements = IncomeStatement.query.filter_by(ticker=ticker).filter(annual_statements(IncomeStatement)).all()
+        cash_flows = CashFlow.query.filter_by(ticker=ticker).filter(annual_statements(CashFlow)).all()
+
+        return {
+            "companyName": {"companyName": existing_company.name},
+            "balanceSheet": [{"totalAssets": bs.total_assets, "totalLiabilities": bs.total_liabilities} for bs in balance_sheets],
+            "incomeStatement": [{"revenue": is_.revenue, "netIncome": is_.net_income} for is_ in income_statements],
+            "cashFlow": [{"operatingCashFlow": cf.operating_cash_flow} for cf in cash_flows]
+        }
+
+    def fetch_quarterly_data(self, ticker):
+        # Quarterly statements hang off the company row, so a new ticker gets its annual data first
+        if not Company.query.filter_by(ticker=ticker).first():
+            self.fetch_all_data(ticker, wait=True)
+            if not Company.query.filter_by(ticker=ticker).first():
+                return dict(self.empty_data(), newQuarters=[])
+
+        balance_sheet_data = self.fetch_balance_sheet(ticker, 'quarter')
+        income_statement_data = self.fetch_income_statement(ticker, 'quarter')
+        cash_flow_data = self.fetch_cash_flow(ticker, 'quarter')
+
+        # Stored by the ingest writer, like new tickers
+        new_quarters = ingest_writer.update(ticker, balance_sheet_data, income_statement_data, cash_flow_data, quarterly=True).result(IngestWriter.WAIT_TIMEOUT)
+
+        return {
+            "balanceSheet": balance_sheet_data,
+            "incomeStatement": income_statement_data,
+            "cashFlow": cash_flow_data,
+            "newQuarters": new_quarters
+        }
+
+    def _url(self, endpoint, period='annual'):
         url = f"{self.base_url}{endpoint}?apikey={self.api_key}"
+        if period == 'quarter':
+            url += "&period=quarter"
+        return url
+
+    def _get_data(self, endpoint, period='annual'):
+        # requests is only needed for upstream calls, not for serving stored data
+        import requests
         try:
-            response = requests.get(url)
+            response = requests.get(self._url(endpoint, period))
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
             print(f"Error fetching data: {e}")
             return {}
 
-    def _save_to_db(self, ticker, company_data, balance_sheet_data, income_statement_data, cash_flow_data):
+    async def _get_data_async(self, client, endpoint, period='annual'):
+        import httpx
+        try:
+            response = await client.get(self._url(endpoint, period))
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"Error fetching data: {e}")
+            return {}
+
+    def save_ingested(self, payloads):
+        # (ticker, company, balance sheets, income statements, cash flows) tuples from the
+        # ingest writer, stored in one transaction. Tickers stored since they were fetched are
+        # skipped; returns the tickers written
+        written = []
+        for ticker, company_data, balance_sheet_data, income_statement_data, cash_flow_data in payloads:
+            if ticker in written or db.session.get(Company, ticker) is not None:
+                continue
+            self._add_ticker(ticker, company_data, balance_sheet_data, income_statement_data, cash_flow_data)
+            unknown_tickers.forget(ticker)
+            written.append(ticker)
+        if not written:
+            db.session.rollback()
+            return []
+
+        # New data versions for the tickers, so every cached value built from the old rows is dropped
+        bump_data_versions(written)
+        for model, position in [(BalanceSheet, 2), (IncomeStatement, 3), (CashFlow, 4)]:
+            log_changes(model.__tablename__, [
+                (payload[0], data.get('date'), data.get('period'))
+                for payload in payloads if payload[0] in written for data in payload[position] if data.get('date')
+            ], 'insert')
+
+        # Commit all changes to the database
+        db.session.commit()
+        for ticker in written:
+            ticker_cache.invalidate(ticker)
+        # Make the new companies searchable right away in this worker
+        if search_index.loaded:
+            for ticker, company_data, *statements in payloads:
+                if ticker in written:
+                    search_index.add(ticker, company_data.get('companyName'))
+        return written
+
+    def _add_ticker(self, ticker, company_data, balance_sheet_data, income_statement_data, cash_flow_data):
         
         # Store company data
         company = Company(
@@ -113,159 +400,270 @@ class FinancialService:
         )
         db.session.add(company)
         
-        for data in balance_sheet_data:
-            balance_sheet = BalanceSheet(
-                ticker=ticker,
-                accepted_date=data.get('acceptedDate'),
-                account_payables=data.get('accountPayables'),
-                accumulated_other_comprehensive_income_loss=data.get('accumulatedOtherComprehensiveIncomeLoss'),
-                calendar_year=data.get('calendarYear'),
-                capital_lease_obligations=data.get('capitalLeaseObligations'),
-                cash_and_cash_equivalents=data.get('cashAndCashEquivalents'),
-                cash_and_short_term_investments=data.get('cashAndShortTermInvestments'),
-                cik=data.get('cik'),
-                common_stock=data.get('commonStock'),
-                date=data.get('date'),
-                deferred_revenue=data.get('deferredRevenue'),
-                deferred_revenue_non_current=data.get('deferredRevenueNonCurrent'),
-                deferred_tax_liabilities_non_current=data.get('deferredTaxLiabilitiesNonCurrent'),
-                filling_date=data.get('fillingDate'),
-                final_link=data.get('finalLink'),
-                goodwill=data.get('goodwill'),
-                goodwill_and_intangible_assets=data.get('goodwillAndIntangibleAssets'),
-                intangible_assets=data.get('intangibleAssets'),
-                inventory=data.get('inventory'),
-                link=data.get('link'),
-                long_term_debt=data.get('longTermDebt'),
-                long_term_investments=data.get('longTermInvestments'),
-                minority_interest=data.get('minorityInterest'),
-                net_debt=data.get('netDebt'),
-                net_receivables=data.get('netReceivables'),
-                other_assets=data.get('otherAssets'),
-                other_current_assets=data.get('otherCurrentAssets'),
-                other_current_liabilities=data.get('otherCurrentLiabilities'),
-                other_liabilities=data.get('otherLiabilities'),
-                other_non_current_assets=data.get('otherNonCurrentAssets'),
-                other_non_current_liabilities=data.get('otherNonCurrentLiabilities'),
-                othertotal_stockholders_equity=data.get('othertotalStockholdersEquity'),
-                period=data.get('period'),
-                preferred_stock=data.get('preferredStock'),
-                property_plant_equipment_net=data.get('propertyPlantEquipmentNet'),
-                reported_currency=data.get('reportedCurrency'),
-                retained_earnings=data.get('retainedEarnings'),
-                short_term_debt=data.get('shortTermDebt'),
-                short_term_investments=data.get('shortTermInvestments'),
-                tax_assets=data.get('taxAssets'),
-                tax_payables=data.get('taxPayables'),
-                total_assets=data.get('totalAssets'),
-                total_current_assets=data.get('totalCurrentAssets'),
-                total_current_liabilities=data.get('totalCurrentLiabilities'),
-                total_debt=data.get('totalDebt'),
-                total_equity=data.get('totalEquity'),
-                total_investments=data.get('totalInvestments'),
-                total_liabilities=data.get('totalLiabilities'),
-                total_liabilities_and_stockholders_equity=data.get('totalLiabilitiesAndStockholdersEquity'),
-                total_liabilities_and_total_equity=data.get('totalLiabilitiesAndTotalEquity'),
-                total_non_current_assets=data.get('totalNonCurrentAssets'),
-                total_non_current_liabilities=data.get('totalNonCurrentLiabilities'),
-                total_stockholders_equity=data.get('totalStockholdersEquity')
-            )
-            db.session.add(balance_sheet)
+        balance_sheets = [self._balance_sheet_record(ticker, data) for data in balance_sheet_data]
+        db.session.add_all(balance_sheets)
 
         # Store income statement data
-        for data in income_statement_data:
-            income_statement = IncomeStatement(
-                ticker=ticker,
-                accepted_date=data.get('acceptedDate'),
-                calendar_year=data.get('calendarYear'),
-                cik=data.get('cik'),
-                cost_and_expenses=data.get('costAndExpenses'),
-                cost_of_revenue=data.get('costOfRevenue'),
-                date=data.get('date'),
-                depreciation_and_amortization=data.get('depreciationAndAmortization'),
-                ebitda=data.get('ebitda'),
-                ebitda_ratio=data.get('ebitdaratio'),
-                eps=data.get('eps'),
-                eps_diluted=data.get('epsdiluted'),
-                filling_date=data.get('fillingDate'),
-                final_link=data.get('finalLink'),
-                general_and_administrative_expenses=data.get('generalAndAdministrativeExpenses'),
-                gross_profit=data.get('grossProfit'),
-                gross_profit_ratio=data.get('grossProfitRatio'),
-                income_before_tax=data.get('incomeBeforeTax'),
-                income_before_tax_ratio=data.get('incomeBeforeTaxRatio'),
-                income_tax_expense=data.get('incomeTaxExpense'),
-                interest_expense=data.get('interestExpense'),
-                interest_income=data.get('interestIncome'),
-                link=data.get('link'),
-                net_income=data.get('netIncome'),
-                net_income_ratio=data.get('netIncomeRatio'),
-                operating_expenses=data.get('operatingExpenses'),
-                operating_income=data.get('operatingIncome'),
-                operating_income_ratio=data.get('operatingIncomeRatio'),
-                other_expenses=data.get('otherExpenses'),
-                period=data.get('period'),
-                reported_currency=data.get('reportedCurrency'),
-                research_and_development_expenses=data.get('researchAndDevelopmentExpenses'),
-                revenue=data.get('revenue'),
-                selling_and_marketing_expenses=data.get('sellingAndMarketingExpenses'),
-                selling_general_and_administrative_expenses=data.get('sellingGeneralAndAdministrativeExpenses'),
-                total_other_income_expenses_net=data.get('totalOtherIncomeExpensesNet'),
-                weighted_average_shs_out=data.get('weightedAverageShsOut'),
-                weighted_average_shs_out_dil=data.get('weightedAverageShsOutDil')
-            )
-            db.session.add(income_statement)
-        
-        
+        income_statements = [self._income_statement_record(ticker, data) for data in income_statement_data]
+        db.session.add_all(income_statements)
 
         # Store cash flow data
-        
-        for data in cash_flow_data:
-            cash_flow = CashFlow(
-                ticker=ticker,
-                accepted_date=data.get('acceptedDate'),
-                accounts_payables=data.get('accountsPayables'),
-                accounts_receivables=data.get('accountsReceivables'),
-                acquisitions_net=data.get('acquisitionsNet'),
-                calendar_year=data.get('calendarYear'),
-                capital_expenditure=data.get('capitalExpenditure'),
-                cash_at_beginning_of_period=data.get('cashAtBeginningOfPeriod'),
-                cash_at_end_of_period=data.get('cashAtEndOfPeriod'),
-                change_in_working_capital=data.get('changeInWorkingCapital'),
-                cik=data.get('cik'),
-                common_stock_issued=data.get('commonStockIssued'),
-                common_stock_repurchased=data.get('commonStockRepurchased'),
-                date=data.get('date'),
-                debt_repayment=data.get('debtRepayment'),
-                deferred_income_tax=data.get('deferredIncomeTax'),
-                depreciation_and_amortization=data.get('depreciationAndAmortization'),
-                dividends_paid=data.get('dividendsPaid'),
-                effect_of_forex_changes_on_cash=data.get('effectOfForexChangesOnCash'),
-                filling_date=data.get('fillingDate'),
-                final_link=data.get('finalLink'),
-                free_cash_flow=data.get('freeCashFlow'),
-                inventory=data.get('inventory'),
-                investments_in_property_plant_and_equipment=data.get('investmentsInPropertyPlantAndEquipment'),
-                link=data.get('link'),
-                net_cash_provided_by_operating_activities=data.get('netCashProvidedByOperatingActivities'),
-                net_cash_used_for_investing_activities=data.get('netCashUsedForInvestingActivites'),
-                net_cash_used_provided_by_financing_activities=data.get('netCashUsedProvidedByFinancingActivities'),
-                net_change_in_cash=data.get('netChangeInCash'),
-                net_income=data.get('netIncome'),
-                operating_cash_flow=data.get('operatingCashFlow'),
-                other_financing_activities=data.get('otherFinancingActivites'),
-                other_investing_activities=data.get('otherInvestingActivites'),
-                other_non_cash_items=data.get('otherNonCashItems'),
-                other_working_capital=data.get('otherWorkingCapital'),
-                period=data.get('period'),
-                purchases_of_investments=data.get('purchasesOfInvestments'),
-                reported_currency=data.get('reportedCurrency'),
-                sales_maturities_of_investments=data.get('salesMaturitiesOfInvestments'),
-                stock_based_compensation=data.get('stockBasedCompensation')
-            )
-            db.session.add(cash_flow)
-        # Commit all changes to the database
+        cash_flows = [self._cash_flow_record(ticker, data) for data in cash_flow_data]
+        db.session.add_all(cash_flows)
+
+        # First versions of every period in the point-in-time store
+        point_in_time = PointInTimeService()
+        for model, records in [(BalanceSheet, balance_sheets), (IncomeStatement, income_statements), (CashFlow, cash_flows)]:
+            point_in_time.record(model, ticker, records)
+
+    def refresh_annual_data(self, ticker):
+        # New fiscal years of a stored ticker; fetch_all_data only ever ingests a ticker once
+        balance_sheet_data = self.fetch_balance_sheet(ticker)
+        income_statement_data = self.fetch_income_statement(ticker)
+        cash_flow_data = self.fetch_cash_flow(ticker)
+
+        return ingest_writer.update(ticker, balance_sheet_data, income_statement_data, cash_flow_data, quarterly=False).result(IngestWriter.WAIT_TIMEOUT)
+
+    def save_update(self, ticker, balance_sheet_data, income_statement_data, cash_flow_data, quarterly):
+        # New periods of a stored ticker from the ingest writer, then the tables derived from them
+        new_dates = self._save_new_statements(ticker, balance_sheet_data, income_statement_data, cash_flow_data, quarterly)
+        if not new_dates:
+            return []
+
+        if quarterly:
+            # Roll the trailing twelve months forward from the earliest new quarter only
+            from .ttm_service import TTMService
+            TTMService().refresh_ttm([ticker], since=min(new_dates))
+        else:
+            from .ratio_service import RatioService
+            RatioService().refresh_ratios([ticker])
+        return new_dates
+
+    def _save_new_statements(self, ticker, balance_sheet_data, income_statement_data, cash_flow_data, quarterly):
+        # Only periods that aren't stored yet are inserted, so repeated polling is cheap.
+        # Restated periods keep their stored row and become a new point-in-time version
+        new_dates = set()
+        versions = 0
+        changes = []  # (table, change, keys of the changed rows)
+        point_in_time = PointInTimeService()
+        for model, records, build in [
+            (BalanceSheet, balance_sheet_data, self._balance_sheet_record),
+            (IncomeStatement, income_statement_data, self._income_statement_record),
+            (CashFlow, cash_flow_data, self._cash_flow_record),
+        ]:
+            periods = model.period.in_(QUARTERLY_PERIODS) if quarterly else annual_statements(model)
+            stored = {date for (date,) in db.session.query(model.date).filter(model.ticker == ticker, periods)}
+            reported, inserted = [], []
+            for data in records:
+                if (data.get('period') in QUARTERLY_PERIODS) == quarterly and data.get('date'):
+                    record = build(ticker, data)
+                    reported.append(record)
+                    if data['date'] not in stored:
+                        db.session.add(record)
+                        stored.add(data['date'])
+                        new_dates.add(data['date'])
+                        inserted.append((ticker, record.date, record.period))
+            written, restated = point_in_time.record(model, ticker, reported)
+            versions += written
+            changes += [(model.__tablename__, 'insert', inserted),
+                        (model.__tablename__, 'restate', [(ticker, date, period) for date, period in restated])]
+
+        if any(keys for table, change, keys in changes):
+            bump_data_versions([ticker])
+            for table, change, keys in changes:
+                log_changes(table, keys, change)
+        if not new_dates:
+            if versions:
+                db.session.commit()
+            return []
+
         db.session.commit()
+        ticker_cache.invalidate(ticker)
+        return sorted(new_dates)
+
+    def _balance_sheet_record(self, ticker, data):
+        return BalanceSheet(
+            ticker=ticker,
+            accepted_date=data.get('acceptedDate'),
+            account_payables=data.get('accountPayables'),
+            accumulated_other_comprehensive_income_loss=data.get('accumulatedOtherComprehensiveIncomeLoss'),
+            calendar_year=data.get('calendarYear'),
+            capital_lease_obligations=data.get('capitalLeaseObligations'),
+            cash_and_cash_equivalents=data.get('cashAndCashEquivalents'),
+            cash_and_short_term_investments=data.get('cashAndShortTermInvestments'),
+            cik=data.get('cik'),
+            common_stock=data.get('commonStock'),
+            date=data.get('date'),
+            deferred_revenue=data.get('deferredRevenue'),
+            deferred_revenue_non_current=data.get('deferredRevenueNonCurrent'),
+            deferred_tax_liabilities_non_current=data.get('deferredTaxLiabilitiesNonCurrent'),
+            filling_date=data.get('fillingDate'),
+            final_link=data.get('finalLink'),
+            goodwill=data.get('goodwill'),
+            goodwill_and_intangible_assets=data.get('goodwillAndIntangibleAssets'),
+            intangible_assets=data.get('intangibleAssets'),
+            inventory=data.get('inventory'),
+            link=data.get('link'),
+            long_term_debt=data.get('longTermDebt'),
+            long_term_investments=data.get('longTermInvestments'),
+            minority_interest=data.get('minorityInterest'),
+            net_debt=data.get('netDebt'),
+            net_receivables=data.get('netReceivables'),
+            other_assets=data.get('otherAssets'),
+            other_current_assets=data.get('otherCurrentAssets'),
+            other_current_liabilities=data.get('otherCurrentLiabilities'),
+            other_liabilities=data.get('otherLiabilities'),
+            other_non_current_assets=data.get('otherNonCurrentAssets'),
+            other_non_current_liabilities=data.get('otherNonCurrentLiabilities'),
+            othertotal_stockholders_equity=data.get('othertotalStockholdersEquity'),
+            period=data.get('period'),
+            preferred_stock=data.get('preferredStock'),
+            property_plant_equipment_net=data.get('propertyPlantEquipmentNet'),
+            reported_currency=data.get('reportedCurrency'),
+            retained_earnings=data.get('retainedEarnings'),
+            short_term_debt=data.get('shortTermDebt'),
+            short_term_investments=data.get('shortTermInvestments'),
+            tax_assets=data.get('taxAssets'),
+            tax_payables=data.get('taxPayables'),
+            total_assets=data.get('totalAssets'),
+            total_current_assets=data.get('totalCurrentAssets'),
+            total_current_liabilities=data.get('totalCurrentLiabilities'),
+            total_debt=data.get('totalDebt'),
+            total_equity=data.get('totalEquity'),
+            total_investments=data.get('totalInvestments'),
+            total_liabilities=data.get('totalLiabilities'),
+            total_liabilities_and_stockholders_equity=data.get('totalLiabilitiesAndStockholdersEquity'),
+            total_liabilities_and_total_equity=data.get('totalLiabilitiesAndTotalEquity'),
+            total_non_current_assets=data.get('totalNonCurrentAssets'),
+            total_non_current_liabilities=data.get('totalNonCurrentLiabilities'),
+            total_stockholders_equity=data.get('totalStockholdersEquity')
+        )
+
+    def _income_statement_record(self, ticker, data):
+        return IncomeStatement(
+            ticker=ticker,
+            accepted_date=data.get('acceptedDate'),
+            calendar_year=data.get('calendarYear'),
+            cik=data.get('cik'),
+            cost_and_expenses=data.get('costAndExpenses'),
+            cost_of_revenue=data.get('costOfRevenue'),
+            date=data.get('date'),
+            depreciation_and_amortization=data.get('depreciationAndAmortization'),
+            ebitda=data.get('ebitda'),
+            ebitda_ratio=data.get('ebitdaratio'),
+            eps=data.get('eps'),
+            eps_diluted=data.get('epsdiluted'),
+            filling_date=data.get('fillingDate'),
+            final_link=data.get('finalLink'),
+            general_and_administrative_expenses=data.get('generalAndAdministrativeExpenses'),
+            gross_profit=data.get('grossProfit'),
+            gross_profit_ratio=data.get('grossProfitRatio'),
+            income_before_tax=data.get('incomeBeforeTax'),
+            income_before_tax_ratio=data.get('incomeBeforeTaxRatio'),
+            income_tax_expense=data.get('incomeTaxExpense'),
+            interest_expense=data.get('interestExpense'),
+            interest_income=data.get('interestIncome'),
+            link=data.get('link'),
+            net_income=data.get('netIncome'),
+            net_income_ratio=data.get('netIncomeRatio'),
+            operating_expenses=data.get('operatingExpenses'),
+            operating_income=data.get('operatingIncome'),
+            operating_income_ratio=data.get('operatingIncomeRatio'),
+            other_expenses=data.get('otherExpenses'),
+            period=data.get('period'),
+            reported_currency=data.get('reportedCurrency'),
+            research_and_development_expenses=data.get('researchAndDevelopmentExpenses'),
+            revenue=data.get('revenue'),
+            selling_and_marketing_expenses=data.get('sellingAndMarketingExpenses'),
+            selling_general_and_administrative_expenses=data.get('sellingGeneralAndAdministrativeExpenses'),
+            total_other_income_expenses_net=data.get('totalOtherIncomeExpensesNet'),
+            weighted_average_shs_out=data.get('weightedAverageShsOut'),
+            weighted_average_shs_out_dil=data.get('weightedAverageShsOutDil')
+        )
+
+    def _cash_flow_record(self, ticker, data):
+        return CashFlow(
+            ticker=ticker,
+            accepted_date=data.get('acceptedDate'),
+            accounts_payables=data.get('accountsPayables'),
+            accounts_receivables=data.get('accountsReceivables'),
+            acquisitions_net=data.get('acquisitionsNet'),
+            calendar_year=data.get('calendarYear'),
+            capital_expenditure=data.get('capitalExpenditure'),
+            cash_at_beginning_of_period=data.get('cashAtBeginningOfPeriod'),
+            cash_at_end_of_period=data.get('cashAtEndOfPeriod'),
+            change_in_working_capital=data.get('changeInWorkingCapital'),
+            cik=data.get('cik'),
+            common_stock_issued=data.get('commonStockIssued'),
+            common_stock_repurchased=data.get('commonStockRepurchased'),
+            date=data.get('date'),
+            debt_repayment=data.get('debtRepayment'),
+            deferred_income_tax=data.get('deferredIncomeTax'),
+            depreciation_and_amortization=data.get('depreciationAndAmortization'),
+            dividends_paid=data.get('dividendsPaid'),
+            effect_of_forex_changes_on_cash=data.get('effectOfForexChangesOnCash'),
+            filling_date=data.get('fillingDate'),
+            final_link=data.get('finalLink'),
+            free_cash_flow=data.get('freeCashFlow'),
+            inventory=data.get('inventory'),
+            investments_in_property_plant_and_equipment=data.get('investmentsInPropertyPlantAndEquipment'),
+            link=data.get('link'),
+            net_cash_provided_by_operating_activities=data.get('netCashProvidedByOperatingActivities'),
+            net_cash_used_for_investing_activities=data.get('netCashUsedForInvestingActivites'),
+            net_cash_used_provided_by_financing_activities=data.get('netCashUsedProvidedByFinancingActivities'),
+            net_change_in_cash=data.get('netChangeInCash'),
+            net_income=data.get('netIncome'),
+            operating_cash_flow=data.get('operatingCashFlow'),
+            other_financing_activities=data.get('otherFinancingActivites'),
+            other_investing_activities=data.get('otherInvestingActivites'),
+            other_non_cash_items=data.get('otherNonCashItems'),
+            other_working_capital=data.get('otherWorkingCapital'),
+            period=data.get('period'),
+            purchases_of_investments=data.get('purchasesOfInvestments'),
+            reported_currency=data.get('reportedCurrency'),
+            sales_maturities_of_investments=data.get('salesMaturitiesOfInvestments'),
+            stock_based_compensation=data.get('stockBasedCompensation')
+        )
+
+    # Rows always carry these, whatever fields were asked for
+    KEY_FIELDS = ("date", "calendarYear")
+
+    @staticmethod
+    def _select_fields(field_map, fields):
+        if not fields:
+            return list(field_map)
+        requested = {name.strip() for name in fields.split(',') if name.strip()}
+        unknown = sorted(requested - set(field_map))
+        if unknown:
+            raise StatementQueryError(f"Unknown fields: {', '.join(unknown)}.")
+        return [name for name in field_map if name in requested or name in FinancialService.KEY_FIELDS]
+
+    @staticmethod
+    def _year_range(model, year_from=None, year_to=None):
+        conditions = []
+        for year, compare in [(year_from, model.calendar_year.__ge__), (year_to, model.calendar_year.__le__)]:
+            if year is None:
+                continue
+            if not str(year).isdigit() or len(str(year)) != 4:
+                raise StatementQueryError("from and to must be four-digit years.")
+            conditions.append(compare(str(year)))
+        return conditions
+
+    @staticmethod
+    def _statement_rows(model, field_map, ticker, fields=None, year_from=None, year_to=None):
+        # Only the requested columns are selected and only the requested years are read. A Core
+        # select on the session's connection: rows become the output dicts directly, with no
+        # ORM entities, identity map or attribute instrumentation in between
+        selected = FinancialService._select_fields(field_map, fields)
+        columns = model.__table__.c
+        query = select(*[columns[field_map[name]] for name in selected]) \
+            .where(columns.ticker == ticker, annual_statements(model), *FinancialService._year_range(model, year_from, year_to))
+
+        rows = db.session.connection().execute(query).all()
+        if not rows:
+            return None
+        return [dict(zip(selected, row)) for row in rows]
+
     #@staticmethod
     def get_company_data(ticker):
        company = Company.query.filter_by(ticker=ticker).first()
@@ -282,107 +680,13 @@ class FinancialService:
     }
     
 # @staticmethod
-    def get_cash_flow_data(ticker):
-        cash_flow = CashFlow.query.filter_by(ticker=ticker).all()
-        if not cash_flow:
-            return None
-        return [
-            {
-                "date": record.date,
-                # Calendar Year
-                "calendarYear": record.calendar_year,
-
-                # Operating Activities (Group 1)
-              "netIncome": record.net_income,
-              "depreciationAndAmortization": record.depreciation_and_amortization,
-             "deferredIncomeTax": record.deferred_income_tax,
-             "stockBasedCompensation": record.stock_based_compensation,
-             "changeInWorkingCapital": record.change_in_working_capital,
-             "accountsReceivables": record.accounts_receivables,
-             "inventory": record.inventory,
-             "accountsPayables": record.accounts_payables,
-             "otherWorkingCapital": record.other_working_capital,
-             "otherNonCashItems": record.other_non_cash_items,
-             "netCashProvidedByOperatingActivities": record.net_cash_provided_by_operating_activities,
-
-              # Investing Activities (Group 2)
-             "investmentsInPropertyPlantAndEquipment": record.investments_in_property_plant_and_equipment,
-             "acquisitionsNet": record.acquisitions_net,
-             "purchasesOfInvestments": record.purchases_of_investments,
-             "salesMaturitiesOfInvestments": record.sales_maturities_of_investments,
-             "otherInvestingActivities": record.other_investing_activities,
-             "netCashUsedForInvestingActivities": record.net_cash_used_for_investing_activities,
-
-             # Financing Activities (Group 3)
-             "debtRepayment": record.debt_repayment,
-             "commonStockIssued": record.common_stock_issued,
-             "commonStockRepurchased": record.common_stock_repurchased,
-             "dividendsPaid": record.dividends_paid,
-             "otherFinancingActivities": record.other_financing_activities,
-             "netCashUsedProvidedByFinancingActivities": record.net_cash_used_provided_by_financing_activities,
-
-             #  Free Cash Flow (Group 4)
-             "operatingCashFlow": record.operating_cash_flow,
-             "capitalExpenditure": record.capital_expenditure,
-             "freeCashFlow": record.free_cash_flow,
-
-              # Cash Balance & Changes (Group 5)
-             "netChangeInCash": record.net_change_in_cash,
-             "cashAtEndOfPeriod": record.cash_at_end_of_period,
-             "cashAtBeginningOfPeriod": record.cash_at_beginning_of_period,
-            } for record in cash_flow
-        ]
+    def get_cash_flow_data(ticker, fields=None, year_from=None, year_to=None):
+        return FinancialService._statement_rows(CashFlow, FinancialService.CASH_FLOW_FIELDS, ticker, fields, year_from, year_to)
 
 
    # @staticmethod
-    def get_income_statement_data(ticker):
-        income_statement = IncomeStatement.query.filter_by(ticker=ticker).all()
-        if not income_statement:
-            return None
-        return [
-            {
-                # Date
-             "date": record.date,
-
-              # Calendar Year
-             "calendarYear": record.calendar_year,
-
-              # Revenue & Gross Profit (Group 1)
-              "revenue": record.revenue,
-             "costOfRevenue": record.cost_of_revenue,
-             "grossProfit": record.gross_profit,
-             "grossProfitRatio": record.gross_profit_ratio,
-
-              # Operating Expenses (Group 2)
-              "researchAndDevelopmentExpenses": record.research_and_development_expenses,
-              "sellingGeneralAndAdministrativeExpenses": record.selling_general_and_administrative_expenses,
-             "operatingExpenses": record.operating_expenses,
-             "costAndExpenses": record.cost_and_expenses,
-             "depreciationAndAmortization": record.depreciation_and_amortization,
-
-             # Operating & Non-Operating Income (Group 3)
-             "operatingIncome": record.operating_income,
-             "operatingIncomeRatio": record.operating_income_ratio,
-             "interestIncome": record.interest_income,
-             "interestExpense": record.interest_expense,
-             "totalOtherIncomeExpensesNet": record.total_other_income_expenses_net,
-             "ebitda": record.ebitda,
-             "ebitdaratio": record.ebitda_ratio,
-
-             # Net Income (Group 4)
-             "incomeBeforeTax": record.income_before_tax,
-             "incomeBeforeTaxRatio": record.income_before_tax_ratio,
-             "incomeTaxExpense": record.income_tax_expense,
-             "netIncome": record.net_income,
-             "netIncomeRatio": record.net_income_ratio,
-
-             # Per Share Data (Group 5)
-             "eps": record.eps,
-             "epsDiluted": record.eps_diluted,
-             "weightedAverageShsOut": record.weighted_average_shs_out,
-             "weightedAverageShsOutDil": record.weighted_average_shs_out_dil
-            } for record in income_statement
-        ]
+    def get_income_statement_data(ticker, fields=None, year_from=None, year_to=None):
+        return FinancialService._statement_rows(IncomeStatement, FinancialService.INCOME_STATEMENT_FIELDS, ticker, fields, year_from, year_to)
 
    # @staticmethod
     def get_balance_sheet_data1(ticker):
@@ -401,54 +705,5 @@ class FinancialService:
     
 
     # @staticmethod
-    def get_balance_sheet_data(ticker):
-        balance_sheet = BalanceSheet.query.filter_by(ticker=ticker).all()
-        if not balance_sheet:
-          return None
-
-        return [
-           {
-            # Date
-             "date": record.date,
-            
-            # Calendar Year
-             "calendarYear": record.calendar_year,
-            
-            # Assets
-             "cashAndCashEquivalents": record.cash_and_cash_equivalents,
-             "shortTermInvestments": record.short_term_investments,
-             "cashAndShortTermInvestments": record.cash_and_short_term_investments,
-             "netReceivables": record.net_receivables,
-             "inventory": record.inventory,
-              "otherCurrentAssets": record.other_current_assets,
-             "totalCurrentAssets": record.total_current_assets,
-             "propertyPlantEquipmentNet": record.property_plant_equipment_net,
-             "goodwill": record.goodwill,
-             "intangibleAssets": record.intangible_assets,
-             "goodwillAndIntangibleAssets": record.goodwill_and_intangible_assets,
-             "longTermInvestments": record.long_term_investments,
-             "otherNonCurrentAssets": record.other_non_current_assets,
-             "totalNonCurrentAssets": record.total_non_current_assets,
-             "totalAssets": record.total_assets,
-            
-            # Liabilities
-             "accountPayables": record.account_payables,
-             "shortTermDebt": record.short_term_debt,
-             "deferredRevenue": record.deferred_revenue,
-             "otherCurrentLiabilities": record.other_current_liabilities,
-             "totalCurrentLiabilities": record.total_current_liabilities,
-             "longTermDebt": record.long_term_debt,
-             "deferredRevenueNonCurrent": record.deferred_revenue_non_current,
-             "deferredTaxLiabilitiesNonCurrent": record.deferred_tax_liabilities_non_current,
-             "otherNonCurrentLiabilities": record.other_non_current_liabilities,
-             "totalNonCurrentLiabilities": record.total_non_current_liabilities,
-             "totalLiabilities": record.total_liabilities,
-
-            # Equity
-             "commonStock": record.common_stock,
-             "retainedEarnings": record.retained_earnings,
-             "accumulatedOtherComprehensiveIncomeLoss": record.accumulated_other_comprehensive_income_loss,
-             "totalStockholdersEquity": record.total_stockholders_equity,
-             "totalEquity": record.total_equity,
-            } for record in balance_sheet
-        ]
+    def get_balance_sheet_data(ticker, fields=None, year_from=None, year_to=None):
+        return FinancialService._statement_rows(BalanceSheet, FinancialService.BALANCE_SHEET_FIELDS, ticker, fields, year_from, year_to)
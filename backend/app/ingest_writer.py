@@ -0,0 +1,198 @@
+# app/ingest_writer.py
+
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future, wait
+from app.db import db
+
+
+class IngestWriter:
+    # Fetched statements are stored by one writer thread per process instead of by the
+    # request that fetched them: request threads never contend for SQLite's write lock,
+    # and the writer commits the tickers that arrive together in one transaction.
+    # submit() returns a future for the requests that need to read what they fetched.
+    # New periods of stored tickers (quarterly polling, annual refreshes from requests, the
+    # refresh scheduler and ingest jobs) go through update(), one transaction each. Only
+    # statement data goes through the writer: refresh checks and job progress are
+    # single-row bookkeeping commits of background threads, not request writes
+
+    QUEUE_SIZE = 64
+    BATCH_SIZE = 16
+    # How long the writer waits for more payloads to fill a transaction
+    LINGER = 0.05  # seconds
+    # Longest a read or a fetching caller waits for a queued write
+    WAIT_TIMEOUT = 30  # seconds
+
+    def __init__(self, queue_size=None, batch_size=None):
+        self.queue = queue.Queue(queue_size or self.QUEUE_SIZE)
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.app = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.pending = {}  # ticker -> future of its queued write
+        self.updating = set()  # futures of the queued updates
+        self.batches = 0
+        self.written = 0
+        self.updates = 0
+        self.failed = 0
+
+    def submit(self, ticker, company_data, balance_sheet_data, income_statement_data, cash_flow_data):
+        # The future resolves to True once the ticker is stored, False if it already was
+        with self.lock:
+            if ticker in self.pending:
+                return self.pending[ticker]
+            future = self.pending[ticker] = Future()
+            self.start()
+        # Blocks while the queue is full, which holds fetchers back when the writer lags
+        self.queue.put(('ingest', (ticker, company_data, balance_sheet_data, income_statement_data, cash_flow_data), future))
+        return future
+
+    def update(self, ticker, balance_sheet_data, income_statement_data, cash_flow_data, quarterly):
+        # The future resolves to the dates of the periods that were new
+        future = Future()
+        with self.lock:
+            self.updating.add(future)
+            self.start()
+        self.queue.put(('update', (ticker, balance_sheet_data, income_statement_data, cash_flow_data, quarterly), future))
+        return future
+
+    def queued(self, ticker):
+        # Future of the ticker's queued write, None when there is none
+        with self.lock:
+            return self.pending.get(ticker)
+
+    def wait(self, ticker, timeout=None):
+        # Read-after-write: returns once a queued write of the ticker is done, whatever its outcome
+        future = self.queued(ticker)
+        if future is not None:
+            try:
+                future.result(timeout or self.WAIT_TIMEOUT)
+            except Exception:
+                pass  # The read sees whatever is stored
+
+    def start(self):
+        # Started on the first submit, so processes that never ingest have no writer thread
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, daemon=True, name='ingest-writer')
+            self.thread.start()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.LINGER
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                with self.app.app_context():
+                    ingests = [(payload, future) for kind, payload, future in batch if kind == 'ingest']
+                    if ingests:
+                        self.write(ingests)
+                    for kind, payload, future in batch:
+                        if kind == 'update':
+                            self.write_update(payload, future)
+            except Exception as e:
+                # Whatever failed outside the writes, no caller is left waiting on this batch
+                print(f"Ingest writer batch failed: {e}")
+                self.abandon(batch, e)
+
+    def write(self, batch):
+        from app.financial_service import FinancialService
+        try:
+            written = FinancialService().save_ingested([payload for payload, future in batch])
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) > 1:
+                # One bad payload shouldn't fail the others: write them one by one
+                for item in batch:
+                    self.write([item])
+                return
+            print(f"Could not store {batch[0][0][0]}: {e}")
+            self.failed += 1
+            self.finish(batch, error=e)
+            return
+
+        self.batches += 1
+        self.written += len(written)
+        if written:
+            # Imported here so serving stored data never loads pandas
+            from app.ratio_service import RatioService
+            try:
+                # Derive the ratio store rows for the batch in one pass
+                RatioService().refresh_ratios(written)
+            except Exception as e:
+                # The statements are stored; /refreshRatios rebuilds the ratios
+                db.session.rollback()
+                print(f"Ratio refresh of {', '.join(written)} failed: {e}")
+        self.finish(batch, written=written)
+
+    def write_update(self, payload, future):
+        from app.financial_service import FinancialService
+        try:
+            new_dates = FinancialService().save_update(*payload)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Could not update {payload[0]}: {e}")
+            self.failed += 1
+            with self.lock:
+                self.updating.discard(future)
+            future.set_exception(e)
+            return
+        self.updates += 1
+        with self.lock:
+            self.updating.discard(future)
+        future.set_result(new_dates)
+
+    def finish(self, batch, written=(), error=None):
+        with self.lock:
+            for (ticker, *statements), future in batch:
+                if self.pending.get(ticker) is future:
+                    del self.pending[ticker]
+        for (ticker, *statements), future in batch:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(ticker in written)
+
+    def abandon(self, batch, error):
+        with self.lock:
+            for kind, (ticker, *statements), future in batch:
+                if self.pending.get(ticker) is future:
+                    del self.pending[ticker]
+                self.updating.discard(future)
+        for kind, payload, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def drain(self, timeout=None):
+        # Waits for the queued writes, e.g. before the process exits
+        with self.lock:
+            futures = [*self.pending.values(), *self.updating]
+        wait(futures, timeout)
+
+    def metrics(self):
+        return {
+            "queued": self.queue.qsize(),
+            "pending": len(self.pending),
+            "batches": self.batches,
+            "written": self.written,
+            "updates": self.updates,
+            "failed": self.failed,
+        }
+
+
+ingest_writer = IngestWriter()
+
+
+def init_ingest_writer(app):
+    ingest_writer.app = app
+    ingest_writer.batch_size = app.config.get('INGEST_BATCH_SIZE', IngestWriter.BATCH_SIZE)
+    if app.config.get('INGEST_QUEUE_SIZE') and ingest_writer.thread is None:
+        ingest_writer.queue = queue.Queue(app.config['INGEST_QUEUE_SIZE'])
+
+    # Payloads still queued at exit would be lost with the daemon thread
+    atexit.register(ingest_writer.drain, IngestWriter.WAIT_TIMEOUT)
@@ -0,0 +1,276 @@
+# app/job_service.py
+
+import json
+import os
+import socket
+import time
+import multiprocessing
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update
+from app.db import db
+from app.models import Company, Job
+
+
+class JobError(ValueError):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+def ticker_list(value):
+    # ["aapl", "msft"] or "aapl,msft"
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list) or not all(isinstance(ticker, str) for ticker in value):
+        raise JobError("tickers must be a list of ticker symbols.")
+    return [ticker.strip() for ticker in value if ticker.strip()] or None
+
+
+def stored_tickers():
+    return list(db.session.execute(select(Company.ticker).order_by(Company.ticker)).scalars())
+
+
+class IngestJob:
+    # Pulls statements from FMP through FinancialService, ticker by ticker. Without
+    # tickers it refreshes every stored company, which is mostly useful with period=quarter
+
+    PERIODS = ('annual', 'quarter')
+
+    @classmethod
+    def params(cls, payload):
+        period = payload.get('period', 'annual')
+        if period not in cls.PERIODS:
+            raise JobError(f"period must be one of {', '.join(cls.PERIODS)}.")
+        return {"tickers": ticker_list(payload.get('tickers')), "period": period}
+
+    def run(self, params, progress):
+        from app.financial_service import FinancialService
+        service = FinancialService()
+
+        tickers = params["tickers"] or stored_tickers()
+        progress.start(len(tickers))
+        for ticker in tickers:
+            if params["period"] == 'quarter':
+                data = service.fetch_quarterly_data(ticker)
+            else:
+                data = service.fetch_all_data(ticker, wait=True)
+            # Unknown tickers and failed upstream calls come back without statements
+            progress.advance(failed=not data.get("incomeStatement"))
+        return {"tickers": len(tickers), "ingested": progress.done - progress.failed, "failed": progress.failed}
+
+
+class AnalyzeJob:
+    # Red flags and positive indicators stored in analysis_result, as batch.py does, a
+    # chunk of tickers at a time so progress and cancellation are checked between chunks
+
+    @classmethod
+    def params(cls, payload):
+        return {"tickers": ticker_list(payload.get('tickers'))}
+
+    def run(self, params, progress):
+        from app.batch_service import BatchAnalysisService, analyze_tickers
+        service = BatchAnalysisService(workers=1)
+
+        tickers = params["tickers"] or stored_tickers()
+        progress.start(len(tickers))
+        for chunk in service.chunks(tickers):
+            results = analyze_tickers(chunk)
+            service.save_results(results)
+            progress.advance(len(results), failed=sum(1 for result in results if result["error"]))
+        return {"tickers": len(tickers), "analyzed": progress.done - progress.failed, "failed": progress.failed}
+
+
+class JobProgress:
+    # Handed to a job body: every update is also the worker's heartbeat, and is where
+    # a requested cancellation stops the body
+
+    def __init__(self, job_id, worker):
+        self.job_id = job_id
+        self.worker = worker
+        self.done = 0
+        self.failed = 0
+        self.total = None
+
+    def start(self, total):
+        self.total = total
+        self.save()
+
+    def advance(self, count=1, failed=0):
+        self.done += count
+        self.failed += int(failed)
+        self.save()
+
+    def save(self):
+        # Only while this worker still owns the job; a stale job may have been handed to another
+        owned = db.session.execute(
+            update(Job).where(Job.id == self.job_id, Job.worker == self.worker, Job.state == 'running')
+            .values(done=self.done, failed=self.failed, total=self.total, heartbeat_at=utcnow())
+        ).rowcount
+        cancel_requested = db.session.execute(select(Job.cancel_requested).where(Job.id == self.job_id)).scalar()
+        db.session.commit()
+        if not owned or cancel_requested:
+            raise JobCancelled()
+
+
+class JobWorker:
+
+    KINDS = {'ingest': IngestJob, 'analyze': AnalyzeJob}
+
+    # A running job without a heartbeat for this long lost its worker and is requeued
+    STALE_AFTER = timedelta(minutes=10)
+    # Failed attempts are retried after RETRY_DELAY, doubling each time
+    RETRY_DELAY = timedelta(seconds=30)
+
+    def __init__(self, name=None, poll_interval=2.0):
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = poll_interval
+
+    def run(self, drain=False):
+        # Work until stopped; with drain, exit once nothing is left to claim
+        while True:
+            if not self.run_next():
+                if drain:
+                    return
+                time.sleep(self.poll_interval)
+
+    def run_next(self):
+        self.requeue_stale()
+        job = self.claim()
+        if job is None:
+            return False
+
+        job_id, attempts, max_attempts = job.id, job.attempts, job.max_attempts
+        body, params = self.KINDS[job.kind](), json.loads(job.params or '{}')
+        progress = JobProgress(job_id, self.name)
+        try:
+            result = body.run(params, progress)
+        except JobCancelled:
+            db.session.rollback()
+            self.finish(job_id, state='cancelled')
+        except Exception as e:
+            db.session.rollback()
+            error = f"{type(e).__name__}: {e}"
+            if attempts < max_attempts:
+                delay = self.RETRY_DELAY * 2 ** (attempts - 1)
+                self.finish(job_id, state='queued', error=error, run_after=utcnow() + delay, finished_at=None)
+            else:
+                self.finish(job_id, state='failed', error=error)
+        else:
+            self.finish(job_id, state='succeeded', result=json.dumps(result))
+        return True
+
+    def claim(self):
+        # Oldest due job; the conditional update makes the claim safe against other workers
+        now = utcnow()
+        job_id = db.session.execute(
+            select(Job.id).where(Job.state == 'queued', Job.run_after <= now).order_by(Job.id).limit(1)
+        ).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+        claimed = db.session.execute(
+            update(Job).where(Job.id == job_id, Job.state == 'queued').values(
+                state='running', worker=self.name, attempts=Job.attempts + 1,
+                started_at=now, heartbeat_at=now, done=0, failed=0,
+            )
+        ).rowcount
+        db.session.commit()
+        # Another worker got there first; the caller just polls again
+        return db.session.get(Job, job_id, populate_existing=True) if claimed else None
+
+    def finish(self, job_id, **values):
+        values.setdefault('finished_at', utcnow())
+        db.session.execute(update(Job).where(Job.id == job_id, Job.worker == self.name).values(**values))
+        db.session.commit()
+
+    def requeue_stale(self):
+        cutoff = utcnow() - self.STALE_AFTER
+        stale = (Job.state == 'running') & (Job.heartbeat_at < cutoff)
+        db.session.execute(update(Job).where(stale, Job.attempts >= Job.max_attempts).values(
+            state='failed', error="Worker stopped responding.", finished_at=utcnow()))
+        db.session.execute(update(Job).where(stale).values(state='queued', run_after=utcnow()))
+        db.session.commit()
+
+
+class JobQueue:
+
+    def enqueue(self, kind, payload=None, max_attempts=None):
+        if kind not in JobWorker.KINDS:
+            raise JobError(f"kind must be one of {', '.join(JobWorker.KINDS)}.")
+        if payload is not None and not isinstance(payload, dict):
+            raise JobError("The request body must be a JSON object.")
+        params = JobWorker.KINDS[kind].params(payload or {})
+
+        now = utcnow()
+        job = Job(kind=kind, params=json.dumps(params), state='queued', created_at=now, run_after=now)
+        if max_attempts is not None:
+            job.max_attempts = max_attempts
+        db.session.add(job)
+        db.session.commit()
+        return self.to_dict(job)
+
+    def get(self, job_id):
+        job = db.session.get(Job, job_id, populate_existing=True)
+        return self.to_dict(job) if job else None
+
+    def cancel(self, job_id):
+        # Queued jobs are cancelled outright; running ones stop at their next progress update
+        now = utcnow()
+        db.session.execute(update(Job).where(Job.id == job_id, Job.state == 'queued')
+                           .values(state='cancelled', cancel_requested=True, finished_at=now))
+        db.session.execute(update(Job).where(Job.id == job_id, Job.state == 'running')
+                           .values(cancel_requested=True))
+        db.session.commit()
+        return self.get(job_id)
+
+    @staticmethod
+    def to_dict(job):
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "params": json.loads(job.params or '{}'),
+            "state": job.state,
+            "progress": {"done": job.done, "failed": job.failed, "total": job.total},
+            "attempts": job.attempts,
+            "maxAttempts": job.max_attempts,
+            "cancelRequested": job.cancel_requested,
+            "result": json.loads(job.result) if job.result else None,
+            "error": job.error,
+            "createdAt": job.created_at.isoformat() if job.created_at else None,
+            "startedAt": job.started_at.isoformat() if job.started_at else None,
+            "finishedAt": job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+
+def run_worker(database_uri, poll_interval, drain):
+    # Entry point of a spawned worker process
+    from app import create_app
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'CREATE_SCHEMA': False,
+        'CACHE_SNAPSHOT_PATH': None,
+        'CACHE_WARM_ENTRIES': 0,
+    })
+    with app.app_context():
+        JobWorker(poll_interval=poll_interval).run(drain)
+
+
+def start_workers(processes, poll_interval=2.0, drain=False):
+    # Worker processes on the current app's database; no broker, the job table is the queue
+    database_uri = db.engine.url.render_as_string(hide_password=False)
+    context = multiprocessing.get_context('spawn')
+    workers = [
+        context.Process(target=run_worker, args=(database_uri, poll_interval, drain), name=f'job-worker-{number}')
+        for number in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    return workers
@@ -2,6 +2,14 @@
 
 from .db import db
 
+# FMP marks annual statements 'FY' and quarterly ones 'Q1' to 'Q4'
+QUARTERLY_PERIODS = ('Q1', 'Q2', 'Q3', 'Q4')
+
+
+def annual_statements(model):
+    # Filter for the annual rows of a statement table; rows without a period predate quarterly ingestion
+    return db.or_(model.period.is_(None), model.period.notin_(QUARTERLY_PERIODS))
+
 
 class Company(db.Model):
     __tablename__ = 'company'
@@ -20,11 +28,11 @@ class Company(db.Model):
     dcf_diff = db.Column(db.Float)
     default_image = db.Column(db.Boolean)
     description = db.Column(db.Text)
-    exchange = db.Column(db.String(100))
+    exchange = db.Column(db.String(100), index=True)
     exchange_short_name = db.Column(db.String(50))
     full_time_employees = db.Column(db.String(20))  # String to accommodate large numbers
     image = db.Column(db.String(255))
-    industry = db.Column(db.String(100))
+    industry = db.Column(db.String(100), index=True)
     ipo_date = db.Column(db.String(10))
     is_actively_trading = db.Column(db.Boolean)
     is_adr = db.Column(db.Boolean)
@@ -36,7 +44,7 @@ class Company(db.Model):
     phone = db.Column(db.String(50))
     price = db.Column(db.Float)
     price_range = db.Column(db.String(50))  # "range" reserved word in Python
-    sector = db.Column(db.String(50))
+    sector = db.Column(db.String(50), index=True)
     state = db.Column(db.String(50), nullable=True)
     vol_avg = db.Column(db.Integer)
     website = db.Column(db.String(255))
@@ -50,7 +58,7 @@ class Company(db.Model):
 class BalanceSheet(db.Model):
     __tablename__ = 'balance_sheet'
     id = db.Column(db.Integer, primary_key=True)
-    ticker = db.Column(db.String(10), db.ForeignKey('company.ticker'), nullable=False)
+    ticker = db.Column(db.String(10), db.ForeignKey('company.ticker'), nullable=False, index=True)
     accepted_date = db.Column(db.String(20))
     account_payables = db.Column(db.Float)
     accumulated_other_comprehensive_income_loss = db.Column(db.Float)
@@ -109,7 +117,7 @@ class BalanceSheet(db.Model):
 class IncomeStatement(db.Model):
     __tablename__ = 'income_statement'
     id = db.Column(db.Integer, primary_key=True)
-    ticker = db.Column(db.String(10), db.ForeignKey('company.ticker'), nullable=False)
+    ticker = db.Column(db.String(10), db.ForeignKey('company.ticker'), nullable=False, index=True)
     accepted_date = db.Column(db.String(50))
     calendar_year = db.Column(db.String(10))
     cik = db.Column(db.String(20))
@@ -151,7 +159,7 @@ class IncomeStatement(db.Model):
 class CashFlow(db.Model):
     __tablename__ = 'cash_flow'
     id = db.Column(db.Integer, primary_key=True)
-    ticker = db.Column(db.String(10), db.ForeignKey('company.ticker'), nullable=False)
+    ticker = db.Column(db.String(10), db.ForeignKey('company.ticker'), nullable=False, index=True)
     accepted_date = db.Column(db.String(20))
     accounts_payables = db.Column(db.Float)
     accounts_receivables = db.Column(db.Float)
@@ -190,4 +198,200 @@ class CashFlow(db.Model):
     purchases_of_investments = db.Column(db.Float)
     reported_currency = db.Column(db.String(10))
     sales_maturities_of_investments = db.Column(db.Float)
-    stock_based_compensation = db.Column(db.Float)
\ No newline at end of file
+    stock_based_compensation = db.Column(db.Float)
+
+class FinancialRatio(db.Model):
+    __tablename__ = 'financial_ratios'
+    __table_args__ = (
+        db.UniqueConstraint('ticker', 'calendar_year', name='uq_financial_ratios_ticker_year'),
+        db.Index('ix_financial_ratios_calendar_year', 'calendar_year'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    ticker = db.Column(db.String(10), db.ForeignKey('company.ticker'), nullable=False)
+    calendar_year = db.Column(db.String(4), nullable=False)
+    # Statement rows the ratios were derived from
+    balance_sheet_id = db.Column(db.Integer, db.ForeignKey('balance_sheet.id'))
+    income_statement_id = db.Column(db.Integer, db.ForeignKey('income_statement.id'))
+    cash_flow_id = db.Column(db.Integer, db.ForeignKey('cash_flow.id'))
+    # Profitability
+    gross_margin = db.Column(db.Float)
+    gross_margin_yoy = db.Column(db.Float)
+    operating_margin = db.Column(db.Float)
+    operating_margin_yoy = db.Column(db.Float)
+    net_margin = db.Column(db.Float)
+    net_margin_yoy = db.Column(db.Float)
+    fcf_margin = db.Column(db.Float)
+    fcf_margin_yoy = db.Column(db.Float)
+    roe = db.Column(db.Float)
+    roe_yoy = db.Column(db.Float)
+    roa = db.Column(db.Float)
+    roa_yoy = db.Column(db.Float)
+    # Leverage & liquidity
+    debt_to_equity = db.Column(db.Float)
+    debt_to_equity_yoy = db.Column(db.Float)
+    current_ratio = db.Column(db.Float)
+    current_ratio_yoy = db.Column(db.Float)
+    interest_coverage = db.Column(db.Float)
+    interest_coverage_yoy = db.Column(db.Float)
+    payout_ratio = db.Column(db.Float)
+    payout_ratio_yoy = db.Column(db.Float)
+    # Efficiency
+    receivables_to_sales = db.Column(db.Float)
+    receivables_to_sales_yoy = db.Column(db.Float)
+    dso = db.Column(db.Float)
+    dso_yoy = db.Column(db.Float)
+    dpo = db.Column(db.Float)
+    dpo_yoy = db.Column(db.Float)
+    inventory_turnover = db.Column(db.Float)
+    inventory_turnover_yoy = db.Column(db.Float)
+    receivables_turnover = db.Column(db.Float)
+    receivables_turnover_yoy = db.Column(db.Float)
+    opex_to_sales = db.Column(db.Float)
+    opex_to_sales_yoy = db.Column(db.Float)
+
+
+class TTMFlow(db.Model):
+    __tablename__ = 'ttm_flow'
+    __table_args__ = (
+        db.UniqueConstraint('ticker', 'date', name='uq_ttm_flow_ticker_date'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    ticker = db.Column(db.String(10), db.ForeignKey('company.ticker'), nullable=False)
+    # Quarter the trailing twelve months end with
+    date = db.Column(db.String(10), nullable=False)
+    calendar_year = db.Column(db.String(4))
+    period = db.Column(db.String(5))
+    revenue = db.Column(db.Float)
+    net_income = db.Column(db.Float)
+    operating_cash_flow = db.Column(db.Float)
+    capital_expenditure = db.Column(db.Float)
+    free_cash_flow = db.Column(db.Float)
+
+class PeerSketch(db.Model):
+    __tablename__ = 'peer_sketch'
+    __table_args__ = (
+        db.UniqueConstraint('sector', 'industry', 'calendar_year', 'metric', name='uq_peer_sketch_group_metric'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    sector = db.Column(db.String(50), nullable=False)
+    industry = db.Column(db.String(100), nullable=False)
+    calendar_year = db.Column(db.String(4), nullable=False)
+    metric = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, default=0)
+    bins = db.Column(db.Text)  # Serialized QuantileSketch buckets
+
+
+class SectorThreshold(db.Model):
+    __tablename__ = 'sector_threshold'
+    __table_args__ = (
+        db.UniqueConstraint('sector', 'service', 'rule', 'parameter', name='uq_sector_threshold_rule_parameter'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    sector = db.Column(db.String(50), nullable=False)
+    service = db.Column(db.String(20), nullable=False)  # "redflags" or "positive"
+    rule = db.Column(db.String(100), nullable=False)  # Name of the analyze_* method
+    parameter = db.Column(db.String(50), nullable=False)  # Keyword argument of the rule
+    value = db.Column(db.Float, nullable=False)
+
+
+class ThresholdVersion(db.Model):
+    __tablename__ = 'threshold_version'
+    # Single row bumped by every calibration; processes reload their sector thresholds and
+    # cached analyses stop matching when it moves
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime)
+
+class AnalysisResult(db.Model):
+    __tablename__ = 'analysis_result'
+    ticker = db.Column(db.String(10), db.ForeignKey('company.ticker'), primary_key=True)
+    red_flags = db.Column(db.Text)
+    positive_indicators = db.Column(db.Text)
+    error = db.Column(db.Text)
+    computed_at = db.Column(db.DateTime)
+
+class DataVersion(db.Model):
+    __tablename__ = 'data_version'
+    # Bumped whenever a ticker's statements are written; cached values are tagged with it
+    ticker = db.Column(db.String(10), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime)
+
+class UnknownTicker(db.Model):
+    __tablename__ = 'unknown_ticker'
+    # Tickers FMP had no profile for; fetches are skipped until checked_at is older than the TTL
+    ticker = db.Column(db.String(10), primary_key=True)
+    checked_at = db.Column(db.DateTime, nullable=False)
+
+class Job(db.Model):
+    __tablename__ = 'job'
+    __table_args__ = (
+        db.Index('ix_job_state_run_after', 'state', 'run_after'),
+    )
+    # Background work picked up by the job workers (see app/job_service.py)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # "ingest" or "analyze"
+    params = db.Column(db.Text)  # JSON arguments of the job body
+    state = db.Column(db.String(10), nullable=False, default='queued')  # queued, running, succeeded, failed, cancelled
+    done = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    result = db.Column(db.Text)  # JSON summary once finished
+    error = db.Column(db.Text)
+    worker = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, nullable=False)
+    run_after = db.Column(db.DateTime, nullable=False)  # Not claimed before this; pushed back on retry
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+class RefreshCheck(db.Model):
+    __tablename__ = 'refresh_check'
+    # Last time the refresh scheduler asked FMP for a ticker's new filings
+    ticker = db.Column(db.String(10), primary_key=True)
+    checked_at = db.Column(db.DateTime, nullable=False)
+    misses = db.Column(db.Integer, nullable=False, default=0)  # Checks in a row that found nothing new
+    found_at = db.Column(db.DateTime)  # Last check that stored a new filing
+
+class TickerAccess(db.Model):
+    __tablename__ = 'ticker_access'
+    # Decayed request count per ticker and route, merged in by AccessTracker.flush
+    ticker = db.Column(db.String(10), primary_key=True)
+    endpoint = db.Column(db.String(100), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)  # The score is as of this time
+
+class StatementVersion(db.Model):
+    __tablename__ = 'statement_version'
+    __table_args__ = (
+        db.Index('ix_statement_version_period', 'statement', 'ticker', 'date', 'period', 'known_at'),
+    )
+    # Every reported version of a statement period (see app/point_in_time_service.py). The
+    # first version holds the whole row, later ones (restatements) only the values that changed
+    id = db.Column(db.Integer, primary_key=True)
+    statement = db.Column(db.String(20), nullable=False)  # Table of the statement, e.g. "balance_sheet"
+    ticker = db.Column(db.String(10), nullable=False)
+    date = db.Column(db.String(10), nullable=False)  # Period end
+    period = db.Column(db.String(5))
+    known_at = db.Column(db.String(20), nullable=False)  # Accepted or filing date, else when it was stored
+    delta = db.Column(db.Text, nullable=False)  # JSON column -> value
+
+class ChangeLog(db.Model):
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_key', 'ticker', 'statement', 'date', 'period'),
+        # Ids are never reused, so they work as the consumers' cursor
+        {'sqlite_autoincrement': True},
+    )
+    # Row-level changes to the stored data, served by /changes (see app/change_feed_service.py)
+    id = db.Column(db.Integer, primary_key=True)
+    ticker = db.Column(db.String(10), nullable=False)
+    statement = db.Column(db.String(20), nullable=False)  # Table that changed, e.g. "income_statement"
+    date = db.Column(db.String(10))  # Period end; the fiscal year for financial_ratio
+    period = db.Column(db.String(5))
+    change = db.Column(db.String(10), nullable=False)  # "insert", "restate" or "refresh"
+    data_version = db.Column(db.Integer, nullable=False)  # The ticker's data version the change committed with
+    changed_at = db.Column(db.DateTime, nullable=False)
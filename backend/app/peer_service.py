@@ -0,0 +1,210 @@
+# app/peer_service.py
+
+import json
+import math
+from collections import defaultdict
+from sqlalchemy import select
+from app.db import db
+from app.models import Company, FinancialRatio, PeerSketch
+
+
+class QuantileSketch:
+
+    # Log-bucketed histogram (DDSketch style): every value lands in a bucket whose
+    # bounds are within RELATIVE_ACCURACY of it, so ranks are accurate to that
+    # tolerance while the sketch stays a few hundred buckets regardless of peer count.
+    # Buckets are plain counters, so values can be added and removed incrementally.
+    RELATIVE_ACCURACY = 0.01
+    GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    LOG_GAMMA = math.log(GAMMA)
+    MIN_MAGNITUDE = 1e-9
+
+    def __init__(self, positive=None, negative=None, zero=0):
+        self.positive = defaultdict(int, positive or {})
+        self.negative = defaultdict(int, negative or {})
+        self.zero = zero
+
+    @property
+    def count(self):
+        return sum(self.positive.values()) + sum(self.negative.values()) + self.zero
+
+    def bucket(self, magnitude):
+        return math.ceil(math.log(magnitude) / self.LOG_GAMMA)
+
+    def add(self, value, weight=1):
+        if value is None or not math.isfinite(value):
+            return
+        if abs(value) < self.MIN_MAGNITUDE:
+            self.zero = max(self.zero + weight, 0)
+            return
+        store = self.positive if value > 0 else self.negative
+        index = self.bucket(abs(value))
+        store[index] += weight
+        if store[index] <= 0:
+            del store[index]
+
+    def remove(self, value):
+        self.add(value, weight=-1)
+
+    def rank(self, value):
+        # Fraction of values below the given one, counting its own bucket as half
+        total = self.count
+        if total <= 0 or value is None or not math.isfinite(value):
+            return None
+
+        if abs(value) < self.MIN_MAGNITUDE:
+            below = sum(self.negative.values())
+            same = self.zero
+        elif value > 0:
+            index = self.bucket(value)
+            below = sum(self.negative.values()) + self.zero + sum(c for i, c in self.positive.items() if i < index)
+            same = self.positive.get(index, 0)
+        else:
+            # Larger negative buckets hold more negative values
+            index = self.bucket(-value)
+            below = sum(c for i, c in self.negative.items() if i > index)
+            same = self.negative.get(index, 0)
+
+        return (below + same / 2) / total
+
+    def to_json(self):
+        return json.dumps({'p': self.positive, 'n': self.negative, 'z': self.zero}, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        return cls(
+            positive={int(i): c for i, c in data.get('p', {}).items()},
+            negative={int(i): c for i, c in data.get('n', {}).items()},
+            zero=data.get('z', 0),
+        )
+
+
+class PeerService:
+
+    # Ratio store metrics benchmarked against peers (camelCase name -> FinancialRatio column)
+    METRICS = {
+        'grossMargin': 'gross_margin',
+        'operatingMargin': 'operating_margin',
+        'netMargin': 'net_margin',
+        'fcfMargin': 'fcf_margin',
+        'roe': 'roe',
+        'roa': 'roa',
+        'debtToEquity': 'debt_to_equity',
+        'currentRatio': 'current_ratio',
+        'interestCoverage': 'interest_coverage',
+        'payoutRatio': 'payout_ratio',
+        'receivablesToSales': 'receivables_to_sales',
+        'dso': 'dso',
+        'dpo': 'dpo',
+        'inventoryTurnover': 'inventory_turnover',
+    }
+
+    def stored_ratio_rows(self, tickers=None):
+        columns = [FinancialRatio.ticker, FinancialRatio.calendar_year]
+        columns += [getattr(FinancialRatio, column) for column in self.METRICS.values()]
+        query = select(*columns)
+        if tickers is not None:
+            query = query.where(FinancialRatio.ticker.in_(tickers))
+        return [dict(row._mapping) for row in db.session.execute(query)]
+
+    def apply_ratio_changes(self, previous_rows, current_rows):
+        # Work out the bucket changes per (sector, industry, year, metric) peer group
+        tickers = {row['ticker'] for row in previous_rows} | {row['ticker'] for row in current_rows}
+        groups = self.peer_groups(tickers)
+
+        changes = defaultdict(list)
+        for rows, weight in ((previous_rows, -1), (current_rows, 1)):
+            for row in rows:
+                group = groups.get(row['ticker'])
+                if group is None:
+                    continue
+                for column in self.METRICS.values():
+                    if row.get(column) is not None:
+                        changes[(*group, row['calendar_year'], column)].append((row[column], weight))
+
+        if not changes:
+            return 0
+
+        # Load only the sketches touched by this ingest, update and write them back
+        sketches = self.load_sketches(changes.keys())
+        for key, values in changes.items():
+            if key not in sketches:
+                sector, industry, year, metric = key
+                sketches[key] = PeerSketch(sector=sector, industry=industry, calendar_year=year, metric=metric)
+                db.session.add(sketches[key])
+            record = sketches[key]
+            sketch = QuantileSketch.from_json(record.bins) if record.bins else QuantileSketch()
+            for value, weight in values:
+                sketch.add(value, weight)
+            record.bins = sketch.to_json()
+            record.count = sketch.count
+
+        db.session.commit()
+        return len(changes)
+
+    def rebuild(self):
+        # Recreate every sketch from the ratio store
+        db.session.query(PeerSketch).delete()
+        db.session.commit()
+        return self.apply_ratio_changes([], self.stored_ratio_rows())
+
+    def peer_groups(self, tickers):
+        query = select(Company.ticker, Company.sector, Company.industry).where(Company.ticker.in_(tickers))
+        return {
+            ticker: (sector, industry)
+            for ticker, sector, industry in db.session.execute(query)
+            if sector and industry
+        }
+
+    def load_sketches(self, keys):
+        keys = list(keys)
+        sectors = {key[0] for key in keys}
+        industries = {key[1] for key in keys}
+        years = {key[2] for key in keys}
+        records = PeerSketch.query.filter(
+            PeerSketch.sector.in_(sectors),
+            PeerSketch.industry.in_(industries),
+            PeerSketch.calendar_year.in_(years),
+        ).all()
+        return {(r.sector, r.industry, r.calendar_year, r.metric): r for r in records}
+
+    def get_percentiles(self, ticker, year=None):
+        company = db.session.get(Company, ticker)
+        if not company:
+            return None
+
+        # The company's own ratios for the requested (or latest) year
+        query = FinancialRatio.query.filter_by(ticker=ticker)
+        if year:
+            query = query.filter_by(calendar_year=str(year))
+        ratios = query.order_by(FinancialRatio.calendar_year.desc()).first()
+        if not ratios:
+            return None
+
+        # One sketch per metric for the peer group, so the lookup is O(metrics)
+        records = PeerSketch.query.filter_by(
+            sector=company.sector,
+            industry=company.industry,
+            calendar_year=ratios.calendar_year,
+        ).all()
+        sketches = {record.metric: record for record in records}
+
+        percentiles = {}
+        for name, column in self.METRICS.items():
+            value = getattr(ratios, column)
+            record = sketches.get(column)
+            rank = QuantileSketch.from_json(record.bins).rank(value) if record and value is not None else None
+            percentiles[name] = {
+                "value": value,
+                "percentile": round(rank * 100, 1) if rank is not None else None,
+                "peerCount": record.count if record else 0,
+            }
+
+        return {
+            "ticker": ticker,
+            "calendarYear": ratios.calendar_year,
+            "sector": company.sector,
+            "industry": company.industry,
+            "percentiles": percentiles,
+        }
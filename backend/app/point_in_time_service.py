@@ -0,0 +1,307 @@
+# app/point_in_time_service.py
+
+import json
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, insert
+from app.db import db
+from app.models import BalanceSheet, IncomeStatement, CashFlow, StatementVersion, annual_statements
+from app.bulk_load import bulk_insert
+from app.streaming import stream_rows
+
+
+# Days from period end to filing assumed when a stored period has no filing dates
+UNDATED_FILING_LAG = 90
+
+
+class PointInTimeError(ValueError):
+    pass
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def reported_at(values):
+    # When a version became public: its acceptance time, else its filing date
+    reported = values.get('accepted_date') or values.get('filling_date')
+    return reported[:19] if reported else None
+
+
+def first_known(values, date, observed):
+    # Undated periods are taken to have been public UNDATED_FILING_LAG days after they
+    # ended, or when they were stored if that was sooner
+    reported = reported_at(values)
+    if reported:
+        return reported
+    try:
+        estimated = (datetime.strptime(date[:10], '%Y-%m-%d') + timedelta(days=UNDATED_FILING_LAG)).strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        return observed
+    return min(estimated, observed)
+
+
+def parse_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise PointInTimeError("asOf must be a date (YYYY-MM-DD).")
+
+
+class PointInTimeService:
+    # Every reported version of each statement period, so analyses can see the statements
+    # as they were on a past date. The statement tables keep the first report of a period;
+    # statement_version keeps that row plus each restatement as a delta of changed values
+
+    STATEMENTS = {
+        'balanceSheet': BalanceSheet,
+        'incomeStatement': IncomeStatement,
+        'cashFlow': CashFlow,
+    }
+
+    # Columns that identify a version's period rather than belong to its values
+    KEY_COLUMNS = ('id', 'ticker', 'date', 'period')
+
+    # Inputs of the red flag and positive indicator analysis frames
+    ANALYSIS_COLUMNS = {
+        BalanceSheet: [
+            'totalCurrentAssets', 'cashAndCashEquivalents', 'netReceivables', 'inventory', 'goodwill',
+            'intangibleAssets', 'totalAssets', 'totalCurrentLiabilities', 'accountPayables', 'shortTermDebt',
+            'totalDebt', 'deferredRevenue', 'totalStockholdersEquity',
+        ],
+        IncomeStatement: [
+            'revenue', 'costOfRevenue', 'grossProfit', 'researchAndDevelopmentExpenses', 'operatingExpenses',
+            'operatingIncome', 'interestExpense', 'netIncome', 'weightedAverageShsOut',
+        ],
+        CashFlow: ['operatingCashFlow', 'capitalExpenditure', 'freeCashFlow', 'dividendsPaid'],
+    }
+
+    @classmethod
+    def value_columns(cls, model):
+        return [column.name for column in model.__table__.columns if column.name not in cls.KEY_COLUMNS]
+
+    @classmethod
+    def field_map(cls, model):
+        # camelCase field -> column, as served by the statement endpoints
+        from app.financial_service import FinancialService
+        return {
+            BalanceSheet: FinancialService.BALANCE_SHEET_FIELDS,
+            IncomeStatement: FinancialService.INCOME_STATEMENT_FIELDS,
+            CashFlow: FinancialService.CASH_FLOW_FIELDS,
+        }[model]
+
+    def row_values(self, model, row):
+        return {column: getattr(row, column) for column in self.value_columns(model)}
+
+    def version(self, model, ticker, date, period, known_at, values):
+        return {
+            "statement": model.__tablename__,
+            "ticker": ticker,
+            "date": date,
+            "period": period,
+            "known_at": known_at,
+            "delta": json.dumps(values),
+        }
+
+    def stored_versions(self, model, ticker):
+        # (date, period) -> [latest known_at, values as of the latest version]
+        states = {}
+        rows = db.session.execute(
+            select(StatementVersion.date, StatementVersion.period, StatementVersion.known_at, StatementVersion.delta)
+            .where(StatementVersion.statement == model.__tablename__, StatementVersion.ticker == ticker)
+            .order_by(StatementVersion.known_at, StatementVersion.id)
+        )
+        for date, period, known_at, delta in rows:
+            state = states.setdefault((date, period), [known_at, {}])
+            state[0] = known_at
+            state[1].update(json.loads(delta))
+        return states
+
+    def record(self, model, ticker, records, now=None):
+        # Runs inside the caller's transaction once the statement rows are added. records are
+        # the periods as reported now; those that differ from their latest version are stored
+        # as a delta. Returns the number of versions written and the restated (date, period)s
+        observed = (now or utcnow()).strftime('%Y-%m-%d %H:%M:%S')
+        states = self.stored_versions(model, ticker)
+        versions, restated = [], []
+
+        # Periods stored before versions were kept (and the rows just added) start from the stored row
+        missing = {(record.date, record.period) for record in records if record.date} - set(states)
+        if missing:
+            base = {}
+            for row in db.session.execute(select(model).where(model.ticker == ticker).order_by(model.id)).scalars():
+                if (row.date, row.period) in missing:
+                    base[(row.date, row.period)] = self.row_values(model, row)
+            for (date, period), values in base.items():
+                values = {column: value for column, value in values.items() if value is not None}
+                known_at = first_known(values, date, observed)
+                versions.append(self.version(model, ticker, date, period, known_at, values))
+                states[(date, period)] = [known_at, values]
+
+        for record in records:
+            state = states.get((record.date, record.period))
+            if state is None:
+                continue  # Not stored, e.g. a period of the other kind
+            known_at, current = state
+            delta = {column: value for column, value in self.row_values(model, record).items() if current.get(column) != value}
+            if not delta:
+                continue
+            # A restatement counts from its own acceptance when that is later, otherwise from
+            # when it was first seen, so an as-of query never sees it early
+            reported = reported_at(delta)
+            known_at = reported if reported and reported > known_at else max(observed, known_at)
+            versions.append(self.version(model, ticker, record.date, record.period, known_at, delta))
+            restated.append((record.date, record.period))
+            current.update(delta)
+            state[0] = known_at
+
+        if versions:
+            db.session.execute(insert(StatementVersion), versions)
+        return len(versions), restated
+
+    def backfill(self):
+        # First versions for the stored periods that have none, e.g. rows stored before
+        # versions were kept
+        observed = utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        written = 0
+        for model in self.STATEMENTS.values():
+            versioned = set(db.session.execute(
+                select(StatementVersion.ticker, StatementVersion.date, StatementVersion.period)
+                .where(StatementVersion.statement == model.__tablename__).distinct()
+            ).all())
+            columns = self.value_columns(model)
+            base = {}
+            for row in stream_rows(select(model.__table__).order_by(model.id)):
+                key = (row.ticker, row.date, row.period)
+                if row.date and key not in versioned:
+                    # The latest row wins when a period was stored twice
+                    base[key] = {column: row._mapping[column] for column in columns if row._mapping[column] is not None}
+            versions = [
+                self.version(model, ticker, date, period, first_known(values, date, observed), values)
+                for (ticker, date, period), values in base.items()
+            ]
+            bulk_insert(StatementVersion, versions)
+            written += len(versions)
+        db.session.commit()
+        return written
+
+    def statements_as_of(self, ticker, statement, on):
+        # The ticker's periods of one statement as they read at the end of day `on`
+        model = self.STATEMENTS.get(statement)
+        if model is None:
+            raise PointInTimeError(f"statement must be one of {', '.join(self.STATEMENTS)}.")
+        cutoff = (parse_day(on) + timedelta(days=1)).strftime('%Y-%m-%d')
+        rows = db.session.execute(
+            select(StatementVersion.date, StatementVersion.period, StatementVersion.known_at, StatementVersion.delta)
+            .where(StatementVersion.statement == model.__tablename__, StatementVersion.ticker == ticker,
+                   StatementVersion.known_at < cutoff)
+            .order_by(StatementVersion.date, StatementVersion.period, StatementVersion.known_at, StatementVersion.id)
+        )
+        periods = {}
+        for date, period, known_at, delta in rows:
+            state = periods.setdefault((date, period), {"knownAt": known_at, "values": {}})
+            state["knownAt"] = known_at
+            state["values"].update(json.loads(delta))
+
+        field_map = self.field_map(model)
+        records = []
+        for (date, period), state in periods.items():
+            values = dict(state["values"], date=date, period=period)
+            record = {field: values.get(column) for field, column in field_map.items()}
+            record["knownAt"] = state["knownAt"]
+            records.append(record)
+        return records
+
+    def versions_frame(self, model, tickers=None):
+        # One full row per version of the annual periods, with the fiscal year and the
+        # analysis inputs: the deltas folded in known_at order within each period
+        import pandas as pd
+        from app.ratio_service import RatioService
+        # The statement endpoints don't serve every ratio input (e.g. totalDebt)
+        field_map = {**self.field_map(model), **RatioService.STATEMENT_COLUMNS[model]}
+        names = self.ANALYSIS_COLUMNS[model]
+        columns = [field_map[name] for name in names]
+
+        query = select(StatementVersion.ticker, StatementVersion.date, StatementVersion.period,
+                       StatementVersion.known_at, StatementVersion.delta) \
+            .where(StatementVersion.statement == model.__tablename__, annual_statements(StatementVersion))
+        if tickers is not None:
+            query = query.where(StatementVersion.ticker.in_(tickers))
+        query = query.order_by(StatementVersion.ticker, StatementVersion.date, StatementVersion.period,
+                               StatementVersion.known_at, StatementVersion.id)
+
+        rows, key, state = [], None, None
+        for ticker, date, period, known_at, delta in stream_rows(query):
+            if (ticker, date, period) != key:
+                key, state = (ticker, date, period), {}
+            state.update(json.loads(delta))
+            rows.append((ticker, date, state.get('calendar_year'), known_at, *[state.get(column) for column in columns]))
+
+        frame = pd.DataFrame(rows, columns=['ticker', 'date', 'calendarYear', 'knownAt', *names])
+        frame['knownAt'] = pd.to_datetime(frame['knownAt'], format='mixed')
+        return frame
+
+    def as_of_panel(self, queries, tickers=None):
+        # Analysis frames of many (ticker, asOf) pairs at once: for every period of each
+        # ticker, the latest version known by the end of its asOf day, picked by one
+        # merge_asof over the universe. queries: DataFrame of ticker and asOf dates.
+        # Rows are keyed by ticker@asOf so a plan can evaluate every pair in one pass
+        import numpy as np
+        import pandas as pd
+        from app.ratio_service import RatioService
+
+        queries = queries[['ticker', 'asOf']].drop_duplicates()
+        # Exclusive cutoff: anything known before the next midnight
+        queries = queries.assign(cutoff=pd.to_datetime(queries['asOf']) + pd.Timedelta(days=1))
+
+        panel = None
+        for model in self.STATEMENTS.values():
+            versions = self.versions_frame(model, tickers).sort_values('knownAt')
+            periods = versions[['ticker', 'date']].drop_duplicates()
+            grid = queries.merge(periods, on='ticker').sort_values('cutoff')
+            known = pd.merge_asof(grid, versions, left_on='cutoff', right_on='knownAt',
+                                  by=['ticker', 'date'], direction='backward', allow_exact_matches=False)
+            known = known.dropna(subset=['knownAt'])
+
+            # Keyed by fiscal year, as the ratio store is: 52/53-week filers end some years in
+            # early January, so the date's year is not the year the statement covers
+            known = known.dropna(subset=['calendarYear']).drop(columns=['date', 'knownAt', 'cutoff'])
+            panel = known if panel is None else panel.merge(known, on=['ticker', 'asOf', 'calendarYear'], how='outer')
+
+        # Missing and zero values are both absent, as in the analysis frames
+        names = [name for columns in self.ANALYSIS_COLUMNS.values() for name in columns]
+        for name in names:
+            panel[name] = pd.to_numeric(panel[name], errors='coerce').replace(0, np.nan)
+
+        panel['asOf'] = pd.to_datetime(panel['asOf']).dt.strftime('%Y-%m-%d')
+        panel['key'] = panel['ticker'] + '@' + panel['asOf']
+        panel = panel.sort_values(['key', 'calendarYear']).reset_index(drop=True)
+        # Ratios from the statements as known then, not from the ratio store
+        return panel.join(RatioService().compute_ratios(panel, groups=panel['key']))
+
+    def analyze_as_of(self, on, tickers=None):
+        # Red flags and positive indicators of the universe on a past date, without
+        # look-ahead. The rule plans run once over the whole panel, with their default
+        # thresholds: the sector calibration is derived from today's ratio store
+        import pandas as pd
+        from app.rule_engine import rule_plan
+
+        parse_day(on)
+        if tickers is None:
+            tickers = list(db.session.execute(
+                select(StatementVersion.ticker).distinct().order_by(StatementVersion.ticker)).scalars())
+        panel = self.as_of_panel(pd.DataFrame({"ticker": tickers, "asOf": on}), tickers)
+        if panel.empty:
+            return []
+
+        redflags, positive = rule_plan('redflags'), rule_plan('positive')
+        red_messages = redflags.evaluate(panel, group='key')
+        positive_messages = positive.evaluate(panel, group='key')
+        return [
+            {
+                "ticker": key.split('@')[0],
+                "asOf": on,
+                "redFlags": redflags.report(red_messages[key]),
+                "positiveIndicators": positive.report(positive_messages[key]),
+            }
+            for key in red_messages
+        ]
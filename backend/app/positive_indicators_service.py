@@ -2,14 +2,17 @@
 
 import pandas as pd
 import numpy as np
-from app.models import BalanceSheet, IncomeStatement, CashFlow
+from app.ratio_service import RatioService
+from app.threshold_service import ThresholdService
+from app.ttm_service import TTMService
+from app.cache import ticker_cache
+from app.rule_engine import rule_plan
 
 class PositiveIndicatorsService:
-    def get_financial_data_as_dataframe(self, ticker):
-        # Fetch data from the database
-        balance_sheets = BalanceSheet.query.filter_by(ticker=ticker).all()
-        income_statements = IncomeStatement.query.filter_by(ticker=ticker).all()
-        cash_flows = CashFlow.query.filter_by(ticker=ticker).all()
+    def get_financial_data_as_dataframe(self, ticker, basis='annual'):
+        # Fetch annual, quarterly or TTM data from the database
+        ttm_service = TTMService()
+        balance_sheets, income_statements, cash_flows = ttm_service.statement_records(ticker, basis)
 
         # Initialize a dictionary to store the data
         data = {
@@ -45,7 +48,7 @@ class PositiveIndicatorsService:
 
         # Populate data from BalanceSheet, IncomeStatement, and CashFlow tables
         for record in balance_sheets:
-            data['calendarYear'].append(record.date[:4])
+            data['calendarYear'].append(ttm_service.period_label(record, basis))
             data['totalCurrentAssets'].append(record.total_current_assets or np.nan)
             data['cashAndCashEquivalents'].append(record.cash_and_cash_equivalents or np.nan)
             data['netReceivables'].append(record.net_receivables or np.nan)
@@ -74,14 +77,34 @@ class PositiveIndicatorsService:
 
         # Create DataFrame from the dictionary
         df = pd.DataFrame(data)
-        return df
 
-    def analyze_positive_indicators(self, ticker):
-        data = self.get_financial_data_as_dataframe(ticker)
+        # Add the derived ratios from the ratio store
+        return RatioService().attach_ratios(
+            ttm_service.apply_basis(df, basis), ticker,
+            fiscal_years=[record.calendar_year for record in balance_sheets] if basis == 'annual' else None,
+            periods=ttm_service.YOY_PERIODS[basis])
+
+    def analyze_positive_indicators(self, ticker, basis='annual', engine='methods'):
+        # The frame is rebuilt only when the ticker's statements change
+        data = ticker_cache.cached('frames', ticker, f'positive:{basis}', lambda: self.get_financial_data_as_dataframe(ticker, basis))
                 
         # Sort data by calendar year to ensure chronological order
         data = data.sort_values('calendarYear').reset_index(drop=True)
 
+        # Quarterly and TTM frames have no rows to analyze when the ticker has no quarters stored
+        if data.empty and basis != 'annual':
+            return None
+        # The rules compare each period with the same one a year earlier and label it by basis
+        data.attrs['basis'] = basis
+
+        # Sector-calibrated thresholds override the indicators' keyword defaults
+        thresholds = ThresholdService().thresholds_for(ticker, 'positive')
+
+        # engine='rules' evaluates the declarative rule set in app/rules/positive.json instead
+        if engine == 'rules':
+            plan = rule_plan('positive')
+            return plan.report(plan.evaluate(data, thresholds, periods=self.yoy_periods(data), period=self.period_prefix(data)))
+
         results = []
 
         # List of analysis functions to execute
@@ -104,7 +127,7 @@ class PositiveIndicatorsService:
         ]
 
         for function in analysis_functions:
-            result = function(data)
+            result = function(data, **thresholds.get(function.__name__, {}))
             if result:
                 results.append(result)
                 results.append("_____________________________________________________________________________________________")
@@ -126,6 +149,12 @@ class PositiveIndicatorsService:
         formatted = f"{round(percent, 2):.2f}".rstrip('0').rstrip('.')
         return formatted
 
+    def yoy_periods(self, data):
+        return TTMService.YOY_PERIODS[data.attrs.get('basis', 'annual')]
+
+    def period_prefix(self, data):
+        return TTMService.PERIOD_PREFIXES[data.attrs.get('basis', 'annual')]
+
     # Individual positive indicator analysis functions
 
     ############################ PI1 ############################
@@ -137,8 +166,8 @@ class PositiveIndicatorsService:
             return "FCF and Net Income analysis requires 'freeCashFlow' and 'netIncome' columns."
 
         # Suppress FutureWarning by using fill_method=None
-        data['FCF_Change'] = data['freeCashFlow'].replace(0, np.nan).pct_change() * 100
-        data['NetIncome_Change'] = data['netIncome'].replace(0, np.nan).pct_change() * 100
+        data['FCF_Change'] = data['freeCashFlow'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data)) * 100
+        data['NetIncome_Change'] = data['netIncome'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data)) * 100
 
         # Condition: FCF increasing while Net Income change is minimal (stable)
         stable_net_income = (data['NetIncome_Change'].abs() <= 10)  # within ±10% change
@@ -159,7 +188,7 @@ class PositiveIndicatorsService:
             "Improved cash efficiency, indicating that the company is generating more cash from operations. Net Income change is minimal (±10%)\n"
         ]
 
-        for i in range(1, len(data)):
+        for i in range(self.yoy_periods(data), len(data)):
             if positive_indicators[i]:
                 year = data['calendarYear'][i]
                 fcf = data['freeCashFlow'][i]
@@ -172,7 +201,7 @@ class PositiveIndicatorsService:
 
                 # Append the formatted fiscal year report
                 report.append(
-                    f"FY {year}: Free Cash Flow = {self.format_number(fcf)} (↑ {self.format_percent(fcf_change)}%), Net Income = {self.format_number(net_income)} ({ni_direction} {self.format_percent(abs(net_income_change))}%)"
+                    f"{self.period_prefix(data)} {year}: Free Cash Flow = {self.format_number(fcf)} (↑ {self.format_percent(fcf_change)}%), Net Income = {self.format_number(net_income)} ({ni_direction} {self.format_percent(abs(net_income_change))}%)"
                 )
 
         return "\n".join(report)
@@ -186,11 +215,11 @@ class PositiveIndicatorsService:
             return "Debt analysis requires 'totalDebt' column."        
 
         # Calculate the percentage change in total debt
-        data['Debt_Change'] = data['totalDebt'].replace(0, np.nan).pct_change() * 100
+        data['Debt_Change'] = data['totalDebt'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data)) * 100
 
         # Identify significant reductions and general trend
         significant_reduction = data['Debt_Change'] < -5
-        overall_trend_downward = (data['totalDebt'].replace(0, np.nan).diff().dropna() < 0).all()
+        overall_trend_downward = (data['totalDebt'].replace(0, np.nan).diff(periods=self.yoy_periods(data)).dropna() < 0).all()
 
         # Return None if the overall trend is not downward
         if not overall_trend_downward:
@@ -204,13 +233,13 @@ class PositiveIndicatorsService:
         initial_report_lines = len(report)
 
         # Identify and append significant reductions
-        for i in range(1, len(data)):
+        for i in range(self.yoy_periods(data), len(data)):
             if significant_reduction.iloc[i]:
                 year = data['calendarYear'].iloc[i]
                 debt = data['totalDebt'].iloc[i]
                 debt_change = data['Debt_Change'].iloc[i]
                 report.append(
-                    f"FY {year}: Total Debt = {self.format_number(debt)} (↓ {self.format_percent(abs(debt_change))}%)"
+                    f"{self.period_prefix(data)} {year}: Total Debt = {self.format_number(debt)} (↓ {self.format_percent(abs(debt_change))}%)"
                 )
 
         # Return None if no significant reductions were found
@@ -227,13 +256,13 @@ class PositiveIndicatorsService:
         if not all(col in data.columns for col in ['costOfRevenue', 'inventory', 'revenue', 'netReceivables']):
             return "Efficiency Ratio analysis requires 'costOfRevenue', 'inventory', 'revenue', 'netReceivables' columns."
 
-        # Calculate Inventory Turnover and Receivables Turnover
-        data['Inventory_Turnover'] = data['costOfRevenue'] / data['inventory'].replace(0, np.nan)
-        data['Receivables_Turnover'] = data['revenue'] / data['netReceivables'].replace(0, np.nan)
+        # Inventory Turnover and Receivables Turnover from the ratio store
+        data['Inventory_Turnover'] = data['inventoryTurnover']
+        data['Receivables_Turnover'] = data['receivablesTurnover']
         
-        # Calculate percentage changes in the ratios
-        data['Inventory_Turnover_Change'] = data['Inventory_Turnover'].pct_change() * 100
-        data['Receivables_Turnover_Change'] = data['Receivables_Turnover'].pct_change() * 100
+        # Percentage changes in the ratios
+        data['Inventory_Turnover_Change'] = data['inventoryTurnoverYoy'] * 100
+        data['Receivables_Turnover_Change'] = data['receivablesTurnoverYoy'] * 100
 
         # Generate detailed report
         report = [
@@ -244,7 +273,7 @@ class PositiveIndicatorsService:
         # Track if any year meets the criteria
         improvement_found = False
         
-        for i in range(1, len(data)):
+        for i in range(self.yoy_periods(data), len(data)):
             year = data['calendarYear'].iloc[i]
             inventory_turnover = data['Inventory_Turnover'].iloc[i]
             inventory_change = data['Inventory_Turnover_Change'].iloc[i]
@@ -254,7 +283,7 @@ class PositiveIndicatorsService:
             # Check for improvements in both ratios
             if inventory_change > 0 and receivables_change > 0:
                 report.append(
-                    f"FY {year}: Inventory Turnover = {inventory_turnover:.2f} (↑ {self.format_percent(inventory_change)}%),"
+                    f"{self.period_prefix(data)} {year}: Inventory Turnover = {inventory_turnover:.2f} (↑ {self.format_percent(inventory_change)}%),"
                     f" Receivables Turnover = {receivables_turnover:.2f} (↑ {self.format_percent(receivables_change)}%)"
                 )
                 improvement_found = True
@@ -272,11 +301,11 @@ class PositiveIndicatorsService:
         if 'grossProfit' not in data.columns or 'revenue' not in data.columns:
             return "Gross Profit Margin analysis requires 'grossProfit' and 'revenue' columns."
 
-        # Calculate Gross Profit Margin
-        data['Gross_Profit_Margin'] = (data['grossProfit'] / data['revenue'].replace(0, np.nan)) * 100
+        # Gross Profit Margin from the ratio store
+        data['Gross_Profit_Margin'] = data['grossMargin'] * 100
         
-        # Calculate percentage changes in Gross Profit Margin
-        data['Gross_Profit_Margin_Change'] = data['Gross_Profit_Margin'].pct_change() * 100
+        # Percentage changes in Gross Profit Margin
+        data['Gross_Profit_Margin_Change'] = data['grossMarginYoy'] * 100
 
         # Check overall trend (ensure all changes are positive)
         overall_trend_positive = all(data['Gross_Profit_Margin_Change'].dropna() > 0)
@@ -290,7 +319,7 @@ class PositiveIndicatorsService:
         # Track if any year meets the criteria
         improvement_found = False
         
-        for i in range(1, len(data)):
+        for i in range(self.yoy_periods(data), len(data)):
             year = data['calendarYear'].iloc[i]
             gross_profit_margin = data['Gross_Profit_Margin'].iloc[i]
             gross_profit_margin_change = data['Gross_Profit_Margin_Change'].iloc[i]
@@ -298,7 +327,7 @@ class PositiveIndicatorsService:
             # Check for improvement in Gross Profit Margin and if it meets the threshold
             if overall_trend_positive and gross_profit_margin_change > threshold:
                 report.append(
-                    f"FY {year}: Gross Profit Margin = {gross_profit_margin:.2f}% (↑ {self.format_percent(gross_profit_margin_change)}%)"
+                    f"{self.period_prefix(data)} {year}: Gross Profit Margin = {gross_profit_margin:.2f}% (↑ {self.format_percent(gross_profit_margin_change)}%)"
                 )
                 improvement_found = True
 
@@ -316,7 +345,7 @@ class PositiveIndicatorsService:
             return "Revenue Growth analysis requires 'revenue' column."        
 
         # Calculate YoY percentage change in revenue
-        data['Revenue_Growth'] = data['revenue'].replace(0, np.nan).pct_change() * 100
+        data['Revenue_Growth'] = data['revenue'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data)) * 100
         
         # Check if revenue growth is consistent (positive in all periods)
         consistent_growth = all(data['Revenue_Growth'].dropna() > threshold)
@@ -328,11 +357,11 @@ class PositiveIndicatorsService:
         ]
         
         if consistent_growth:
-            for i in range(1, len(data)):
+            for i in range(self.yoy_periods(data), len(data)):
                 year = data['calendarYear'].iloc[i]
                 revenue = data['revenue'].iloc[i]
                 revenue_growth = data['Revenue_Growth'].iloc[i]
-                report.append(f"FY {year}: Revenue = {self.format_number(revenue)} (↑ {self.format_percent(revenue_growth)}%)")
+                report.append(f"{self.period_prefix(data)} {year}: Revenue = {self.format_number(revenue)} (↑ {self.format_percent(revenue_growth)}%)")
         else:
             return None
         
@@ -346,13 +375,13 @@ class PositiveIndicatorsService:
         if not all(col in data.columns for col in ['netIncome', 'totalStockholdersEquity', 'totalAssets']):
             return "ROE & ROA analysis requires 'netIncome', 'totalStockholdersEquity', 'totalAssets' columns."    
 
-        # Calculate Return on Equity (ROE) and Return on Assets (ROA)
-        data['ROE'] = (data['netIncome'] / data['totalStockholdersEquity'].replace(0, np.nan)) * 100
-        data['ROA'] = (data['netIncome'] / data['totalAssets'].replace(0, np.nan)) * 100
+        # Return on Equity (ROE) and Return on Assets (ROA) from the ratio store
+        data['ROE'] = data['roe'] * 100
+        data['ROA'] = data['roa'] * 100
 
-        # Calculate YoY changes for ROE and ROA
-        data['ROE_Change'] = data['ROE'].pct_change() * 100
-        data['ROA_Change'] = data['ROA'].pct_change() * 100
+        # YoY changes for ROE and ROA
+        data['ROE_Change'] = data['roeYoy'] * 100
+        data['ROA_Change'] = data['roaYoy'] * 100
 
         # Generate detailed report
         report = [
@@ -362,7 +391,7 @@ class PositiveIndicatorsService:
         
         # Check only positive ROE and ROA improvements
         improvement_found = False
-        for i in range(1, len(data)):
+        for i in range(self.yoy_periods(data), len(data)):
             year = data['calendarYear'].iloc[i]
             roe = data['ROE'].iloc[i]
             roe_change = data['ROE_Change'].iloc[i]
@@ -372,7 +401,7 @@ class PositiveIndicatorsService:
             # Only consider cases where ROE and ROA are positive
             if roe > 0 and roa > 0 and roe_change > 0 and roa_change > 0:
                 report.append(
-                    f"FY {year}: ROE = {self.format_percent(roe)}% (↑ {self.format_percent(roe_change)}%), "
+                    f"{self.period_prefix(data)} {year}: ROE = {self.format_percent(roe)}% (↑ {self.format_percent(roe_change)}%), "
                     f"ROA = {self.format_percent(roa)}% (↑ {self.format_percent(roa_change)}%)"
                 )
                 improvement_found = True
@@ -390,11 +419,11 @@ class PositiveIndicatorsService:
         if 'operatingIncome' not in data.columns or 'interestExpense' not in data.columns:
             return "Interest Coverage analysis requires 'operatingIncome' and 'interestExpense' columns."            
 
-        # Calculate Interest Coverage Ratio
-        data['Interest_Coverage_Ratio'] = data['operatingIncome'] / data['interestExpense'].replace(0, np.nan)
+        # Interest Coverage Ratio from the ratio store
+        data['Interest_Coverage_Ratio'] = data['interestCoverage']
 
-        # Calculate YoY changes in Interest Coverage Ratio
-        data['Interest_Coverage_Change'] = data['Interest_Coverage_Ratio'].pct_change() * 100
+        # YoY changes in Interest Coverage Ratio
+        data['Interest_Coverage_Change'] = data['interestCoverageYoy'] * 100
 
         # Positive Indicator Report
         report = [
@@ -406,7 +435,7 @@ class PositiveIndicatorsService:
         healthy_found = False
         positive_trend = True
 
-        for i in range(1, len(data)):
+        for i in range(self.yoy_periods(data), len(data)):
             year = data['calendarYear'].iloc[i]
             interest_coverage = data['Interest_Coverage_Ratio'].iloc[i]
             coverage_change = data['Interest_Coverage_Change'].iloc[i]
@@ -416,7 +445,7 @@ class PositiveIndicatorsService:
                 if coverage_change > 0:
                     direction = '↑'
                     report.append(
-                        f"FY {year}: Interest Coverage = {interest_coverage:.2f} ({direction} {self.format_percent(abs(coverage_change))}%)"
+                        f"{self.period_prefix(data)} {year}: Interest Coverage = {interest_coverage:.2f} ({direction} {self.format_percent(abs(coverage_change))}%)"
                     )
                     healthy_found = True
                 elif coverage_change < 0:
@@ -444,7 +473,7 @@ class PositiveIndicatorsService:
             return "Dataset contains missing values in 'cashAndCashEquivalents'. Please clean the data and retry."
 
         # Calculate percentage change in cash and cash equivalents
-        data['Cash_Change'] = data['cashAndCashEquivalents'].pct_change() * 100
+        data['Cash_Change'] = data['cashAndCashEquivalents'].pct_change(periods=self.yoy_periods(data)) * 100
 
         # Check if cash reserves are consistently increasing
         increasing_cash_reserves = data['Cash_Change'] > 0
@@ -458,7 +487,7 @@ class PositiveIndicatorsService:
         # Track if any year meets the criteria
         improvement_found = False
 
-        for i in range(1, len(data)):  # Start at 1 to skip the first year
+        for i in range(self.yoy_periods(data), len(data)):  # Start at 1 to skip the first year
             if increasing_cash_reserves.iloc[i]:
                 year = data['calendarYear'].iloc[i]
                 cash = data['cashAndCashEquivalents'].iloc[i]
@@ -466,7 +495,7 @@ class PositiveIndicatorsService:
 
                 # Append the formatted report for years with increasing cash reserves
                 report.append(
-                    f"FY {year}: Cash and Cash Equivalents = {self.format_number(cash)} "
+                    f"{self.period_prefix(data)} {year}: Cash and Cash Equivalents = {self.format_number(cash)} "
                     f"(↑ {self.format_percent(cash_change)}%)"
                 )
                 improvement_found = True
@@ -486,15 +515,15 @@ class PositiveIndicatorsService:
         if 'operatingExpenses' not in data.columns or 'revenue' not in data.columns:
             return "Operating Expense analysis requires 'operatingExpenses' and 'revenue' columns."            
 
-        # Calculate the Operating Expenses to Sales Ratio
-        data['Operating_Expenses_to_Sales_Ratio'] = data['operatingExpenses'] / data['revenue'].replace(0, np.nan)
+        # Operating Expenses to Sales Ratio from the ratio store
+        data['Operating_Expenses_to_Sales_Ratio'] = data['opexToSales']
         
         # Check for reduction in operating expenses and analyze the ratio
-        reduction_in_expenses = data['operatingExpenses'].replace(0, np.nan).pct_change() < 0  # Negative change means reduction
-        ratio_improvement = data['Operating_Expenses_to_Sales_Ratio'].pct_change() < 0  # Ratio should decrease
+        reduction_in_expenses = data['operatingExpenses'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data)) < 0  # Negative change means reduction
+        ratio_improvement = data['opexToSalesYoy'] < 0  # Ratio should decrease
         
-        # Calculate percentage change in the Operating Expenses to Sales Ratio
-        data['Operating_Expenses_to_Sales_Ratio_Change'] = data['Operating_Expenses_to_Sales_Ratio'].pct_change() * 100
+        # Percentage change in the Operating Expenses to Sales Ratio
+        data['Operating_Expenses_to_Sales_Ratio_Change'] = data['opexToSalesYoy'] * 100
         
         # Check if there are any positive indicators
         if not any(reduction_in_expenses & ratio_improvement):
@@ -506,7 +535,7 @@ class PositiveIndicatorsService:
             "Enhanced operational efficiency, leading to higher profit margins. Cost reductions without sacrificing revenue can indicate effective cost management and process improvements, contributing to sustainable profitability.\n"
         ]
         
-        for i in range(1, len(data)):
+        for i in range(self.yoy_periods(data), len(data)):
             if reduction_in_expenses.iloc[i] and ratio_improvement.iloc[i]:
                 year = data['calendarYear'].iloc[i]
                 ratio = data['Operating_Expenses_to_Sales_Ratio'].iloc[i]
@@ -514,7 +543,7 @@ class PositiveIndicatorsService:
                 
                 # Append the formatted fiscal year report with percentage decrease in ratio
                 report.append(
-                    f"FY {year}: Operating Expenses to Sales = {ratio:.2f} (↓ {self.format_percent(abs(ratio_change))}%)"
+                    f"{self.period_prefix(data)} {year}: Operating Expenses to Sales = {ratio:.2f} (↓ {self.format_percent(abs(ratio_change))}%)"
                 )
         
         return "\n".join(report)
@@ -527,15 +556,15 @@ class PositiveIndicatorsService:
         if 'totalCurrentAssets' not in data.columns or 'totalCurrentLiabilities' not in data.columns:
             return "Net Working Capital analysis requires 'totalCurrentAssets' and 'totalCurrentLiabilities' columns."            
 
-        # Calculate Current Ratio
-        data['Current_Ratio'] = data['totalCurrentAssets'] / data['totalCurrentLiabilities'].replace(0, np.nan)
+        # Current Ratio from the ratio store
+        data['Current_Ratio'] = data['currentRatio']
         
         # Calculate Net Working Capital
         data['Net_Working_Capital'] = data['totalCurrentAssets'] - data['totalCurrentLiabilities'].replace(0, np.nan)
         
         # Calculate percentage change in Current Ratio and Net Working Capital
-        data['Current_Ratio_Change'] = data['Current_Ratio'].pct_change() * 100
-        data['Net_Working_Capital_Change'] = data['Net_Working_Capital'].pct_change() * 100
+        data['Current_Ratio_Change'] = data['currentRatioYoy'] * 100
+        data['Net_Working_Capital_Change'] = data['Net_Working_Capital'].pct_change(periods=self.yoy_periods(data)) * 100
         
         # Check for overall improvements in Net Working Capital and Current Ratio
         positive_working_capital = data['Net_Working_Capital_Change'] > 0
@@ -549,7 +578,7 @@ class PositiveIndicatorsService:
 
         improvement_found = False
         
-        for i in range(1, len(data)):
+        for i in range(self.yoy_periods(data), len(data)):
             if positive_working_capital.iloc[i] and notable_current_ratio_change.iloc[i]:
                 year = data['calendarYear'].iloc[i]
                 current_ratio = data['Current_Ratio'].iloc[i]
@@ -559,7 +588,7 @@ class PositiveIndicatorsService:
                 
                 # Append the formatted report with NWC percentage increase
                 report.append(
-                    f"FY {year}: Current Ratio = {current_ratio:.2f} (↑ {current_ratio_change:.2f}%),"
+                    f"{self.period_prefix(data)} {year}: Current Ratio = {current_ratio:.2f} (↑ {current_ratio_change:.2f}%),"
                     f" Net Working Capital = {self.format_number(net_working_capital)} (↑ {self.format_percent(nwc_change)}%)"
                 )
                 improvement_found = True
@@ -578,7 +607,7 @@ class PositiveIndicatorsService:
             return "CapEx analysis requires 'capitalExpenditure' column."            
 
         # Calculate percentage change in Capital Expenditures (CapEx)
-        data['CapEx_Change'] = data['capitalExpenditure'].replace(0, np.nan).pct_change() * 100
+        data['CapEx_Change'] = data['capitalExpenditure'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data)) * 100
         
         # Generate detailed report
         report = [
@@ -588,7 +617,7 @@ class PositiveIndicatorsService:
 
         improvement_found = False
         
-        for i in range(1, len(data)):
+        for i in range(self.yoy_periods(data), len(data)):
             year = data['calendarYear'].iloc[i]
             capex = data['capitalExpenditure'].iloc[i]
             capex_change = data['CapEx_Change'].iloc[i]
@@ -596,7 +625,7 @@ class PositiveIndicatorsService:
             # Check for notable increase in CapEx (greater than the specified threshold)
             if capex_change > capex_threshold:
                 report.append(
-                    f"FY {year}: Capital Expenditures = {self.format_number(abs(capex))} (↑ {self.format_percent(capex_change)}%)"
+                    f"{self.period_prefix(data)} {year}: Capital Expenditures = {self.format_number(abs(capex))} (↑ {self.format_percent(capex_change)}%)"
                 )
                 improvement_found = True
 
@@ -614,7 +643,7 @@ class PositiveIndicatorsService:
             return "Operating Cash Flow analysis requires 'operatingCashFlow' column."    
 
         # Calculate percentage change in Operating Cash Flow
-        data['Operating_Cash_Flow_Change'] = data['operatingCashFlow'].replace(0, np.nan).pct_change() * 100
+        data['Operating_Cash_Flow_Change'] = data['operatingCashFlow'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data)) * 100
         
         # Generate detailed report
         report = [
@@ -624,7 +653,7 @@ class PositiveIndicatorsService:
 
         improvement_found = False
         
-        for i in range(1, len(data)):
+        for i in range(self.yoy_periods(data), len(data)):
             year = data['calendarYear'].iloc[i]
             cash_flow = data['operatingCashFlow'].iloc[i]
             cash_flow_change = data['Operating_Cash_Flow_Change'].iloc[i]
@@ -632,7 +661,7 @@ class PositiveIndicatorsService:
             # Check for notable increase in Operating Cash Flow (greater than the specified threshold)
             if cash_flow_change > cash_flow_threshold:
                 report.append(
-                    f"FY {year}: Operating Cash Flow = {self.format_number(cash_flow)} (↑ {self.format_percent(cash_flow_change)}%)"
+                    f"{self.period_prefix(data)} {year}: Operating Cash Flow = {self.format_number(cash_flow)} (↑ {self.format_percent(cash_flow_change)}%)"
                 )
                 improvement_found = True
 
@@ -649,11 +678,11 @@ class PositiveIndicatorsService:
         if 'accountPayables' not in data.columns or 'costOfRevenue' not in data.columns:
             return "DPO analysis requires 'accountPayables' and 'costOfRevenue' columns."            
 
-        # Calculate Days Payable Outstanding (DPO)
-        data['DPO'] = (data['accountPayables'] / data['costOfRevenue'].replace(0, np.nan)) * 365
+        # Days Payable Outstanding (DPO) from the ratio store
+        data['DPO'] = data['dpo']
         
-        # Calculate percentage change in DPO
-        data['DPO_Change'] = data['DPO'].pct_change() * 100
+        # Percentage change in DPO
+        data['DPO_Change'] = data['dpoYoy'] * 100
         
         # Generate detailed report
         report = [
@@ -663,7 +692,7 @@ class PositiveIndicatorsService:
 
         improvement_found = False
         
-        for i in range(1, len(data)):
+        for i in range(self.yoy_periods(data), len(data)):
             year = data['calendarYear'].iloc[i]
             dpo = data['DPO'].iloc[i]
             dpo_change = data['DPO_Change'].iloc[i]
@@ -671,7 +700,7 @@ class PositiveIndicatorsService:
             # Check for notable decrease in DPO (greater than the specified threshold)
             if dpo_change < -dpo_threshold:  # DPO is decreasing by more than the threshold
                 report.append(
-                    f"FY {year}: DPO = {dpo:.2f} days (↓ {self.format_percent(abs(dpo_change))}%)"
+                    f"{self.period_prefix(data)} {year}: DPO = {dpo:.2f} days (↓ {self.format_percent(abs(dpo_change))}%)"
                 )
                 improvement_found = True
 
@@ -689,7 +718,7 @@ class PositiveIndicatorsService:
             return "Deferred Revenue analysis requires 'deferredRevenue' column."    
         
         # Calculate percentage change in Deferred Revenue
-        data['Deferred_Revenue_Change'] = data['deferredRevenue'].replace(0, np.nan).pct_change() * 100
+        data['Deferred_Revenue_Change'] = data['deferredRevenue'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data)) * 100
         
         # Generate detailed report
         report = [
@@ -699,7 +728,7 @@ class PositiveIndicatorsService:
 
         improvement_found = False
         
-        for i in range(1, len(data)):
+        for i in range(self.yoy_periods(data), len(data)):
             year = data['calendarYear'].iloc[i]
             deferred_revenue = data['deferredRevenue'].iloc[i]
             deferred_revenue_change = data['Deferred_Revenue_Change'].iloc[i]
@@ -707,7 +736,7 @@ class PositiveIndicatorsService:
             # Check for notable increase in Deferred Revenue (greater than the specified threshold)
             if deferred_revenue_change > revenue_threshold:
                 report.append(
-                    f"FY {year}: Deferred Revenue = {self.format_number(deferred_revenue)} (↑ {self.format_percent(deferred_revenue_change)}%)"
+                    f"{self.period_prefix(data)} {year}: Deferred Revenue = {self.format_number(deferred_revenue)} (↑ {self.format_percent(deferred_revenue_change)}%)"
                 )
                 improvement_found = True
 
@@ -725,7 +754,7 @@ class PositiveIndicatorsService:
             return "R&D Expense analysis requires 'researchAndDevelopmentExpenses' column."            
 
         # Calculate percentage change in R&D Expenses
-        data['R&D_Change'] = data['researchAndDevelopmentExpenses'].replace(0, np.nan).pct_change() * 100
+        data['R&D_Change'] = data['researchAndDevelopmentExpenses'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data)) * 100
         
         # Generate detailed report
         report = [
@@ -735,7 +764,7 @@ class PositiveIndicatorsService:
 
         improvement_found = False
         
-        for i in range(1, len(data)):
+        for i in range(self.yoy_periods(data), len(data)):
             year = data['calendarYear'].iloc[i]
             rd_expenses = data['researchAndDevelopmentExpenses'].iloc[i]
             rd_change = data['R&D_Change'].iloc[i]
@@ -743,7 +772,7 @@ class PositiveIndicatorsService:
             # Check for notable increase in R&D Expenses (greater than the specified threshold)
             if rd_change > rd_threshold:
                 report.append(
-                    f"FY {year}: R&D Expenses = {self.format_number(rd_expenses)} (↑ {self.format_percent(rd_change)}%)"
+                    f"{self.period_prefix(data)} {year}: R&D Expenses = {self.format_number(rd_expenses)} (↑ {self.format_percent(rd_change)}%)"
                 )
                 improvement_found = True
 
@@ -0,0 +1,209 @@
+# app/ratio_service.py
+
+import pandas as pd
+import numpy as np
+from sqlalchemy import select, delete
+from app.db import db
+from app.bulk_load import bulk_insert
+from app.models import BalanceSheet, IncomeStatement, CashFlow, FinancialRatio, annual_statements
+from app.peer_service import PeerService
+from app.cache import bump_data_versions
+from app.change_feed_service import log_changes
+
+class RatioService:
+
+    # Statement inputs needed by the ratios (camelCase name -> model column)
+    STATEMENT_COLUMNS = {
+        BalanceSheet: {
+            'totalCurrentAssets': 'total_current_assets',
+            'netReceivables': 'net_receivables',
+            'inventory': 'inventory',
+            'totalAssets': 'total_assets',
+            'totalCurrentLiabilities': 'total_current_liabilities',
+            'accountPayables': 'account_payables',
+            'totalDebt': 'total_debt',
+            'totalStockholdersEquity': 'total_stockholders_equity',
+        },
+        IncomeStatement: {
+            'revenue': 'revenue',
+            'costOfRevenue': 'cost_of_revenue',
+            'grossProfit': 'gross_profit',
+            'operatingExpenses': 'operating_expenses',
+            'operatingIncome': 'operating_income',
+            'interestExpense': 'interest_expense',
+            'netIncome': 'net_income',
+        },
+        CashFlow: {
+            'freeCashFlow': 'free_cash_flow',
+            'dividendsPaid': 'dividends_paid',
+        },
+    }
+
+    # Stored ratios (camelCase name -> FinancialRatio column); each also has a "<name>Yoy" change
+    RATIO_COLUMNS = {
+        'grossMargin': 'gross_margin',
+        'operatingMargin': 'operating_margin',
+        'netMargin': 'net_margin',
+        'fcfMargin': 'fcf_margin',
+        'roe': 'roe',
+        'roa': 'roa',
+        'debtToEquity': 'debt_to_equity',
+        'currentRatio': 'current_ratio',
+        'interestCoverage': 'interest_coverage',
+        'payoutRatio': 'payout_ratio',
+        'receivablesToSales': 'receivables_to_sales',
+        'dso': 'dso',
+        'dpo': 'dpo',
+        'inventoryTurnover': 'inventory_turnover',
+        'receivablesTurnover': 'receivables_turnover',
+        'opexToSales': 'opex_to_sales',
+    }
+
+    SOURCE_ID_COLUMNS = {
+        BalanceSheet: 'balance_sheet_id',
+        IncomeStatement: 'income_statement_id',
+        CashFlow: 'cash_flow_id',
+    }
+
+    def compute_ratios(self, frame, groups=None, periods=1):
+        # Inputs missing from the frame are treated as unknown
+        def value(column):
+            if column in frame.columns:
+                return frame[column]
+            return pd.Series(np.nan, index=frame.index)
+
+        # Zero denominators are treated as missing, matching the analysis services
+        def nonzero(column):
+            return value(column).replace(0, np.nan)
+
+        ratios = pd.DataFrame(index=frame.index)
+        ratios['grossMargin'] = value('grossProfit') / nonzero('revenue')
+        ratios['operatingMargin'] = value('operatingIncome') / nonzero('revenue')
+        ratios['netMargin'] = value('netIncome') / nonzero('revenue')
+        ratios['fcfMargin'] = value('freeCashFlow') / nonzero('revenue')
+        ratios['roe'] = value('netIncome') / nonzero('totalStockholdersEquity')
+        ratios['roa'] = value('netIncome') / nonzero('totalAssets')
+        ratios['debtToEquity'] = value('totalDebt') / nonzero('totalStockholdersEquity')
+        ratios['currentRatio'] = value('totalCurrentAssets') / nonzero('totalCurrentLiabilities')
+        ratios['interestCoverage'] = value('operatingIncome') / nonzero('interestExpense')
+        ratios['payoutRatio'] = value('dividendsPaid').abs() / nonzero('netIncome').abs()
+        ratios['receivablesToSales'] = value('netReceivables') / nonzero('revenue')
+        ratios['dso'] = (value('netReceivables') / nonzero('revenue')) * 365
+        ratios['dpo'] = (value('accountPayables') / nonzero('costOfRevenue')) * 365
+        ratios['inventoryTurnover'] = value('costOfRevenue') / nonzero('inventory')
+        ratios['receivablesTurnover'] = value('revenue') / nonzero('netReceivables')
+        ratios['opexToSales'] = value('operatingExpenses') / nonzero('revenue')
+
+        # Year-over-year changes, computed within each ticker when a panel is given; periods
+        # is how many rows back the same period a year earlier is
+        for name in self.RATIO_COLUMNS:
+            ratios[f'{name}Yoy'] = self.pct_change(ratios[name], groups, periods)
+
+        return ratios
+
+    def pct_change(self, series, groups=None, periods=1):
+        # Same semantics as pandas' default pct_change: gaps are padded with the last known value
+        if groups is None:
+            filled = series.ffill()
+            return filled / filled.shift(periods) - 1
+        filled = series.groupby(groups).ffill()
+        return filled / filled.groupby(groups).shift(periods) - 1
+
+    def load_statement_panel(self, tickers=None):
+        panel = None
+        for model, columns in self.STATEMENT_COLUMNS.items():
+            query = select(
+                model.id.label(self.SOURCE_ID_COLUMNS[model]),
+                model.ticker.label('ticker'),
+                model.date.label('date'),
+                model.calendar_year.label('calendarYear'),
+                *[getattr(model, column).label(name) for name, column in columns.items()]
+            ).where(annual_statements(model))
+            if tickers is not None:
+                query = query.where(model.ticker.in_(tickers))
+            frame = pd.read_sql(query, db.session.connection())
+
+            # Key statements by fiscal year: 52/53-week filers end some years in early January,
+            # so the date's year is not the year the statement covers
+            frame = frame.dropna(subset=['calendarYear']).drop(columns='date')
+
+            panel = frame if panel is None else panel.merge(frame, on=['ticker', 'calendarYear'], how='outer')
+
+        # Missing and zero values are both treated as absent, as in the analysis services
+        for columns in self.STATEMENT_COLUMNS.values():
+            for name in columns:
+                panel[name] = pd.to_numeric(panel[name], errors='coerce').replace(0, np.nan)
+
+        return panel.sort_values(['ticker', 'calendarYear']).reset_index(drop=True)
+
+    def refresh_ratios(self, tickers=None):
+        panel = self.load_statement_panel(tickers)
+        ratios = self.compute_ratios(panel, groups=panel['ticker'])
+        ratios = ratios.replace([np.inf, -np.inf], np.nan)
+
+        # Build one row per (ticker, year) with snake_case column names
+        rows = panel[['ticker', 'calendarYear', *self.SOURCE_ID_COLUMNS.values()]].rename(columns={'calendarYear': 'calendar_year'})
+        for name, column in self.RATIO_COLUMNS.items():
+            rows[column] = ratios[name]
+            rows[f'{column}_yoy'] = ratios[f'{name}Yoy']
+        for column in self.SOURCE_ID_COLUMNS.values():
+            rows[column] = rows[column].astype('Int64')
+        rows = rows.astype(object).where(rows.notna(), None)
+        records = rows.to_dict(orient='records')
+
+        # Keep the ratios being replaced so the peer sketches can be updated incrementally
+        peer_service = PeerService()
+        previous_rows = peer_service.stored_ratio_rows(tickers) if tickers is not None else None
+
+        # Replace the stored ratios in bulk
+        clear = delete(FinancialRatio)
+        if tickers is not None:
+            clear = clear.where(FinancialRatio.ticker.in_(tickers))
+        db.session.execute(clear)
+        if records:
+            bulk_insert(FinancialRatio, records)
+        # Frames and analyses read the ratio store, so they move to a new data version too
+        bump_data_versions(tickers if tickers is not None else rows['ticker'].unique())
+        log_changes(FinancialRatio.__tablename__, [(record['ticker'], record['calendar_year'], None) for record in records], 'refresh')
+        db.session.commit()
+
+        # Fold the new values into the peer sketches
+        if tickers is None:
+            peer_service.rebuild()
+        else:
+            peer_service.apply_ratio_changes(previous_rows, records)
+
+        return len(records)
+
+    def get_ratios_dataframe(self, ticker):
+        columns = [FinancialRatio.calendar_year.label('calendarYear')]
+        for name, column in self.RATIO_COLUMNS.items():
+            columns.append(getattr(FinancialRatio, column).label(name))
+            columns.append(getattr(FinancialRatio, f'{column}_yoy').label(f'{name}Yoy'))
+        query = select(*columns).where(FinancialRatio.ticker == ticker).order_by(FinancialRatio.calendar_year)
+        return pd.read_sql(query, db.session.connection())
+
+    def attach_ratios(self, data, ticker, fiscal_years=None, periods=1):
+        # The store only holds annual ratios, keyed by fiscal year. Annual frames pass the fiscal
+        # year of each row; frames whose year labels don't match them (52/53-week filers) and
+        # quarterly and TTM frames derive their own
+        use_store = fiscal_years is not None and list(data['calendarYear']) == list(fiscal_years)
+        ratios = self.get_ratios_dataframe(ticker) if use_store else pd.DataFrame()
+
+        if not ratios.empty:
+            # Read the precomputed ratios from the store
+            ratio_columns = [column for column in ratios.columns if column != 'calendarYear']
+            ratios[ratio_columns] = ratios[ratio_columns].astype(float)
+            return data.merge(ratios, on='calendarYear', how='left')
+
+        # Nothing stored yet for this ticker, derive the ratios from the frame itself
+        ordered = data.sort_values('calendarYear', kind='stable')
+        ratios = self.compute_ratios(ordered, periods=periods)
+        return data.join(ratios)
+
+    def get_ratios_data(self, ticker):
+        ratios = self.get_ratios_dataframe(ticker)
+        if ratios.empty:
+            return None
+        ratios = ratios.astype(object).where(ratios.notna(), None)
+        return ratios.to_dict(orient='records')
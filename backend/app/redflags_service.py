@@ -2,15 +2,18 @@
 
 import pandas as pd
 import numpy as np
-from app.models import BalanceSheet, IncomeStatement, CashFlow
+from app.ratio_service import RatioService
+from app.threshold_service import ThresholdService
+from app.ttm_service import TTMService
+from app.cache import ticker_cache
+from app.rule_engine import rule_plan
 
 class RedFlagsService:
     
-    def get_financial_data_as_dataframe(self, ticker):
-        # Fetch data from the database
-        balance_sheets = BalanceSheet.query.filter_by(ticker=ticker).all()
-        income_statements = IncomeStatement.query.filter_by(ticker=ticker).all()
-        cash_flows = CashFlow.query.filter_by(ticker=ticker).all()
+    def get_financial_data_as_dataframe(self, ticker, basis='annual'):
+        # Fetch annual, quarterly or TTM data from the database
+        ttm_service = TTMService()
+        balance_sheets, income_statements, cash_flows = ttm_service.statement_records(ticker, basis)
 
         # Initialize dictionary to hold the data
         data = {
@@ -50,7 +53,7 @@ class RedFlagsService:
 
         # Populate data from BalanceSheet, IncomeStatement, and CashFlow tables
         for record in balance_sheets:
-            data['calendarYear'].append(record.date[:4])
+            data['calendarYear'].append(ttm_service.period_label(record, basis))
             data['totalCurrentAssets'].append(record.total_current_assets or np.nan)
             data['cashAndCashEquivalents'].append(record.cash_and_cash_equivalents or np.nan)
             data['netReceivables'].append(record.net_receivables or np.nan)
@@ -83,14 +86,34 @@ class RedFlagsService:
 
         # Create a DataFrame from the dictionary
         df = pd.DataFrame(data)
-        return df
 
-    def analyze_red_flags(self, ticker):
-        data = self.get_financial_data_as_dataframe(ticker)
+        # Add the derived ratios from the ratio store
+        return RatioService().attach_ratios(
+            ttm_service.apply_basis(df, basis), ticker,
+            fiscal_years=[record.calendar_year for record in balance_sheets] if basis == 'annual' else None,
+            periods=ttm_service.YOY_PERIODS[basis])
+
+    def analyze_red_flags(self, ticker, basis='annual', engine='methods'):
+        # The frame is rebuilt only when the ticker's statements change
+        data = ticker_cache.cached('frames', ticker, f'redflags:{basis}', lambda: self.get_financial_data_as_dataframe(ticker, basis))
 
         # Sort data by calendar year to ensure chronological order
         data = data.sort_values('calendarYear').reset_index(drop=True)
 
+        # Quarterly and TTM frames have no rows to analyze when the ticker has no quarters stored
+        if data.empty and basis != 'annual':
+            return None
+        # The rules compare each period with the same one a year earlier and label it by basis
+        data.attrs['basis'] = basis
+
+        # Sector-calibrated thresholds override the rules' keyword defaults
+        thresholds = ThresholdService().thresholds_for(ticker, 'redflags')
+
+        # engine='rules' evaluates the declarative rule set in app/rules/redflags.json instead
+        if engine == 'rules':
+            plan = rule_plan('redflags')
+            return plan.report(plan.evaluate(data, thresholds, periods=self.yoy_periods(data), period=self.period_prefix(data)))
+
         results = []
 
         # List of analysis functions to execute
@@ -111,7 +134,7 @@ class RedFlagsService:
         ]
 
         for function in analysis_functions:
-            result = function(data)
+            result = function(data, **thresholds.get(function.__name__, {}))
             if result:
                 results.append(result)
                 results.append("_____________________________________________________________________________________________")
@@ -133,6 +156,12 @@ class RedFlagsService:
         formatted = f"{round(percent, 2):.2f}".rstrip('0').rstrip('.')
         return formatted
 
+    def yoy_periods(self, data):
+        return TTMService.YOY_PERIODS[data.attrs.get('basis', 'annual')]
+
+    def period_prefix(self, data):
+        return TTMService.PERIOD_PREFIXES[data.attrs.get('basis', 'annual')]
+
     # Individual red flag analysis functions
 
     ############################ RF1 ############################
@@ -144,8 +173,8 @@ class RedFlagsService:
             return "Revenue and Net Income analysis requires 'revenue' and 'netIncome' columns."
         
         # Calculate percentage change for Revenue and Net Income
-        revenue_pct_change = data['revenue'].replace(0, np.nan).pct_change()
-        income_pct_change = data['netIncome'].replace(0, np.nan).pct_change()
+        revenue_pct_change = data['revenue'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data))
+        income_pct_change = data['netIncome'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data))
         
         # Check for declining revenue
         declining_revenue = revenue_pct_change < 0
@@ -164,7 +193,7 @@ class RedFlagsService:
             for year, rev_change, inc_change in zip(red_flag_years, revenue_changes, income_changes):
                 revenue = data.loc[data['calendarYear'] == year, 'revenue'].values[0]
                 netIncome = data.loc[data['calendarYear'] == year, 'netIncome'].values[0]
-                red_flags.append(f"FY {year}: Revenue = {self.format_number(revenue)} (↓ {self.format_percent(abs(rev_change) * 100)}%), Net Income = {self.format_number(netIncome)} (↑ {self.format_percent(inc_change * 100)}%)")
+                red_flags.append(f"{self.period_prefix(data)} {year}: Revenue = {self.format_number(revenue)} (↓ {self.format_percent(abs(rev_change) * 100)}%), Net Income = {self.format_number(netIncome)} (↑ {self.format_percent(inc_change * 100)}%)")
 
             # Format the output
             details = "\n".join(red_flags)
@@ -177,32 +206,28 @@ class RedFlagsService:
 
     ############################ RF2 ############################
 
-    def analyze_debt_to_equity_ratio(self, data):
+    def analyze_debt_to_equity_ratio(self, data, high_leverage_threshold=2):
 
         # Ensure necessary columns are present
         if 'totalDebt' not in data.columns or 'totalStockholdersEquity' not in data.columns:
             return "Debt-to-Equity analysis requires 'totalDebt' and 'totalStockholdersEquity' columns."
         
-        # Define the threshold for high leverage (adjustable based on industry)
-        high_leverage_threshold = 2  # Example: Debt-to-Equity ratio above 2 is considered high
-
-        # Calculate Debt-to-Equity Ratio
-        debt_to_equity = data['totalDebt'] / data['totalStockholdersEquity'].replace(0, np.nan)
-
-        # Calculate percentage change in Debt-to-Equity Ratio
-        debt_to_equity_pct_change = debt_to_equity.pct_change()
+        # Debt-to-Equity Ratio and its percentage change from the ratio store
+        debt_to_equity = data['debtToEquity']
+        debt_to_equity_pct_change = data['debtToEquityYoy']
         increasing_ratio = debt_to_equity_pct_change > 0
 
         # Find the years where the ratio is already high or went from moderate to high
         red_flag_years = []
         ratio_changes = []
 
-        for i in range(1, len(debt_to_equity)):
+        periods = self.yoy_periods(data)
+        for i in range(periods, len(debt_to_equity)):
             if debt_to_equity[i] > high_leverage_threshold and increasing_ratio[i]:
                 # Triggered when the ratio increases and is already in the high leverage zone
                 red_flag_years.append(data['calendarYear'].iloc[i])
                 ratio_changes.append(debt_to_equity_pct_change.iloc[i])
-            elif debt_to_equity[i-1] <= high_leverage_threshold and debt_to_equity[i] > high_leverage_threshold:
+            elif debt_to_equity[i-periods] <= high_leverage_threshold and debt_to_equity[i] > high_leverage_threshold:
                 # Triggered when the ratio shifts from moderate to high
                 red_flag_years.append(data['calendarYear'].iloc[i])
                 ratio_changes.append(debt_to_equity_pct_change.iloc[i])
@@ -211,7 +236,7 @@ class RedFlagsService:
             red_flags = []
             for year, change in zip(red_flag_years, ratio_changes):
                 ratio_value = debt_to_equity[data['calendarYear'] == year].values[0]
-                red_flags.append(f"FY {year}: Debt-to-Equity Ratio = {ratio_value:.2f} (↑ {self.format_percent(change * 100)}%)")
+                red_flags.append(f"{self.period_prefix(data)} {year}: Debt-to-Equity Ratio = {ratio_value:.2f} (↑ {self.format_percent(change * 100)}%)")
 
             # Format the output
             details = "\n".join(red_flags)
@@ -231,8 +256,8 @@ class RedFlagsService:
             return "Operating Cash Flow and Net Income analysis requires 'operatingCashFlow' and 'netIncome' columns."
         
         # Calculate percentage change for Operating Cash Flow and Net Income
-        operating_cash_flow_pct_change = data['operatingCashFlow'].replace(0, np.nan).pct_change()
-        income_pct_change = data['netIncome'].replace(0, np.nan).pct_change()
+        operating_cash_flow_pct_change = data['operatingCashFlow'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data))
+        income_pct_change = data['netIncome'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data))
         
         # Check for declining Operating Cash Flow
         declining_operating_cash_flow = operating_cash_flow_pct_change < 0
@@ -251,7 +276,7 @@ class RedFlagsService:
             for year, rev_change, inc_change in zip(red_flag_years, operating_cash_flow_changes, income_changes):
                 operatingCashFlow = data.loc[data['calendarYear'] == year, 'operatingCashFlow'].values[0]
                 netIncome = data.loc[data['calendarYear'] == year, 'netIncome'].values[0]
-                red_flags.append(f"\nFY {year}: Net Income = {self.format_number(netIncome)} (↑ {self.format_percent(inc_change * 100)}%),\n         Operating Cash Flow = {self.format_number(operatingCashFlow)} (↓ {self.format_percent(abs(rev_change) * 100)}%)")
+                red_flags.append(f"\n{self.period_prefix(data)} {year}: Net Income = {self.format_number(netIncome)} (↑ {self.format_percent(inc_change * 100)}%),\n         Operating Cash Flow = {self.format_number(operatingCashFlow)} (↓ {self.format_percent(abs(rev_change) * 100)}%)")
 
             # Format the output
             details = "\n".join(red_flags)
@@ -270,11 +295,9 @@ class RedFlagsService:
         if 'netReceivables' not in data.columns or 'revenue' not in data.columns:
             return "Accounts Receivable analysis requires 'netReceivables' and 'revenue' columns."
 
-        # Calculate the Accounts Receivable to Sales Ratio
-        receivable_to_sales_ratio = data['netReceivables'] / data['revenue'].replace(0, np.nan)
-
-        # Calculate percentage change in Accounts Receivable to Sales Ratio
-        receivable_to_sales_pct_change = receivable_to_sales_ratio.pct_change()
+        # Accounts Receivable to Sales Ratio and its percentage change from the ratio store
+        receivable_to_sales_ratio = data['receivablesToSales']
+        receivable_to_sales_pct_change = data['receivablesToSalesYoy'].copy()
 
         # Remove NaN changes (typically the first year) from the analysis
         receivable_to_sales_pct_change.iloc[0] = None  # Set the first year explicitly to None
@@ -304,27 +327,27 @@ class RedFlagsService:
             caution_flags = []
             for year, ratio, change in zip(caution_years, caution_ratios, caution_changes):
                 arrow = "↑" if change > 0 else "↓"
-                caution_flags.append(f"FY {year}: Accounts Receivable to Sales = {self.format_percent(ratio * 100)}% ({arrow} {self.format_percent(abs(change) * 100)}%)")
+                caution_flags.append(f"{self.period_prefix(data)} {year}: Accounts Receivable to Sales = {self.format_percent(ratio * 100)}% ({arrow} {self.format_percent(abs(change) * 100)}%)")
             if caution_flags:
-                output.append(f"\nCaution Zone: Accounts Receivable to Sales between 15%-20%\n{'\n'.join(caution_flags)}")
+                output.append(f"\nCaution Zone: Accounts Receivable to Sales between {self.format_percent(caution_threshold * 100)}%-{self.format_percent(red_flag_threshold * 100)}%\n{'\n'.join(caution_flags)}")
 
         # Red flag zone output
         if red_flag_years:
             red_flags = []
             for year, ratio, change in zip(red_flag_years, red_flag_ratios, red_flag_changes):
                 arrow = "↑" if change > 0 else "↓"
-                red_flags.append(f"FY {year}: Accounts Receivable to Sales = {self.format_percent(ratio * 100)}% ({arrow} {self.format_percent(abs(change) * 100)}%)")
+                red_flags.append(f"{self.period_prefix(data)} {year}: Accounts Receivable to Sales = {self.format_percent(ratio * 100)}% ({arrow} {self.format_percent(abs(change) * 100)}%)")
             if red_flags:
-                output.append(f"\nRed Flag: Accounts Receivable to Sales between 20%-30%\n{'\n'.join(red_flags)}")
+                output.append(f"\nRed Flag: Accounts Receivable to Sales between {self.format_percent(red_flag_threshold * 100)}%-{self.format_percent(critical_threshold * 100)}%\n{'\n'.join(red_flags)}")
 
         # Critical zone output
         if critical_years:
             critical_flags = []
             for year, ratio, change in zip(critical_years, critical_ratios, critical_changes):
                 arrow = "↑" if change > 0 else "↓"
-                critical_flags.append(f"FY {year}: Accounts Receivable to Sales = {self.format_percent(ratio * 100)}% ({arrow} {self.format_percent(abs(change) * 100)}%)")
+                critical_flags.append(f"{self.period_prefix(data)} {year}: Accounts Receivable to Sales = {self.format_percent(ratio * 100)}% ({arrow} {self.format_percent(abs(change) * 100)}%)")
             if critical_flags:
-                output.append(f"\nCritical Zone: Accounts Receivable to Sales above 30%\n{'\n'.join(critical_flags)}")
+                output.append(f"\nCritical Zone: Accounts Receivable to Sales above {self.format_percent(critical_threshold * 100)}%\n{'\n'.join(critical_flags)}")
 
         return '\n'.join(output) if output else None
 
@@ -336,11 +359,9 @@ class RedFlagsService:
         if 'grossProfit' not in data.columns or 'revenue' not in data.columns:
             return "Gross Profit Margin analysis requires 'grossProfit' and 'revenue' columns."
 
-        # Calculate the Gross Profit Margin for each year
-        data['gross_profit_margin'] = data['grossProfit'] / data['revenue'].replace(0, np.nan)
-
-        # Calculate percentage change in Gross Profit Margin year-over-year
-        margin_pct_change = data['gross_profit_margin'].pct_change()
+        # Gross Profit Margin and its year-over-year change from the ratio store
+        data['gross_profit_margin'] = data['grossMargin']
+        margin_pct_change = data['grossMarginYoy']
 
         # Identify years for Caution, Red Flag, and Critical Zones
         caution_years = data.loc[(margin_pct_change <= caution_threshold) & (margin_pct_change > red_flag_threshold), 'calendarYear'].tolist()
@@ -364,31 +385,31 @@ class RedFlagsService:
             caution_flags = []
             for year, change in zip(caution_years, caution_changes):
                 gross_profit_margin = data.loc[data['calendarYear'] == year, 'gross_profit_margin'].values[0]
-                caution_flags.append(f"FY {year}: Gross Profit Margin = {self.format_percent(gross_profit_margin * 100)}% (↓ {self.format_percent(abs(change) * 100)}%)")
-            output.append(f"\nCaution Zone: Gross Profit Margin decreased between 10%-20%\n{'\n'.join(caution_flags)}")
+                caution_flags.append(f"{self.period_prefix(data)} {year}: Gross Profit Margin = {self.format_percent(gross_profit_margin * 100)}% (↓ {self.format_percent(abs(change) * 100)}%)")
+            output.append(f"\nCaution Zone: Gross Profit Margin decreased between {self.format_percent(abs(caution_threshold) * 100)}%-{self.format_percent(abs(red_flag_threshold) * 100)}%\n{'\n'.join(caution_flags)}")
 
         # Red flag zone output
         if red_flag_years:
             red_flags = []
             for year, change in zip(red_flag_years, red_flag_changes):
                 gross_profit_margin = data.loc[data['calendarYear'] == year, 'gross_profit_margin'].values[0]
-                red_flags.append(f"FY {year}: Gross Profit Margin = {self.format_percent(gross_profit_margin * 100)}% (↓ {self.format_percent(abs(change) * 100)}%)")
-            output.append(f"\nRed Flag: Gross Profit Margin decreased above 20%\n{'\n'.join(red_flags)}")
+                red_flags.append(f"{self.period_prefix(data)} {year}: Gross Profit Margin = {self.format_percent(gross_profit_margin * 100)}% (↓ {self.format_percent(abs(change) * 100)}%)")
+            output.append(f"\nRed Flag: Gross Profit Margin decreased above {self.format_percent(abs(red_flag_threshold) * 100)}%\n{'\n'.join(red_flags)}")
 
         # Critical zone output
         if critical_years:
             critical_flags = []
             for year, change in zip(critical_years, critical_changes):
                 gross_profit_margin = data.loc[data['calendarYear'] == year, 'gross_profit_margin'].values[0]
-                critical_flags.append(f"FY {year}: Gross Profit Margin = {self.format_percent(gross_profit_margin * 100)}% (↓ {self.format_percent(abs(change) * 100)}%)")
-            output.append(f"\nCritical Zone: Gross Profit Margin decreased above 30%\n{'\n'.join(critical_flags)}")
+                critical_flags.append(f"{self.period_prefix(data)} {year}: Gross Profit Margin = {self.format_percent(gross_profit_margin * 100)}% (↓ {self.format_percent(abs(change) * 100)}%)")
+            output.append(f"\nCritical Zone: Gross Profit Margin decreased above {self.format_percent(abs(critical_threshold) * 100)}%\n{'\n'.join(critical_flags)}")
 
         # Flag years with persistently negative gross profit margins
         negative_margin_years = data.loc[data['gross_profit_margin'] < 0, 'calendarYear'].tolist()
         if negative_margin_years:
             output.append("\n!!! Persistently Negative Gross Profit Margins\n")
             output.append("The following years had negative gross profit margins, indicating a loss on sales before other expenses:\n")
-            output.append("   " + ", ".join([f"FY {year}" for year in negative_margin_years]))
+            output.append("   " + ", ".join([f"{self.period_prefix(data)} {year}" for year in negative_margin_years]))
 
         return '\n'.join(output) if output else None
 
@@ -400,11 +421,9 @@ class RedFlagsService:
         if 'inventory' not in data.columns or 'costOfRevenue' not in data.columns:
             return "Inventory Turnover analysis requires 'inventory' and 'costOfRevenue' columns."
 
-        # Calculate Inventory Turnover Ratio
-        data['inventory_turnover'] = data['costOfRevenue'] / data['inventory'].replace(0, np.nan)
-
-        # Calculate percentage change in Inventory Turnover Ratio
-        turnover_pct_change = data['inventory_turnover'].pct_change()
+        # Inventory Turnover Ratio and its percentage change from the ratio store
+        data['inventory_turnover'] = data['inventoryTurnover']
+        turnover_pct_change = data['inventoryTurnoverYoy']
 
         # Identify years where turnover decreased in Caution, Red Flag, and Critical Zones
         caution_years = data.loc[(turnover_pct_change <= caution_threshold) & (turnover_pct_change > red_flag_threshold), 'calendarYear'].tolist()
@@ -428,24 +447,24 @@ class RedFlagsService:
             caution_flags = []
             for year, change in zip(caution_years, caution_changes):
                 inventory_turnover = data.loc[data['calendarYear'] == year, 'inventory_turnover'].values[0]
-                caution_flags.append(f"FY {year}: Inventory Turnover = {inventory_turnover:.2f} (↓ {self.format_percent(abs(change) * 100)}%)")
-            output.append(f"\nCaution Zone: Inventory Turnover decreased between 5%-10%\n{'\n'.join(caution_flags)}")
+                caution_flags.append(f"{self.period_prefix(data)} {year}: Inventory Turnover = {inventory_turnover:.2f} (↓ {self.format_percent(abs(change) * 100)}%)")
+            output.append(f"\nCaution Zone: Inventory Turnover decreased between {self.format_percent(abs(caution_threshold) * 100)}%-{self.format_percent(abs(red_flag_threshold) * 100)}%\n{'\n'.join(caution_flags)}")
 
         # Red flag zone output
         if red_flag_years:
             red_flags = []
             for year, change in zip(red_flag_years, red_flag_changes):
                 inventory_turnover = data.loc[data['calendarYear'] == year, 'inventory_turnover'].values[0]
-                red_flags.append(f"FY {year}: Inventory Turnover = {inventory_turnover:.2f} (↓ {self.format_percent(abs(change) * 100)}%)")
-            output.append(f"\nRed Flag: Inventory Turnover decreased above 10%\n{'\n'.join(red_flags)}")
+                red_flags.append(f"{self.period_prefix(data)} {year}: Inventory Turnover = {inventory_turnover:.2f} (↓ {self.format_percent(abs(change) * 100)}%)")
+            output.append(f"\nRed Flag: Inventory Turnover decreased above {self.format_percent(abs(red_flag_threshold) * 100)}%\n{'\n'.join(red_flags)}")
 
         # Critical zone output
         if critical_years:
             critical_flags = []
             for year, change in zip(critical_years, critical_changes):
                 inventory_turnover = data.loc[data['calendarYear'] == year, 'inventory_turnover'].values[0]
-                critical_flags.append(f"FY {year}: Inventory Turnover = {inventory_turnover:.2f} (↓ {self.format_percent(abs(change) * 100)}%)")
-            output.append(f"\nCritical Zone: Inventory Turnover decreased above 20%\n{'\n'.join(critical_flags)}")
+                critical_flags.append(f"{self.period_prefix(data)} {year}: Inventory Turnover = {inventory_turnover:.2f} (↓ {self.format_percent(abs(change) * 100)}%)")
+            output.append(f"\nCritical Zone: Inventory Turnover decreased above {self.format_percent(abs(critical_threshold) * 100)}%\n{'\n'.join(critical_flags)}")
 
         return '\n'.join(output) if output else None
 
@@ -458,7 +477,7 @@ class RedFlagsService:
             return "Goodwill analysis requires 'goodwill' column."
         
         # Calculate year-over-year percentage change in Goodwill
-        goodwill_pct_change = data['goodwill'].replace(0, np.nan).pct_change()
+        goodwill_pct_change = data['goodwill'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data))
 
         # Identify years where the YoY increase falls within the caution or red flag thresholds
         caution_years = data.loc[(goodwill_pct_change > caution_threshold) & (goodwill_pct_change <= red_flag_threshold), 'calendarYear'].tolist()
@@ -474,7 +493,7 @@ class RedFlagsService:
             caution_flags = []
             for year, change in zip(caution_years, caution_changes):
                 goodwill = data.loc[data['calendarYear'] == year, 'goodwill'].values[0]
-                caution_flags.append(f"FY {year}: Goodwill = {self.format_number(goodwill)} (↑ {self.format_percent(change * 100)}%)")
+                caution_flags.append(f"{self.period_prefix(data)} {year}: Goodwill = {self.format_number(goodwill)} (↑ {self.format_percent(change * 100)}%)")
             output.append(f"\n\nCaution Zone: Goodwill increased between 10%-20%\n{'\n'.join(caution_flags)}")
 
         # Red flag zone output
@@ -482,7 +501,7 @@ class RedFlagsService:
             red_flags = []
             for year, change in zip(red_flag_years, red_flag_changes):
                 goodwill = data.loc[data['calendarYear'] == year, 'goodwill'].values[0]
-                red_flags.append(f"FY {year}: Goodwill = {self.format_number(goodwill)} (↑ {self.format_percent(change * 100)}%)")
+                red_flags.append(f"{self.period_prefix(data)} {year}: Goodwill = {self.format_number(goodwill)} (↑ {self.format_percent(change * 100)}%)")
             output.append(f"\n\nRed Flag: Goodwill increased above 20%\n{'\n'.join(red_flags)}")
 
         # If there are caution or red flags, add the warning text
@@ -503,8 +522,8 @@ class RedFlagsService:
         if 'operatingIncome' not in data.columns or 'interestExpense' not in data.columns:
             return "Interest Coverage analysis requires 'operatingIncome' and 'interestExpense' columns."
 
-        # Calculate Interest Coverage Ratio
-        data['Interest Coverage'] = data['operatingIncome'] / data['interestExpense'].replace(0, np.nan)
+        # Interest Coverage Ratio from the ratio store
+        data['Interest Coverage'] = data['interestCoverage']
 
         # Initialize output
         output = []
@@ -517,16 +536,16 @@ class RedFlagsService:
                 coverage = row['Interest Coverage']
 
                 # Calculate percent change and direction from prior year
-                if i > 0:
-                    prev_coverage = data.iloc[i - 1]['Interest Coverage']
+                if i >= self.yoy_periods(data):
+                    prev_coverage = data.iloc[i - self.yoy_periods(data)]['Interest Coverage']
                     if not pd.isnull(prev_coverage):
                         change = (coverage - prev_coverage) / abs(prev_coverage) * 100
                         direction = "↓" if change < 0 else "↑"
-                        flags.append(f"FY {year}: Interest Coverage = {coverage:.2f} ({direction} {self.format_percent(abs(change))}%)")
+                        flags.append(f"{self.period_prefix(data)} {year}: Interest Coverage = {coverage:.2f} ({direction} {self.format_percent(abs(change))}%)")
                         continue
 
                 # For the first year or when no valid previous value exists
-                flags.append(f"FY {year}: Interest Coverage = {coverage:.2f}")
+                flags.append(f"{self.period_prefix(data)} {year}: Interest Coverage = {coverage:.2f}")
 
             if flags:
                 range_text = f" {threshold_range}" if threshold_range else ""
@@ -572,14 +591,14 @@ class RedFlagsService:
         if 'netReceivables' not in data.columns or 'revenue' not in data.columns:
             return "Net Receivables and Revenue analysis requires 'netReceivables' and 'revenue' columns."
 
-        # Calculate DSO
-        data['DSO'] = (data['netReceivables'] / data['revenue'].replace(0, np.nan)) * 365
+        # DSO from the ratio store
+        data['DSO'] = data['dso']
 
         # Check if DSO is already bad
         bad_dso = data['DSO'] > bad_dso_threshold
 
         # Calculate year-over-year percentage change in DSO
-        dso_pct_change = data['DSO'].pct_change() * 100
+        dso_pct_change = data['dsoYoy'] * 100
 
         # Filter for years where DSO is bad
         caution_zone = dso_pct_change[(dso_pct_change > 5) & (dso_pct_change <= 10) & bad_dso]
@@ -595,7 +614,7 @@ class RedFlagsService:
                 year = data['calendarYear'].iloc[idx]
                 change = caution_zone[idx]
                 dso_value = data['DSO'].iloc[idx]
-                output.append(f"FY {year}: DSO = {dso_value:.2f} (↑ {self.format_percent(change)}%)")
+                output.append(f"{self.period_prefix(data)} {year}: DSO = {dso_value:.2f} (↑ {self.format_percent(change)}%)")
 
         # \n   Red Flag Zone
         if not red_flag_zone.empty:
@@ -604,7 +623,7 @@ class RedFlagsService:
                 year = data['calendarYear'].iloc[idx]
                 change = red_flag_zone[idx]
                 dso_value = data['DSO'].iloc[idx]
-                output.append(f"FY {year}: DSO = {dso_value:.2f} (↑ {self.format_percent(change)}%)")
+                output.append(f"{self.period_prefix(data)} {year}: DSO = {dso_value:.2f} (↑ {self.format_percent(change)}%)")
 
         # Check for output presence
         if output:
@@ -632,7 +651,7 @@ class RedFlagsService:
 
         if not negative_fcf.empty:
             for year, fcf in zip(negative_fcf['calendarYear'], negative_fcf['freeCashFlow']):
-                output.append(f"FY {year}: Free Cash Flow = {self.format_number(fcf)}")
+                output.append(f"{self.period_prefix(data)} {year}: Free Cash Flow = {self.format_number(fcf)}")
 
         # Check for output presence
         if output:
@@ -652,11 +671,9 @@ class RedFlagsService:
         if not all(col in data.columns for col in ['calendarYear', 'dividendsPaid', 'netIncome', 'freeCashFlow']):
             return "Dividend Payout and Free Cash Flow analysis requires 'dividendsPaid', 'netIncome', 'freeCashFlow' columns."
 
-        # Calculate Dividend Payout Ratio
-        data['payout_ratio'] = data['dividendsPaid'].abs() / data['netIncome'].replace(0, np.nan).abs()
-
-        # Calculate the percentage change in payout ratio
-        data['payout_ratio_pct_change'] = data['payout_ratio'].pct_change() * 100
+        # Dividend Payout Ratio and its percentage change from the ratio store
+        data['payout_ratio'] = data['payoutRatio']
+        data['payout_ratio_pct_change'] = data['payoutRatioYoy'] * 100
 
         # Filter for companies with payout ratio > 75% and free cash flow < absolute dividends paid
         high_payout_poor_cash_flow = data[
@@ -671,9 +688,9 @@ class RedFlagsService:
                 "Unsustainable dividend policy, possibly leading to increased debt or depletion of cash reserves. This situation may indicate management's attempt to maintain investor confidence at the expense of long-term financial stability."
             ]
             for idx, row in high_payout_poor_cash_flow.iterrows():
-                if idx == 0:  # Skip percentage change for the first row
+                if idx < self.yoy_periods(data):  # Skip percentage change for the first row
                     output.append(
-                        f"FY {int(row['calendarYear'])}: "
+                        f"{self.period_prefix(data)} {row['calendarYear']}: "
                         f"Payout Ratio = {row['payout_ratio']:.2f}, "
                         f"Free Cash Flow = {self.format_number(row['freeCashFlow'])}, "
                         f"Dividends Paid = {self.format_number(abs(row['dividendsPaid']))}"
@@ -683,7 +700,7 @@ class RedFlagsService:
                     change_symbol = "↑" if pct_change > 0 else "↓"
                     pct_change_str = f"({change_symbol} {self.format_percent(abs(pct_change))}%)"
                     output.append(
-                        f"\nFY {int(row['calendarYear'])}: "
+                        f"\n{self.period_prefix(data)} {row['calendarYear']}: "
                         f"Payout Ratio = {row['payout_ratio']:.2f} {pct_change_str}, \n         "
                         f"Free Cash Flow = {self.format_number(row['freeCashFlow'])}, "
                         f"Dividends Paid = {self.format_number(abs(row['dividendsPaid']))}"
@@ -701,7 +718,7 @@ class RedFlagsService:
             return "Equity Issuances analysis requires 'weightedAverageShsOut' column."
 
         # Calculate year-over-year change in shares outstanding
-        data['shares_change'] = data['weightedAverageShsOut'].replace(0, np.nan).pct_change()
+        data['shares_change'] = data['weightedAverageShsOut'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data))
 
         # Filter for significant increases in shares outstanding (e.g., more than 10% increase)
         equity_issuances = data[data['shares_change'] > issuance_threshold]
@@ -711,7 +728,7 @@ class RedFlagsService:
         
         if not equity_issuances.empty:
             for year, change, shares in zip(equity_issuances['calendarYear'], equity_issuances['shares_change'], equity_issuances['weightedAverageShsOut']):
-                output.append(f"FY {year}: Shares Outstanding = {self.format_number(shares)} (↑ {self.format_percent(change * 100)}%)")
+                output.append(f"{self.period_prefix(data)} {year}: Shares Outstanding = {self.format_number(shares)} (↑ {self.format_percent(change * 100)}%)")
 
         # Check if any red flags are found
         if output:
@@ -732,7 +749,7 @@ class RedFlagsService:
             return "Short-Term Debt analysis requires 'shortTermDebt' column."
 
         # Calculate year-over-year percentage change in short-term debt
-        short_term_debt_pct_change = data['shortTermDebt'].replace(0, np.nan).pct_change()
+        short_term_debt_pct_change = data['shortTermDebt'].replace(0, np.nan).pct_change(periods=self.yoy_periods(data))
 
         # Identify years where the YoY increase falls within the caution or red flag thresholds
         caution_years = data.loc[(short_term_debt_pct_change > caution_threshold) & 
@@ -756,7 +773,7 @@ class RedFlagsService:
             caution_flags = []
             for year, change in zip(caution_years, caution_changes):
                 shortTermDebt = data.loc[data['calendarYear'] == year, 'shortTermDebt'].values[0]
-                caution_flags.append(f"FY {year}: Short-Term Debt = {self.format_number(shortTermDebt)} (↑ {self.format_percent(change * 100)}%)")
+                caution_flags.append(f"{self.period_prefix(data)} {year}: Short-Term Debt = {self.format_number(shortTermDebt)} (↑ {self.format_percent(change * 100)}%)")
             output.append(f"\nCaution Zone: Short-Term Debt increased between 15%-30%\n{'\n'.join(caution_flags)}")
 
         # Red flag zone output
@@ -764,7 +781,7 @@ class RedFlagsService:
             red_flags = []
             for year, change in zip(red_flag_years, red_flag_changes):
                 shortTermDebt = data.loc[data['calendarYear'] == year, 'shortTermDebt'].values[0]
-                red_flags.append(f"FY {year}: Short-Term Debt = {self.format_number(shortTermDebt)} (↑ {self.format_percent(change * 100)}%)")
+                red_flags.append(f"{self.period_prefix(data)} {year}: Short-Term Debt = {self.format_number(shortTermDebt)} (↑ {self.format_percent(change * 100)}%)")
             output.append(f"\nRed Flag: Short-Term Debt increased above 30%\n{'\n'.join(red_flags)}")
 
         # Combine warning text with output
@@ -0,0 +1,250 @@
+# app/refresh_scheduler.py
+
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func, case
+from app.db import db
+from app.models import IncomeStatement, RefreshCheck, QUARTERLY_PERIODS, annual_statements
+from app.access_tracker import access_tracker
+
+
+def utcnow():
+    # Stored DateTimes come back naive, so the scheduler works in naive UTC throughout
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value[:10], '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class RefreshScheduler:
+    # Spends a fixed budget of FMP requests per cycle on the stored tickers most likely to
+    # have filed something new, weighted towards the ones that are actually requested
+
+    # FMP calls to refresh one period type: the three statements
+    REQUESTS_PER_REFRESH = 3
+    # Days between filings for tickers with quarterly rows, and for annual-only ones
+    QUARTER_DAYS = 91
+    YEAR_DAYS = 365
+    # Days from period end to filing, when the stored rows don't say, and the range kept to
+    DEFAULT_FILING_LAG = 45
+    FILING_LAG_RANGE = (20, 120)
+    # The due score rises over the days before the expected filing date
+    DUE_RAMP_DAYS = 14
+    # Score weights: how due the next filing is, how old the latest one is, and demand
+    DUE_WEIGHT = 2.0
+    STALENESS_WEIGHT = 1.0
+    POPULARITY_WEIGHT = 1.0
+    # Rechecks of a ticker that keeps coming back empty back off up to 2 ** MAX_BACKOFF times
+    MAX_BACKOFF = 3
+
+    def __init__(self, budget=250, recheck_hours=24, popularity=None):
+        self.budget = budget
+        self.recheck = timedelta(hours=recheck_hours)
+        self.popularity = popularity or access_tracker.popularity
+        self.interval = None
+        self.cycles = 0
+        self.last_cycle = None
+        self.running = threading.Lock()
+
+    def freshness(self, now):
+        # Per stored ticker: latest filing, latest quarter and fiscal year end, when the
+        # next filing is expected, and whether a new fiscal year should be out by now
+        quarterly = IncomeStatement.period.in_(QUARTERLY_PERIODS)
+        rows = db.session.execute(
+            select(
+                IncomeStatement.ticker,
+                func.max(IncomeStatement.filling_date),
+                func.max(case((quarterly, IncomeStatement.date))),
+                func.max(case((annual_statements(IncomeStatement), IncomeStatement.date))),
+            ).group_by(IncomeStatement.ticker)
+        ).all()
+        checks = {check.ticker: check for check in db.session.execute(select(RefreshCheck)).scalars()}
+
+        items = []
+        for ticker, filed, quarter_end, year_end in rows:
+            filed, quarter_end, year_end = parse_date(filed), parse_date(quarter_end), parse_date(year_end)
+            latest = max(date for date in (quarter_end, year_end, datetime.min) if date)
+            lag = self.DEFAULT_FILING_LAG
+            if filed and latest > datetime.min:
+                lag = min(max((filed - latest).days, self.FILING_LAG_RANGE[0]), self.FILING_LAG_RANGE[1])
+            cadence = self.QUARTER_DAYS if quarter_end else self.YEAR_DAYS
+            items.append({
+                "ticker": ticker,
+                "filed": filed,
+                "quarterly": quarter_end is not None,
+                "expected": latest + timedelta(days=cadence + lag),
+                "annualDue": year_end is None or now >= year_end + timedelta(days=self.YEAR_DAYS + lag),
+                "check": checks.get(ticker),
+            })
+        return items
+
+    def score(self, item, popularity, now):
+        days_until = (item["expected"] - now).days
+        due = 1.0 if days_until <= 0 else max(0.0, 1 - days_until / self.DUE_RAMP_DAYS)
+        age = (now - item["filed"]).days if item["filed"] else 2 * self.YEAR_DAYS
+        staleness = min(age / self.YEAR_DAYS, 2.0)
+        return due, self.DUE_WEIGHT * due + self.STALENESS_WEIGHT * staleness + self.POPULARITY_WEIGHT * popularity.get(item["ticker"], 0.0)
+
+    def cost(self, item):
+        # Quarterly tickers pull new quarters, plus the annual statements once a fiscal year is due
+        return self.REQUESTS_PER_REFRESH * (1 + (item["quarterly"] and item["annualDue"]))
+
+    def recently_checked(self, check, now):
+        if check is None:
+            return False
+        backoff = 2 ** min(check.misses, self.MAX_BACKOFF)
+        return now - check.checked_at < self.recheck * backoff
+
+    def plan(self, now, budget=None):
+        # Highest scores first, as many as the budget pays for; only tickers whose next
+        # filing is due or close to it, and that weren't checked too recently
+        budget = self.budget if budget is None else budget
+        popularity = self.popularity()
+        ranked = []
+        for item in self.freshness(now):
+            due, score = self.score(item, popularity, now)
+            if due > 0 and not self.recently_checked(item["check"], now):
+                ranked.append((score, item))
+        ranked.sort(key=lambda entry: entry[0], reverse=True)
+
+        plan, spent = [], 0
+        for score, item in ranked:
+            cost = self.cost(item)
+            if spent + cost > budget:
+                continue
+            plan.append(dict(item, score=round(score, 4), cost=cost))
+            spent += cost
+        return plan
+
+    def run_cycle(self, budget=None):
+        if not self.running.acquire(blocking=False):
+            return None  # A cycle is already under way in this process
+        try:
+            return self._run_cycle(budget)
+        finally:
+            self.running.release()
+
+    def _run_cycle(self, budget):
+        from app.financial_service import FinancialService
+        service = FinancialService()
+
+        started = utcnow()
+        summary = {"startedAt": started.isoformat(), "budget": self.budget if budget is None else budget,
+                   "tickers": 0, "requests": 0, "found": 0, "errors": 0}
+        for item in self.plan(started, budget):
+            ticker = item["ticker"]
+            new_filings = []
+            try:
+                if item["quarterly"]:
+                    new_filings += service.fetch_quarterly_data(ticker)["newQuarters"]
+                if item["annualDue"] or not item["quarterly"]:
+                    new_filings += service.refresh_annual_data(ticker)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Refresh of {ticker} failed: {e}")
+                summary["errors"] += 1
+            self.record_check(ticker, bool(new_filings))
+            summary["tickers"] += 1
+            summary["requests"] += item["cost"]
+            summary["found"] += bool(new_filings)
+
+        summary["finishedAt"] = utcnow().isoformat()
+        self.cycles += 1
+        self.last_cycle = summary
+        return summary
+
+    def record_check(self, ticker, found):
+        now = utcnow()
+        check = db.session.get(RefreshCheck, ticker)
+        if check is None:
+            check = RefreshCheck(ticker=ticker, misses=0)
+            db.session.add(check)
+        check.checked_at = now
+        check.misses = 0 if found else check.misses + 1
+        if found:
+            check.found_at = now
+        db.session.commit()
+
+    def metrics(self):
+        # Freshness lag: days since each ticker's latest stored filing. Overdue: tickers
+        # whose next filing was expected by now but isn't stored yet
+        now = utcnow()
+        items = self.freshness(now)
+        lags = sorted((now - item["filed"]).days for item in items if item["filed"])
+        overdue = sorted((now - item["expected"]).days for item in items if item["expected"] <= now)
+        return {
+            "tickers": len(items),
+            "freshnessLagDays": {"p50": percentile(lags, 0.5), "p90": percentile(lags, 0.9), "max": lags[-1] if lags else None},
+            "overdue": len(overdue),
+            "overdueDays": {"p50": percentile(overdue, 0.5), "p90": percentile(overdue, 0.9)},
+            "neverFiled": len(items) - len(lags),
+            "budget": self.budget,
+            "interval": self.interval,
+            "cycles": self.cycles,
+            "lastCycle": self.last_cycle,
+        }
+
+
+refresh_scheduler = RefreshScheduler()
+
+
+def init_refresh_scheduler(app):
+    # Runs a cycle every REFRESH_INTERVAL seconds; off when the interval is 0
+    refresh_scheduler.budget = app.config.get('REFRESH_BUDGET', refresh_scheduler.budget)
+    refresh_scheduler.recheck = timedelta(hours=app.config.get('REFRESH_RECHECK_HOURS', 24))
+    interval = app.config.get('REFRESH_INTERVAL')
+    if not interval:
+        return
+    refresh_scheduler.interval = interval
+
+    # With several server processes only the one holding the lock file spends the budget
+    if not acquire_scheduler_lock(os.path.join(app.instance_path, 'refresh_scheduler.lock')):
+        return
+
+    def run_periodically():
+        try:
+            with app.app_context():
+                refresh_scheduler.run_cycle()
+        except Exception as e:
+            print(f"Refresh cycle failed: {e}")
+        schedule()
+
+    def schedule():
+        timer = threading.Timer(interval, run_periodically)
+        timer.daemon = True
+        timer.start()
+
+    schedule()
+
+
+scheduler_lock_file = None
+
+
+def acquire_scheduler_lock(path):
+    global scheduler_lock_file
+    try:
+        import fcntl
+    except ImportError:
+        return True  # No advisory locks on this platform; run in every process
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lock_file = open(path, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    # Held for the life of the process
+    scheduler_lock_file = lock_file
+    return True
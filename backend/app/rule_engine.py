@@ -0,0 +1,475 @@
+# app/rule_engine.py
+
+import ast
+import json
+import os
+import string
+import threading
+import numpy as np
+import pandas as pd
+
+RULES_DIR = os.path.join(os.path.dirname(__file__), 'rules')
+
+
+class RuleError(ValueError):
+    pass
+
+
+def format_number(value):
+    # Same output as the services' format_number on the frame's float64 values
+    # (numpy rounding, which can differ from Python's round() on exact ties)
+    value = np.float64(value)
+    if abs(value) >= 1_000_000_000:
+        return f"{round(value / 1_000_000_000, 2):.2f}".rstrip('0').rstrip('.') + " billion"
+    elif abs(value) >= 1_000_000:
+        return f"{round(value / 1_000_000, 2):.2f}".rstrip('0').rstrip('.') + " million"
+    return f"{round(value, 2):.2f}".rstrip('0').rstrip('.')
+
+
+def format_percent(value):
+    return f"{round(np.float64(value), 2):.2f}".rstrip('0').rstrip('.')
+
+
+class Expression:
+    # One rule expression in Python syntax over frame columns, derived values and parameters,
+    # e.g. "pct_change(nonzero(revenue)) < 0 and netIncome > 0". It is checked against the
+    # allowed syntax and compiled once; evaluating it works on whole columns at a time.
+
+    # Functions that look at other rows of the same ticker; everything else is row-wise
+    WINDOW_FUNCTIONS = {'pct_change', 'diff', 'prev', 'all', 'any'}
+    ROW_FUNCTIONS = {'nonzero', 'abs', 'isna', 'notna', 'where', 'number', 'percent'}
+
+    NODES = (
+        ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div,
+        ast.UnaryOp, ast.USub, ast.UAdd, ast.Not, ast.Invert, ast.BitAnd, ast.BitOr, ast.Compare,
+        ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq, ast.Name, ast.Load, ast.Constant, ast.Call,
+    )
+
+    def __init__(self, source, row_wise=False):
+        self.source = source
+        try:
+            tree = ast.parse(source.strip(), mode='eval')
+        except SyntaxError as e:
+            raise RuleError(f"Invalid expression {source!r}: {e.msg}.")
+
+        functions = self.ROW_FUNCTIONS if row_wise else self.ROW_FUNCTIONS | self.WINDOW_FUNCTIONS
+        for node in ast.walk(tree):
+            if not isinstance(node, self.NODES):
+                raise RuleError(f"Unsupported syntax in {source!r}: {type(node).__name__}.")
+            if isinstance(node, ast.Call):
+                if not isinstance(node.func, ast.Name) or node.func.id not in functions or node.keywords:
+                    raise RuleError(f"Unsupported function call in {source!r}.")
+            if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, str)):
+                raise RuleError(f"Unsupported constant in {source!r}.")
+
+        tree = ast.fix_missing_locations(self.Vectorize().visit(tree))
+        self.code = compile(tree, f'<rule {source}>', 'eval')
+
+    class Vectorize(ast.NodeTransformer):
+        # and/or/not and chained comparisons don't work on Series; rewrite them elementwise
+
+        def visit_BoolOp(self, node):
+            self.generic_visit(node)
+            operator = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+            result = node.values[0]
+            for value in node.values[1:]:
+                result = ast.BinOp(left=result, op=operator, right=value)
+            return result
+
+        def visit_UnaryOp(self, node):
+            self.generic_visit(node)
+            if isinstance(node.op, ast.Not):
+                return ast.UnaryOp(op=ast.Invert(), operand=node.operand)
+            return node
+
+        def visit_Compare(self, node):
+            self.generic_visit(node)
+            left, result = node.left, None
+            for operator, right in zip(node.ops, node.comparators):
+                comparison = ast.Compare(left=left, ops=[operator], comparators=[right])
+                result = comparison if result is None else ast.BinOp(left=result, op=ast.BitAnd(), right=comparison)
+                left = right
+            return result
+
+    def evaluate(self, namespace):
+        return eval(self.code, {'__builtins__': {}}, namespace)
+
+
+class Template:
+    # Message text with {expression} or {expression:format} fields, e.g.
+    # "FY {calendarYear}: Revenue = {number(revenue)} (↓ {percent(abs(revenue_change) * 100)}%)"
+
+    def __init__(self, source):
+        self.source = source
+        self.parts = []  # (literal text, field expression or None, format spec)
+        try:
+            parsed = list(string.Formatter().parse(source))
+        except ValueError as e:
+            raise RuleError(f"Invalid template {source!r}: {e}.")
+        for literal, field, spec, conversion in parsed:
+            if conversion is not None:
+                raise RuleError(f"Template fields can't use '!' in {source!r}.")
+            self.parts.append((literal, Expression(field, row_wise=True) if field is not None else None, spec or ''))
+
+    def render(self, namespace):
+        # A single string, for headings and messages that only use parameters
+        return ''.join(
+            literal + (format(field.evaluate(namespace), spec) if field is not None else '')
+            for literal, field, spec in self.parts
+        )
+
+    def render_rows(self, namespace, mask):
+        # One line per selected row: every field is evaluated once over the selected rows
+        view = RowView(namespace, mask)
+        count = int(mask.sum())
+        columns = []
+        for literal, field, spec in self.parts:
+            if field is None:
+                columns.append((literal, None, spec))
+                continue
+            value = field.evaluate(view)
+            values = value.tolist() if isinstance(value, (pd.Series, np.ndarray)) else [value] * count
+            columns.append((literal, values, spec))
+        return [
+            ''.join(literal + (format(values[row], spec) if values is not None else '') for literal, values, spec in columns)
+            for row in range(count)
+        ]
+
+
+class RowView(dict):
+    # Namespace restricted to the rows a section selected, sliced on first use
+    def __init__(self, namespace, mask):
+        super().__init__()
+        self.namespace = namespace
+        self.mask = mask
+
+    def __missing__(self, name):
+        value = self.namespace[name]
+        if isinstance(value, (pd.Series, np.ndarray)):
+            value = value[self.mask]
+        self[name] = value
+        return value
+
+
+class Columns(dict):
+    # Frame columns, read on first use and shared by every rule of one evaluation: Series for
+    # a panel, numpy arrays for a single ticker, where pandas' per-operation overhead would
+    # outweigh the work on a handful of rows
+    def __init__(self, frame, arrays=False):
+        super().__init__()
+        self.frame = frame
+        self.arrays = arrays
+
+    def __missing__(self, name):
+        if name not in self.frame.columns:
+            raise RuleError(f"Unknown name in rule expression: {name}.")
+        value = self.frame[name]
+        if self.arrays:
+            value = value.to_numpy()
+        self[name] = value
+        return value
+
+
+class Namespace(dict):
+    # A rule's names: functions, parameters and derived values, then the frame's columns
+    def __init__(self, columns, values):
+        super().__init__(values)
+        self.columns = columns
+
+    def __missing__(self, name):
+        value = self[name] = self.columns[name]
+        return value
+
+
+def shift(values, periods):
+    shifted = np.full(len(values), np.nan)
+    if periods < len(values):
+        shifted[periods:] = values[:len(values) - periods]
+    return shifted
+
+
+def ffill(values):
+    # Gaps take the last known value; leading gaps stay empty
+    values = np.asarray(values, dtype=float)
+    positions = np.where(np.isnan(values), 0, np.arange(len(values)))
+    np.maximum.accumulate(positions, out=positions)
+    return values[positions]
+
+
+class Functions:
+    # The functions available to rule expressions; window functions stay within each ticker.
+    # Without groups they work on one ticker's numpy arrays
+
+    def __init__(self, groups=None, periods=1):
+        self.groups = groups
+        # Rows back to the same period a year earlier (4 on quarterly frames)
+        self.periods = periods
+
+    def pct_change(self, series):
+        # pandas' default pct_change semantics: gaps are padded with the last known value
+        if self.groups is None:
+            filled = ffill(series)
+            return filled / shift(filled, self.periods) - 1
+        filled = series.groupby(self.groups).ffill()
+        return filled.groupby(self.groups).pct_change(periods=self.periods, fill_method=None)
+
+    def diff(self, series):
+        if self.groups is None:
+            values = np.asarray(series, dtype=float)
+            return values - shift(values, self.periods)
+        return series.groupby(self.groups).diff(periods=self.periods)
+
+    def prev(self, series):
+        if self.groups is None:
+            return shift(np.asarray(series, dtype=float), self.periods)
+        return series.groupby(self.groups).shift(self.periods)
+
+    def all(self, series):
+        # numpy booleans, so "not all(...)" inverts the way it does for a Series
+        if self.groups is None:
+            return np.bool_(series.all() if series.dtype == bool else pd.Series(series).all())
+        return series.groupby(self.groups).transform('all').astype(bool)
+
+    def any(self, series):
+        if self.groups is None:
+            return np.bool_(series.any() if series.dtype == bool else pd.Series(series).any())
+        return series.groupby(self.groups).transform('any').astype(bool)
+
+    @staticmethod
+    def nonzero(series):
+        if isinstance(series, np.ndarray):
+            return np.where(series == 0, np.nan, series)
+        return series.replace(0, np.nan)
+
+    @staticmethod
+    def where(condition, if_true, if_false):
+        if isinstance(condition, pd.Series):
+            return pd.Series(np.where(condition, if_true, if_false), index=condition.index)
+        if isinstance(condition, np.ndarray):
+            return np.where(condition, if_true, if_false)
+        return if_true if condition else if_false
+
+    @staticmethod
+    def elementwise(function):
+        def apply(value):
+            if isinstance(value, pd.Series):
+                return value.map(function)
+            if isinstance(value, np.ndarray):
+                return np.array([function(item) for item in value], dtype=object)
+            return function(value)
+        return apply
+
+    def namespace(self):
+        return {
+            'pct_change': self.pct_change, 'diff': self.diff, 'prev': self.prev,
+            'all': self.all, 'any': self.any, 'nonzero': self.nonzero, 'where': self.where,
+            'abs': np.abs, 'isna': pd.isna, 'notna': pd.notna,
+            'number': self.elementwise(format_number), 'percent': self.elementwise(format_percent),
+        }
+
+
+class Section:
+    def __init__(self, spec):
+        self.when = Expression(spec['when'])
+        self.prefix = Template(spec.get('prefix', ''))
+        self.separator = spec.get('separator', '\n')
+        self.headed = spec.get('headed', True)
+        # line is one template, or a list of {"when": ..., "line": ...} tried in order
+        lines = spec['line'] if isinstance(spec['line'], list) else [{'line': spec['line']}]
+        self.lines = [(Expression(line['when'], row_wise=True) if 'when' in line else None, Template(line['line']))
+                      for line in lines]
+
+    def render(self, namespace, mask):
+        # Lines for the selected rows, in frame order, using the first template whose condition
+        # holds: a Series by row for a panel, a list for a single ticker
+        if isinstance(mask, np.ndarray):
+            rendered = np.full(len(mask), '', dtype=object)
+            rows = len(mask)
+        else:
+            rendered = pd.Series('', index=mask.index[mask], dtype=object)
+            rows = mask.index
+        remaining = mask.copy()
+        for when, template in self.lines:
+            selected = remaining if when is None else remaining & as_mask(when.evaluate(namespace), rows)
+            if selected.any():
+                if isinstance(selected, np.ndarray):
+                    rendered[selected] = template.render_rows(namespace, selected)
+                else:
+                    rendered[selected[selected].index] = template.render_rows(namespace, selected)
+            remaining &= ~selected
+        return rendered[mask].tolist() if isinstance(mask, np.ndarray) else rendered
+
+
+class Rule:
+    def __init__(self, spec):
+        try:
+            self.name = spec['name']
+            self.requires = spec.get('requires', [])
+            self.missing = Template(spec.get('missing', "{name} requires {missing}."))
+            self.params = dict(spec.get('params', {}))
+            self.derive = [(name, Expression(source)) for name, source in spec.get('derive', {}).items()]
+            self.guards = [(Expression(guard['when']), Template(guard['message'])) for guard in spec.get('guards', [])]
+            self.when = Expression(spec['when']) if 'when' in spec else None
+            self.header = Template(spec['header'])
+            self.join = spec.get('join', '\n')
+            self.report_empty = spec.get('report_empty', False)
+            self.sections = [Section(section) for section in spec['sections']]
+        except KeyError as e:
+            raise RuleError(f"Rule {spec.get('name', '?')} is missing {e}.")
+
+
+def as_mask(value, index):
+    # Broadcasts a scalar condition over the frame; missing values never select a row. index
+    # is the frame's index, or its length for a single ticker's arrays
+    if isinstance(value, pd.Series):
+        return value.fillna(False).astype(bool)
+    if isinstance(value, np.ndarray):
+        return value.copy() if value.dtype == bool else (pd.notna(value) & value.astype(bool))
+    if isinstance(index, int):
+        return np.full(index, bool(value))
+    return pd.Series(bool(value), index=index)
+
+
+class RulePlan:
+    # A rule set compiled once: every rule's expressions are parsed and compiled when the
+    # plan is built, and evaluating it runs each expression over whole columns, for one
+    # ticker's analysis frame or for a panel of many tickers at once
+
+    def __init__(self, spec):
+        self.separator = spec.get('separator', '')
+        self.empty = spec.get('empty', '')
+        self.rules = [Rule(rule) for rule in spec['rules']]
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as rules:
+            return cls(json.load(rules))
+
+    def evaluate(self, frame, params=None, group=None, periods=1, period='FY'):
+        # Rule name -> message for every rule that fired, per ticker when a group column is
+        # given. params: {rule: {param: value}}, or {ticker: {rule: {param: value}}} for a panel.
+        # periods and period are the comparison lag and label prefix of the frame's basis
+        params = params or {}
+        if group is None:
+            frame = frame.sort_values('calendarYear', kind='stable').reset_index(drop=True)
+            keys, groups, positions = [None], None, np.arange(len(frame))
+            params = {None: params}
+        else:
+            frame = frame.sort_values([group, 'calendarYear'], kind='stable').reset_index(drop=True)
+            groups = frame[group]
+            keys = list(pd.unique(groups))
+            positions = groups.groupby(groups).cumcount()
+
+        functions = Functions(groups, periods)
+        columns = Columns(frame, arrays=group is None)
+        results = {key: {} for key in keys}
+        for rule in self.rules:
+            missing = [column for column in rule.requires if column not in frame.columns]
+            if missing:
+                message = rule.missing.render(self.scalar_namespace({'name': rule.name, 'missing': ', '.join(missing)}))
+                for key in keys:
+                    results[key][rule.name] = message
+                continue
+            for key, message in self.evaluate_rule(rule, columns, keys, groups, positions, functions, params, period).items():
+                results[key][rule.name] = message
+        return results if group is not None else results[None]
+
+    def rule_params(self, rule, keys, groups, params):
+        # Scalars when every ticker uses the same value, otherwise a per-row column
+        values = {}
+        for name, default in rule.params.items():
+            per_key = {key: params.get(key, {}).get(rule.name, {}).get(name, default) for key in keys}
+            distinct = set(per_key.values())
+            values[name] = distinct.pop() if len(distinct) == 1 or groups is None else groups.map(per_key)
+        return values
+
+    def evaluate_rule(self, rule, columns, keys, groups, positions, functions, params, period='FY'):
+        namespace = Namespace(columns, functions.namespace())
+        rows = len(positions) if groups is None else columns.frame.index
+        # Position of the row within its ticker, how many rows back its year-earlier period
+        # is, and the prefix of its label in messages
+        namespace['row'] = positions
+        namespace['lag'] = functions.periods
+        namespace['period'] = period
+        namespace.update(self.rule_params(rule, keys, groups, params))
+        try:
+            for name, expression in rule.derive:
+                namespace[name] = expression.evaluate(namespace)
+
+            def by_key(value):
+                # A condition reduced to one boolean per ticker
+                if groups is None and not isinstance(value, (pd.Series, np.ndarray)):
+                    return {None: bool(value)}
+                mask = as_mask(value, rows)
+                return {None: bool(mask.any())} if groups is None else mask.groupby(groups).any().to_dict()
+
+            guarded = [(by_key(when.evaluate(namespace)), message) for when, message in rule.guards]
+            gate = by_key(rule.when.evaluate(namespace)) if rule.when is not None else None
+            sections = []
+            for section in rule.sections:
+                mask = as_mask(section.when.evaluate(namespace), rows)
+                if gate is not None:
+                    mask &= (groups.map(gate).astype(bool) if groups is not None else gate[None])
+                sections.append((section, section.render(namespace, mask)))
+        except (KeyError, TypeError, ValueError, ZeroDivisionError) as e:
+            if isinstance(e, RuleError):
+                raise
+            raise RuleError(f"Rule {rule.name} failed: {e}.")
+
+        messages = {}
+        for key in keys:
+            key_params = self.scalar_namespace({**rule.params, **params.get(key, {}).get(rule.name, {})})
+            guard = next((message for flags, message in guarded if flags.get(key)), None)
+            if guard is not None:
+                messages[key] = guard.render(key_params)
+                continue
+            if gate is not None and not gate.get(key):
+                continue
+            message = self.render_message(rule, sections, key, groups, key_params)
+            if message is not None:
+                messages[key] = message
+        return messages
+
+    @staticmethod
+    def scalar_namespace(values):
+        # Headings and messages are rendered once per ticker from its parameters
+        return {**Functions().namespace(), **values}
+
+    def render_message(self, rule, sections, key, groups, params):
+        parts, headed = [], rule.report_empty
+        for section, lines in sections:
+            if groups is not None:
+                lines = lines[groups[lines.index] == key].tolist()
+            if not lines:
+                continue
+            headed = headed or section.headed
+            parts.append(section.prefix.render(params) + section.separator.join(lines))
+        if not parts and not headed:
+            return None
+        if headed:
+            parts.insert(0, rule.header.render(params))
+        return rule.join.join(parts)
+
+    def report(self, messages):
+        # The services' text layout: fired rules in rule order, separated by a rule line
+        results = []
+        for rule in self.rules:
+            if messages.get(rule.name):
+                results.append(messages[rule.name])
+                results.append(self.separator)
+        return "\n\n".join(results) if results else self.empty
+
+
+plans = {}
+plans_lock = threading.Lock()
+
+
+def rule_plan(name):
+    # Compiled plans are built once per process from app/rules/<name>.json
+    plan = plans.get(name)
+    if plan is None:
+        with plans_lock:
+            plan = plans.get(name)
+            if plan is None:
+                plan = plans[name] = RulePlan.from_file(os.path.join(RULES_DIR, f'{name}.json'))
+    return plan
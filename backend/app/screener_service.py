@@ -0,0 +1,298 @@
+# app/screener_service.py
+
+import re
+from sqlalchemy import select, func, and_, or_, not_
+from sqlalchemy.orm import aliased
+from app.db import db
+from app.models import Company, BalanceSheet, IncomeStatement, CashFlow, FinancialRatio
+from app.streaming import stream_rows
+from app.financial_service import FinancialService, StatementQueryError
+
+
+class ScreenerError(ValueError):
+    pass
+
+
+def normalize(name):
+    # debt_to_equity, debtToEquity and cashFlow.free_cash_flow style names resolve the same way
+    return name.replace('_', '').lower()
+
+
+class ConditionParser:
+
+    # Compiles a screening condition such as
+    #   debt_to_equity > 2 AND free_cash_flow < 0 AND sector = 'Technology'
+    # into a SQLAlchemy expression over the given field lookup
+
+    OPERATORS = {
+        '>': lambda column, value: column > value,
+        '>=': lambda column, value: column >= value,
+        '<': lambda column, value: column < value,
+        '<=': lambda column, value: column <= value,
+        '=': lambda column, value: column == value,
+        '==': lambda column, value: column == value,
+        '!=': lambda column, value: column != value,
+        '<>': lambda column, value: column != value,
+    }
+
+    TOKEN_PATTERN = re.compile(r"""
+        \s*(?:
+            (?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+          | '(?P<string>(?:[^']|'')*)'
+          | (?P<operator>>=|<=|!=|<>|==|>|<|=)
+          | (?P<paren>[(),])
+          | (?P<word>[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)?)
+        )""", re.VERBOSE)
+
+    KEYWORDS = {'and', 'or', 'not', 'in', 'is', 'null'}
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def tokenize(self, text):
+        tokens = []
+        position = 0
+        text = text.strip()
+        while position < len(text):
+            match = self.TOKEN_PATTERN.match(text, position)
+            if not match or match.end() == position:
+                raise ScreenerError(f"Unexpected input at position {position}: '{text[position:position + 20]}'")
+            position = match.end()
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == 'number':
+                tokens.append(('value', float(value)))
+            elif kind == 'string':
+                tokens.append(('value', value.replace("''", "'")))
+            elif kind == 'word' and value.lower() in self.KEYWORDS:
+                tokens.append((value.lower(), value))
+            else:
+                tokens.append((kind, value))
+        return tokens
+
+    def compile(self, text):
+        self.tokens = self.tokenize(text)
+        self.position = 0
+        self.referenced = set()
+        if not self.tokens:
+            raise ScreenerError("Empty screening condition.")
+
+        condition = self.parse_or()
+        if self.position < len(self.tokens):
+            raise ScreenerError(f"Unexpected token '{self.tokens[self.position][1]}'.")
+        return condition, self.referenced
+
+    def peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self, kind=None):
+        if self.position >= len(self.tokens):
+            raise ScreenerError("Unexpected end of screening condition.")
+        token = self.tokens[self.position]
+        if kind and token[0] != kind and token[1] != kind:
+            raise ScreenerError(f"Expected '{kind}' but found '{token[1]}'.")
+        self.position += 1
+        return token
+
+    def parse_or(self):
+        clauses = [self.parse_and()]
+        while self.peek() == 'or':
+            self.take()
+            clauses.append(self.parse_and())
+        return clauses[0] if len(clauses) == 1 else or_(*clauses)
+
+    def parse_and(self):
+        clauses = [self.parse_not()]
+        while self.peek() == 'and':
+            self.take()
+            clauses.append(self.parse_not())
+        return clauses[0] if len(clauses) == 1 else and_(*clauses)
+
+    def parse_not(self):
+        if self.peek() == 'not':
+            self.take()
+            return not_(self.parse_not())
+        if self.peek() == 'paren' and self.tokens[self.position][1] == '(':
+            self.take()
+            condition = self.parse_or()
+            self.take(')')
+            return condition
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        kind, name = self.take()
+        if kind != 'word':
+            raise ScreenerError(f"Expected a field name but found '{name}'.")
+        column = self.resolve(name)
+
+        # field IS [NOT] NULL
+        if self.peek() == 'is':
+            self.take()
+            negate = self.peek() == 'not'
+            if negate:
+                self.take()
+            self.take('null')
+            return column.is_not(None) if negate else column.is_(None)
+
+        # field [NOT] IN (value, ...)
+        negate = self.peek() == 'not'
+        if negate:
+            self.take()
+        if self.peek() == 'in':
+            self.take()
+            self.take('(')
+            values = [self.take('value')[1]]
+            while self.peek() == 'paren' and self.tokens[self.position][1] == ',':
+                self.take()
+                values.append(self.take('value')[1])
+            self.take(')')
+            return column.not_in(values) if negate else column.in_(values)
+        if negate:
+            raise ScreenerError("NOT must be followed by IN after a field name.")
+
+        # field <op> value
+        kind, operator = self.take()
+        if kind != 'operator':
+            raise ScreenerError(f"Expected a comparison operator after '{name}' but found '{operator}'.")
+        kind, value = self.take()
+        if kind != 'value':
+            raise ScreenerError(f"Expected a number or quoted string after '{operator}' but found '{value}'.")
+        return self.OPERATORS[operator](column, value)
+
+    def resolve(self, name):
+        column = self.fields.get(normalize(name))
+        if column is None:
+            raise ScreenerError(f"Unknown field '{name}'.")
+        self.referenced.add(column)
+        return column
+
+
+class ScreenerService:
+
+    MAX_LIMIT = 1000
+    DEFAULT_LIMIT = 100
+
+    # Qualifiers accepted in front of a field, e.g. cashFlow.netIncome
+    SOURCES = {
+        'ratios': FinancialRatio,
+        'company': Company,
+        'incomestatement': IncomeStatement,
+        'balancesheet': BalanceSheet,
+        'cashflow': CashFlow,
+    }
+
+    # Statement tables are reached through the source row ids kept on the ratio store
+    STATEMENT_JOINS = {
+        BalanceSheet: FinancialRatio.balance_sheet_id,
+        IncomeStatement: FinancialRatio.income_statement_id,
+        CashFlow: FinancialRatio.cash_flow_id,
+    }
+
+    STATEMENT_QUALIFIERS = {
+        'balance_sheet': 'balanceSheet',
+        'income_statement': 'incomeStatement',
+        'cash_flow': 'cashFlow',
+    }
+
+    # Columns that identify rows rather than describe them
+    EXCLUDED_COLUMNS = {'id', 'ticker', 'balance_sheet_id', 'income_statement_id', 'cash_flow_id'}
+
+    def __init__(self):
+        # Field lookup keyed by the lower-cased name without underscores, so
+        # debt_to_equity, debtToEquity and DEBTTOEQUITY all resolve the same way
+        self.fields = {}
+        for source, model in self.SOURCES.items():
+            for column in model.__table__.columns:
+                if column.name in self.EXCLUDED_COLUMNS:
+                    continue
+                key = normalize(column.name)
+                self.fields.setdefault(key, getattr(model, column.name))
+                self.fields[f'{source}.{key}'] = getattr(model, column.name)
+        self.fields['ticker'] = FinancialRatio.ticker
+
+    def screen(self, where=None, year_from=None, year_to=None, limit=None, offset=0):
+        limit = self.DEFAULT_LIMIT if limit is None else limit
+        if limit < 1 or limit > self.MAX_LIMIT:
+            raise ScreenerError(f"limit must be between 1 and {self.MAX_LIMIT}.")
+        if offset < 0:
+            raise ScreenerError("offset must not be negative.")
+
+        query, selected = self.screen_query(where, year_from, year_to)
+
+        # Fetch one extra row to know whether another page exists
+        query = query.limit(limit + 1).offset(offset)
+        rows = db.session.execute(query).all()
+
+        has_more = len(rows) > limit
+        return {
+            "results": [self.result_row(row, selected) for row in rows[:limit]],
+            "limit": limit,
+            "offset": offset,
+            "nextOffset": offset + limit if has_more else None,
+        }
+
+    def stream(self, where=None, year_from=None, year_to=None):
+        # Every match without paging, read in batches off the cursor; the condition is
+        # compiled here so a bad one fails before any of the response is sent
+        query, selected = self.screen_query(where, year_from, year_to)
+        return (self.result_row(row, selected) for row in stream_rows(query))
+
+    def screen_query(self, where=None, year_from=None, year_to=None):
+        condition, referenced = ConditionParser(self.fields).compile(where) if where else (None, set())
+
+        # Return the screened fields next to each matching (ticker, year)
+        selected = sorted(referenced, key=lambda column: (column.table.name, column.key))
+        query = select(
+            FinancialRatio.ticker,
+            FinancialRatio.calendar_year,
+            *[column.label(f'{column.table.name}.{column.key}') for column in selected]
+        ).select_from(FinancialRatio)
+        query = self.join_sources(query, referenced)
+
+        if condition is not None:
+            query = query.where(condition)
+        # Same year validation and 400 as the statement endpoints
+        try:
+            query = query.where(*FinancialService._year_range(FinancialRatio, year_from, year_to))
+        except StatementQueryError as e:
+            raise ScreenerError(str(e))
+        return query.order_by(FinancialRatio.ticker, FinancialRatio.calendar_year), selected
+
+    def result_row(self, row, selected):
+        values = row._mapping
+        result = {"ticker": values['ticker'], "calendarYear": values['calendar_year']}
+        for column in selected:
+            result[self.field_name(column)] = values[f'{column.table.name}.{column.key}']
+        return result
+
+    def join_sources(self, query, referenced):
+        # Only join the tables the condition actually touches
+        tables = {column.table for column in referenced}
+        if Company.__table__ in tables:
+            query = query.join(Company, Company.ticker == FinancialRatio.ticker)
+        # Statements pair with the ratio row of their fiscal year, which for 52/53-week
+        # filers is not the year of the statement date
+        for model, source_id in self.STATEMENT_JOINS.items():
+            if model.__table__ in tables:
+                query = query.join(model, (model.id == source_id) & (model.calendar_year == FinancialRatio.calendar_year))
+        return query
+
+    def matching_tickers(self, where, year=None):
+        # Tickers whose ratio row for the year (the latest stored one by default) meets
+        # the condition, as a subquery other searches can filter on
+        condition, referenced = ConditionParser(self.fields).compile(where)
+        query = self.join_sources(select(FinancialRatio.ticker).select_from(FinancialRatio), referenced)
+        if year:
+            query = query.where(FinancialRatio.calendar_year == str(year))
+        else:
+            latest = aliased(FinancialRatio)
+            query = query.where(FinancialRatio.calendar_year == select(func.max(latest.calendar_year))
+                                .where(latest.ticker == FinancialRatio.ticker).scalar_subquery())
+        return query.where(condition)
+
+    def field_name(self, column):
+        # Report fields in the camelCase used by the rest of the API, qualifying statement fields
+        head, *rest = column.key.split('_')
+        name = head + ''.join(part.title() for part in rest)
+        qualifier = self.STATEMENT_QUALIFIERS.get(column.table.name)
+        return f'{qualifier}.{name}' if qualifier else name
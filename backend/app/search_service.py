@@ -0,0 +1,277 @@
+# app/search_service.py
+
+import csv
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from sqlalchemy import select, text, bindparam, or_
+from app.db import db
+from app.models import Company, DataVersion
+
+class CompanySearchIndex:
+    # Prefix index over tickers and company names: sorted (key, ticker) arrays searched
+    # with bisect, so a lookup costs a binary search plus the matches it returns.
+    # Entries are the tickers as stored, which are case-sensitive (QCOM and qcom are two
+    # companies); only the keys are lowercased, so matching ignores case
+
+    # How often a worker picks up companies ingested by other workers
+    SYNC_INTERVAL = 30
+    # Matches examined per array before ranking; plenty for an autocomplete list
+    SCAN_LIMIT = 200
+
+    def __init__(self, seed_path=None):
+        self.seed_path = seed_path
+        self.companies = {}  # ticker -> company name
+        self.stored = set()  # tickers with data in the database
+        self.ticker_keys = []
+        self.name_keys = []
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.seeded = False  # whether a bulk symbol list was loaded
+        self.synced_at = None
+        self.checked_at = 0
+
+    @staticmethod
+    def name_tokens(name):
+        # The full name plus every word in it, so "app" and "apple i" both match "Apple Inc."
+        name = (name or '').lower().strip()
+        if not name:
+            return set()
+        words = [word for word in re.split(r'[^0-9a-z]+', name) if word]
+        return {name, *words}
+
+    def add(self, ticker, name=None, stored=True):
+        with self.lock:
+            self._remove(ticker)
+            if stored:
+                # A stored ticker replaces the symbol list's entry for it, whatever its case
+                for listed in [listed for listed in self.same_symbol(ticker) if listed not in self.stored]:
+                    self._remove(listed)
+                self.stored.add(ticker)
+            self.companies[ticker] = name
+            insort(self.ticker_keys, (ticker.lower(), ticker))
+            for token in self.name_tokens(name):
+                insort(self.name_keys, (token, ticker))
+
+    def remove(self, ticker):
+        with self.lock:
+            self._remove(ticker)
+
+    def _remove(self, ticker):
+        if ticker not in self.companies:
+            return
+        name = self.companies.pop(ticker)
+        for keys, key in [(self.ticker_keys, ticker.lower()), *[(self.name_keys, token) for token in self.name_tokens(name)]]:
+            position = bisect_left(keys, (key, ticker))
+            if position < len(keys) and keys[position] == (key, ticker):
+                del keys[position]
+        self.stored.discard(ticker)
+
+    def same_symbol(self, ticker):
+        # Indexed tickers equal to this one but for case
+        symbol = ticker.lower()
+        position = bisect_left(self.ticker_keys, (symbol,))
+        matches = []
+        while position < len(self.ticker_keys) and self.ticker_keys[position][0] == symbol:
+            matches.append(self.ticker_keys[position][1])
+            position += 1
+        return matches
+
+    def load(self):
+        # Full build: every stored company, plus the symbols of the optional symbol list that
+        # aren't stored under any case. The list's name fills in a stored company's missing one
+        seed = self.read_seed(self.seed_path) if self.seed_path else {}
+        seeded_names = {ticker.lower(): name for ticker, name in seed.items()}
+        stored = db.session.execute(select(Company.ticker, Company.name)).all()
+        companies = {ticker: name or seeded_names.get(ticker.lower()) for ticker, name in stored}
+        stored_symbols = {ticker.lower() for ticker in companies}
+        for ticker, name in seed.items():
+            if ticker.lower() not in stored_symbols:
+                companies[ticker] = name
+
+        ticker_keys = sorted((ticker.lower(), ticker) for ticker in companies)
+        name_keys = sorted(
+            (token, ticker) for ticker, name in companies.items() for token in self.name_tokens(name)
+        )
+        with self.lock:
+            self.companies = companies
+            self.stored = {ticker for ticker, _ in stored}
+            self.ticker_keys = ticker_keys
+            self.name_keys = name_keys
+            self.loaded = True
+            self.seeded = bool(self.seed_path)
+            self.synced_at = datetime.now(timezone.utc)
+            self.checked_at = time.monotonic()
+
+    def read_seed(self, path):
+        # A bulk symbol list, e.g. FMP's /stock/list saved as JSON, or a CSV with symbol,name columns
+        with open(path, newline='', encoding='utf-8') as seed:
+            if path.endswith('.json'):
+                rows = json.load(seed)
+            else:
+                rows = list(csv.DictReader(seed))
+        return {row['symbol']: row.get('name') for row in rows if row.get('symbol')}
+
+    def sync(self):
+        # Companies (re)ingested since the last sync, including by other worker processes
+        synced_at = datetime.now(timezone.utc)
+        rows = db.session.execute(
+            select(Company.ticker, Company.name)
+            .join(DataVersion, DataVersion.ticker == Company.ticker)
+            .where(DataVersion.updated_at >= self.synced_at)
+        ).all()
+        for ticker, name in rows:
+            self.add(ticker, name)
+        self.synced_at = synced_at
+        self.checked_at = time.monotonic()
+
+    def ensure_current(self):
+        if not self.loaded:
+            self.load()
+        elif time.monotonic() - self.checked_at > self.SYNC_INTERVAL:
+            self.sync()
+
+    def status(self, ticker):
+        # 'stored', 'listed' (a known symbol without data under this ticker) or None when the
+        # index doesn't know it. Stored data is looked up by the exact ticker; FMP symbols
+        # ignore case, so one stored or listed under another case is still listed
+        self.ensure_current()
+        with self.lock:
+            if ticker in self.stored:
+                return 'stored'
+            return 'listed' if self.same_symbol(ticker) else None
+
+    def search(self, query, limit=10):
+        self.ensure_current()
+        query = query.lower().strip()
+        if not query:
+            return []
+
+        # Rank: exact ticker, ticker prefix, name prefix, word-in-name prefix
+        ranks = {}
+        with self.lock:
+            for ticker in self.prefix_matches(self.ticker_keys, query):
+                ranks[ticker] = 0 if ticker.lower() == query else 1
+            for ticker in self.prefix_matches(self.name_keys, query):
+                if ticker not in ranks:
+                    name = (self.companies[ticker] or '').lower()
+                    ranks[ticker] = 2 if name.startswith(query) else 3
+
+            ordered = sorted(ranks, key=lambda ticker: (ranks[ticker], ticker not in self.stored, len(ticker), ticker.lower(), ticker))
+            return [
+                {"ticker": ticker, "companyName": self.companies[ticker], "stored": ticker in self.stored}
+                for ticker in ordered[:limit]
+            ]
+
+    def prefix_matches(self, keys, prefix):
+        position = bisect_left(keys, (prefix,))
+        for index in range(position, min(len(keys), position + self.SCAN_LIMIT)):
+            key, ticker = keys[index]
+            if not key.startswith(prefix):
+                break
+            yield ticker
+
+
+search_index = CompanySearchIndex(os.environ.get('SYMBOL_LIST_PATH'))
+
+
+class CompanyTextSearchService:
+    # BM25-ranked full-text search over company names, industries, sectors and descriptions
+
+    MAX_LIMIT = 100
+    DEFAULT_LIMIT = 20
+
+    # bm25 column weights for (ticker, name, industry, sector, description): a hit in the
+    # name or industry says more about the business than one deep in the description
+    WEIGHTS = (0.0, 10.0, 5.0, 2.0, 1.0)
+
+    # Exchange filters accept either the full name or the short one (NASDAQ)
+    FILTERS = {
+        'sector': [Company.sector],
+        'industry': [Company.industry],
+        'exchange': [Company.exchange, Company.exchange_short_name],
+    }
+
+    @staticmethod
+    def match_expression(query):
+        # Plain words are ANDed; each is quoted so user input can't break the FTS5 syntax,
+        # and a trailing * keeps its prefix meaning
+        terms = re.findall(r'\w+\*?', query)
+        return ' '.join(f'"{term.rstrip("*")}"*' if term.endswith('*') else f'"{term}"' for term in terms)
+
+    def search(self, query, filters=None, where=None, year=None, limit=None, offset=0):
+        # Imported here to keep the screener out of the autocomplete path
+        from app.screener_service import ScreenerService, ScreenerError
+
+        limit = self.DEFAULT_LIMIT if limit is None else limit
+        if limit < 1 or limit > self.MAX_LIMIT:
+            raise ScreenerError(f"limit must be between 1 and {self.MAX_LIMIT}.")
+        if offset < 0:
+            raise ScreenerError("offset must not be negative.")
+        match = self.match_expression(query or '')
+        if not match:
+            raise ScreenerError("text must contain at least one word.")
+
+        conditions = [
+            or_(*[column == filters[name] for column in columns])
+            for name, columns in self.FILTERS.items() if filters and filters.get(name)
+        ]
+        # e.g. where=freeCashFlow < 0 keeps companies whose latest ratio row has negative FCF
+        if where:
+            conditions.append(Company.ticker.in_(ScreenerService().matching_tickers(where, year)))
+
+        if db.engine.dialect.name == 'sqlite' and self.fts_available():
+            rows = self.fts_search(match, conditions, limit + 1, offset)
+        else:
+            rows = self.like_search(query, conditions, limit + 1, offset)
+
+        return {
+            "results": [dict(row._mapping) for row in rows[:limit]],
+            "limit": limit,
+            "offset": offset,
+            "nextOffset": offset + limit if len(rows) > limit else None,
+        }
+
+    def fts_available(self):
+        return db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'company_fts'")
+        ).first() is not None
+
+    def fts_search(self, match, conditions, limit, offset):
+        fts = text(
+            f"SELECT rowid AS company_rowid, bm25(company_fts, {', '.join(map(str, self.WEIGHTS))}) AS score, "
+            "snippet(company_fts, 4, '[', ']', '...', 16) AS snippet "
+            "FROM company_fts WHERE company_fts MATCH :match"
+        ).bindparams(bindparam('match', match)).columns(
+            db.column('company_rowid'), db.column('score'), db.column('snippet')
+        ).subquery('fts')
+
+        query = select(
+            Company.ticker, Company.name.label('companyName'), Company.sector, Company.industry,
+            Company.exchange_short_name.label('exchange'), fts.c.score, fts.c.snippet,
+        ).join(fts, fts.c.company_rowid == db.literal_column('company.rowid'))
+        for condition in conditions:
+            query = query.where(condition)
+        # bm25 scores are negative, lower is a better match
+        query = query.order_by(fts.c.score, Company.ticker).limit(limit).offset(offset)
+        return db.session.execute(query).all()
+
+    def like_search(self, query, conditions, limit, offset):
+        # Unranked fallback for databases without FTS5: every word must appear somewhere
+        statement = select(
+            Company.ticker, Company.name.label('companyName'), Company.sector, Company.industry,
+            Company.exchange_short_name.label('exchange'),
+        )
+        for word in re.findall(r'\w+', query):
+            pattern = f'%{word}%'
+            statement = statement.where(or_(
+                Company.name.ilike(pattern), Company.industry.ilike(pattern),
+                Company.sector.ilike(pattern), Company.description.ilike(pattern),
+            ))
+        for condition in conditions:
+            statement = statement.where(condition)
+        return db.session.execute(statement.order_by(Company.ticker).limit(limit).offset(offset)).all()
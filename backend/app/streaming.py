@@ -0,0 +1,57 @@
+# app/streaming.py
+
+import json
+from datetime import date, datetime
+from flask import current_app, stream_with_context
+from app.db import db
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Rows pulled from the server-side cursor per fetch
+YIELD_PER = 1000
+# Lines buffered into each chunk written to the socket
+LINES_PER_CHUNK = 200
+
+
+def stream_rows(statement, yield_per=YIELD_PER):
+    # Rows of a Core select, fetched yield_per at a time from a server-side cursor,
+    # so only one batch is held in memory however many rows match
+    result = db.session.execute(statement.execution_options(yield_per=yield_per))
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def ndjson_response(records):
+    # One JSON object per line, written as records are produced; the client can act on
+    # the first line before the last row has been read from the database
+    def generate():
+        lines = []
+        try:
+            for record in records:
+                lines.append(json.dumps(record, default=encode))
+                if len(lines) >= LINES_PER_CHUNK:
+                    yield '\n'.join(lines) + '\n'
+                    lines = []
+        except Exception as e:
+            # The status line has already gone out, so a failure is reported as the last line
+            current_app.logger.exception("NDJSON stream failed")
+            lines.append(json.dumps({"error": f"{type(e).__name__}: {e}"}))
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    return current_app.response_class(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def wants_ndjson(request):
+    # ?format=ndjson or an Accept header asking for it
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
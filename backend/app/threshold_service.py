@@ -0,0 +1,184 @@
+# app/threshold_service.py
+
+import threading
+import pandas as pd
+from datetime import datetime, timezone
+from sqlalchemy import select, delete, update, insert
+from app.db import db
+from app.bulk_load import bulk_insert
+from app.models import Company, FinancialRatio, SectorThreshold, ThresholdVersion
+from app.cache import ticker_cache
+
+class ThresholdService:
+
+    # Rule keyword thresholds derived from the sector distribution of a ratio store column:
+    # (service, rule, parameter) -> (column, quantile, scale)
+    # Change-based thresholds are expressed the way the rules expect them, e.g. the DPO rule
+    # takes a positive percentage for a decrease, hence the -100 scale.
+    CALIBRATION = {
+        ('redflags', 'analyze_debt_to_equity_ratio', 'high_leverage_threshold'): ('debt_to_equity', 0.80, 1),
+        ('redflags', 'analyze_accounts_receivable_vs_sales', 'caution_threshold'): ('receivables_to_sales', 0.70, 1),
+        ('redflags', 'analyze_accounts_receivable_vs_sales', 'red_flag_threshold'): ('receivables_to_sales', 0.80, 1),
+        ('redflags', 'analyze_accounts_receivable_vs_sales', 'critical_threshold'): ('receivables_to_sales', 0.90, 1),
+        ('redflags', 'analyze_gross_profit_margin', 'caution_threshold'): ('gross_margin_yoy', 0.20, 1),
+        ('redflags', 'analyze_gross_profit_margin', 'red_flag_threshold'): ('gross_margin_yoy', 0.10, 1),
+        ('redflags', 'analyze_gross_profit_margin', 'critical_threshold'): ('gross_margin_yoy', 0.05, 1),
+        ('redflags', 'analyze_inventory_turnover', 'caution_threshold'): ('inventory_turnover_yoy', 0.25, 1),
+        ('redflags', 'analyze_inventory_turnover', 'red_flag_threshold'): ('inventory_turnover_yoy', 0.15, 1),
+        ('redflags', 'analyze_inventory_turnover', 'critical_threshold'): ('inventory_turnover_yoy', 0.05, 1),
+        ('redflags', 'analyze_interest_coverage', 'caution_threshold'): ('interest_coverage', 0.30, 1),
+        ('redflags', 'analyze_interest_coverage', 'red_flag_threshold'): ('interest_coverage', 0.20, 1),
+        ('redflags', 'analyze_interest_coverage', 'critical_threshold'): ('interest_coverage', 0.10, 1),
+        ('redflags', 'analyze_increasing_dso', 'bad_dso_threshold'): ('dso', 0.75, 1),
+        ('redflags', 'analyze_high_dividend_payout_poor_cash_flow', 'payout_threshold'): ('payout_ratio', 0.75, 1),
+        ('positive', 'analyze_expanding_gross_profit_margins', 'threshold'): ('gross_margin_yoy', 0.75, 100),
+        ('positive', 'analyze_healthy_interest_coverage', 'healthy_threshold'): ('interest_coverage', 0.50, 1),
+        ('positive', 'analyze_positive_changes_working_capital', 'ratio_threshold'): ('current_ratio_yoy', 0.75, 100),
+        ('positive', 'analyze_decreasing_dpo', 'dpo_threshold'): ('dpo_yoy', 0.25, -100),
+    }
+
+    # The keyword defaults the calibrated values replace; a calibrated value on the
+    # other side of zero would invert the rule, so those keep the default
+    DEFAULTS = {
+        ('redflags', 'analyze_debt_to_equity_ratio', 'high_leverage_threshold'): 2,
+        ('redflags', 'analyze_accounts_receivable_vs_sales', 'caution_threshold'): 0.15,
+        ('redflags', 'analyze_accounts_receivable_vs_sales', 'red_flag_threshold'): 0.20,
+        ('redflags', 'analyze_accounts_receivable_vs_sales', 'critical_threshold'): 0.30,
+        ('redflags', 'analyze_gross_profit_margin', 'caution_threshold'): -0.10,
+        ('redflags', 'analyze_gross_profit_margin', 'red_flag_threshold'): -0.20,
+        ('redflags', 'analyze_gross_profit_margin', 'critical_threshold'): -0.30,
+        ('redflags', 'analyze_inventory_turnover', 'caution_threshold'): -0.05,
+        ('redflags', 'analyze_inventory_turnover', 'red_flag_threshold'): -0.10,
+        ('redflags', 'analyze_inventory_turnover', 'critical_threshold'): -0.20,
+        ('redflags', 'analyze_interest_coverage', 'caution_threshold'): 2.5,
+        ('redflags', 'analyze_interest_coverage', 'red_flag_threshold'): 1.5,
+        ('redflags', 'analyze_interest_coverage', 'critical_threshold'): 1.0,
+        ('redflags', 'analyze_increasing_dso', 'bad_dso_threshold'): 45,
+        ('redflags', 'analyze_high_dividend_payout_poor_cash_flow', 'payout_threshold'): 0.75,
+        ('positive', 'analyze_expanding_gross_profit_margins', 'threshold'): 5,
+        ('positive', 'analyze_healthy_interest_coverage', 'healthy_threshold'): 2.5,
+        ('positive', 'analyze_positive_changes_working_capital', 'ratio_threshold'): 5,
+        ('positive', 'analyze_decreasing_dpo', 'dpo_threshold'): 5,
+    }
+
+    # Sectors with fewer observations than this keep the keyword defaults
+    MIN_OBSERVATIONS = 20
+
+    # Process-wide lookup: sector -> service -> rule -> {parameter: value}, and the
+    # threshold version it was loaded at
+    lookup = None
+    lookup_version = None
+    lookup_lock = threading.RLock()
+
+    def calibrate(self, min_observations=None):
+        min_observations = self.MIN_OBSERVATIONS if min_observations is None else min_observations
+        columns = sorted({column for column, _, _ in self.CALIBRATION.values()})
+
+        # Universe distribution of the calibrated ratios, one row per (ticker, year)
+        query = select(Company.sector, *[getattr(FinancialRatio, column) for column in columns]) \
+            .join(Company, Company.ticker == FinancialRatio.ticker) \
+            .where(Company.sector.is_not(None), Company.sector != '')
+        frame = pd.read_sql(query, db.session.connection())
+        if frame.empty:
+            # Nothing stored to calibrate from yet; the current thresholds and version stay
+            return None
+        # Columns without a single value come back as objects
+        frame[columns] = frame[columns].astype(float)
+
+        # One vectorized quantile pass per (column, quantile) across all sectors
+        grouped = frame.groupby('sector')
+        counts = grouped.count()
+        rows = []
+        for (service, rule, parameter), (column, quantile, scale) in self.CALIBRATION.items():
+            values = grouped[column].quantile(quantile) * scale
+            default = self.DEFAULTS[(service, rule, parameter)]
+            for sector, value in values.items():
+                if counts.loc[sector, column] < min_observations or pd.isna(value):
+                    continue
+                if (value > 0) != (default > 0):
+                    continue
+                rows.append({
+                    'sector': sector,
+                    'service': service,
+                    'rule': rule,
+                    'parameter': parameter,
+                    'value': round(float(value), 3),
+                })
+
+        # Zone thresholds must stay ordered; drop a rule's calibration for a sector otherwise
+        rows = self.ordered_rows(rows)
+
+        db.session.execute(delete(SectorThreshold))
+        if rows:
+            bulk_insert(SectorThreshold, rows)
+        # Other processes see the new version on their next lookup
+        self.bump_version()
+        db.session.commit()
+
+        self.reload()
+        # Cached analyses are keyed by the threshold version, so the old ones can't be served
+        # by any process; drop them from this process and the shared tier to free the space
+        ticker_cache.clear('analysis')
+        return len(rows)
+
+    def version(self):
+        return db.session.execute(select(ThresholdVersion.version)).scalar() or 0
+
+    def bump_version(self):
+        # Runs inside the calibration's transaction so the version commits with the thresholds
+        now = datetime.now(timezone.utc)
+        if db.session.execute(update(ThresholdVersion).values(version=ThresholdVersion.version + 1, updated_at=now)).rowcount == 0:
+            db.session.execute(insert(ThresholdVersion).values(version=1, updated_at=now))
+
+    def ordered_rows(self, rows):
+        by_rule = {}
+        for row in rows:
+            by_rule.setdefault((row['sector'], row['service'], row['rule']), {})[row['parameter']] = row
+
+        kept = []
+        for (sector, service, rule), parameters in by_rule.items():
+            zones = [parameters.get(name) for name in ('caution_threshold', 'red_flag_threshold', 'critical_threshold')]
+            if any(zones):
+                # Mixing calibrated and default zone bounds could leave them out of order
+                if not all(zones):
+                    continue
+                values = [zone['value'] for zone in zones]
+                if len(set(values)) < 3 or values not in (sorted(values), sorted(values, reverse=True)):
+                    continue
+                # Use the calibrated zones only when they run in the same direction as the defaults
+                defaults = [self.DEFAULTS[(service, rule, name)] for name in ('caution_threshold', 'red_flag_threshold', 'critical_threshold')]
+                if (values == sorted(values)) != (defaults == sorted(defaults)):
+                    continue
+            kept.extend(parameters.values())
+        return kept
+
+    def reload(self, version=None):
+        version = self.version() if version is None else version
+        lookup = {}
+        for record in SectorThreshold.query.all():
+            lookup.setdefault(record.sector, {}).setdefault(record.service, {}) \
+                .setdefault(record.rule, {})[record.parameter] = record.value
+        with self.lookup_lock:
+            ThresholdService.lookup = lookup
+            ThresholdService.lookup_version = version
+        return lookup
+
+    def thresholds_for_sector(self, sector, service):
+        # Reloaded only when another calibration has committed since; otherwise a version
+        # read and plain dictionary lookups
+        version = self.version()
+        if ThresholdService.lookup is None or ThresholdService.lookup_version != version:
+            with self.lookup_lock:
+                if ThresholdService.lookup is None or ThresholdService.lookup_version != version:
+                    self.reload(version)
+        return ThresholdService.lookup.get(sector, {}).get(service, {})
+
+    def thresholds_for(self, ticker, service):
+        sector = db.session.execute(select(Company.sector).where(Company.ticker == ticker)).scalar()
+        if not sector:
+            return {}
+        return self.thresholds_for_sector(sector, service)
+
+    def get_thresholds_data(self):
+        self.thresholds_for_sector(None, None)
+        return ThresholdService.lookup
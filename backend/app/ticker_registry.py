@@ -0,0 +1,70 @@
+# app/ticker_registry.py
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy import select, delete
+from app.db import db
+from app.models import UnknownTicker
+from app.search_service import search_index
+
+class UnknownTickerCache:
+    # Negative cache for tickers FMP doesn't know. Entries live in the unknown_ticker table so
+    # every worker shares them, with an in-process copy so repeated typos never reach the database.
+    # Tickers are kept as requested, like the case-sensitive company table they stand in for.
+
+    TTL = 24 * 60 * 60
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl or int(os.environ.get('UNKNOWN_TICKER_TTL', self.TTL))
+        self.expires = {}  # ticker -> monotonic expiry
+        self.lock = threading.Lock()
+
+    def is_unknown(self, ticker):
+        with self.lock:
+            expires = self.expires.get(ticker)
+        if expires is not None:
+            if expires > time.monotonic():
+                return True
+            with self.lock:
+                self.expires.pop(ticker, None)
+
+        checked_at = db.session.execute(
+            select(UnknownTicker.checked_at).where(UnknownTicker.ticker == ticker)
+        ).scalar()
+        if checked_at is None:
+            return False
+        age = (datetime.now(timezone.utc).replace(tzinfo=None) - checked_at.replace(tzinfo=None)).total_seconds()
+        if age >= self.ttl:
+            return False
+        with self.lock:
+            self.expires[ticker] = time.monotonic() + self.ttl - age
+        return True
+
+    def mark_unknown(self, ticker):
+        db.session.merge(UnknownTicker(ticker=ticker, checked_at=datetime.now(timezone.utc).replace(tzinfo=None)))
+        db.session.commit()
+        with self.lock:
+            self.expires[ticker] = time.monotonic() + self.ttl
+
+    def forget(self, ticker):
+        # Runs inside the caller's transaction when the ticker turns out to exist after all
+        db.session.execute(delete(UnknownTicker).where(UnknownTicker.ticker == ticker))
+        with self.lock:
+            self.expires.pop(ticker, None)
+
+
+unknown_tickers = UnknownTickerCache()
+
+
+def ticker_status(ticker):
+    # stored: data in the database; listed: in the seeded symbol list but not fetched yet;
+    # unknown: FMP had no profile for it, or the symbol list doesn't contain it;
+    # unchecked: nothing to go on without asking FMP
+    status = search_index.status(ticker)
+    if status:
+        return status
+    if unknown_tickers.is_unknown(ticker) or search_index.seeded:
+        return 'unknown'
+    return 'unchecked'
@@ -0,0 +1,170 @@
+# app/ttm_service.py
+
+import pandas as pd
+import numpy as np
+from datetime import date, timedelta
+from sqlalchemy import select, delete
+from app.db import db
+from app.bulk_load import bulk_insert
+from app.models import BalanceSheet, IncomeStatement, CashFlow, TTMFlow, QUARTERLY_PERIODS, annual_statements
+from app.cache import bump_data_versions
+from app.change_feed_service import log_changes
+
+class TTMService:
+
+    # Stored trailing-twelve-month flows (camelCase name -> model, column)
+    TTM_COLUMNS = {
+        'revenue': (IncomeStatement, 'revenue'),
+        'netIncome': (IncomeStatement, 'net_income'),
+        'operatingCashFlow': (CashFlow, 'operating_cash_flow'),
+        'capitalExpenditure': (CashFlow, 'capital_expenditure'),
+        'freeCashFlow': (CashFlow, 'free_cash_flow'),
+    }
+
+    # Analysis frame columns that are flows over the period, so four consecutive quarters
+    # add up to a trailing twelve months; balance sheet items stay point-in-time
+    FLOW_COLUMNS = [
+        'revenue', 'costOfRevenue', 'grossProfit', 'researchAndDevelopmentExpenses',
+        'operatingExpenses', 'operatingIncome', 'interestExpense', 'netIncome',
+        'operatingCashFlow', 'capitalExpenditure', 'freeCashFlow', 'dividendsPaid',
+    ]
+
+    # Four consecutive quarter ends lie about 273 days apart, give or take a 52/53-week calendar
+    WINDOW = 4
+    MIN_SPAN_DAYS = 240
+    MAX_SPAN_DAYS = 310
+
+    def statement_records(self, ticker, basis='annual'):
+        # Statement rows an analysis frame is built from, for the requested basis
+        if basis == 'annual':
+            return [
+                model.query.filter_by(ticker=ticker).filter(annual_statements(model)).all()
+                for model in (BalanceSheet, IncomeStatement, CashFlow)
+            ]
+
+        # Quarterly rows, aligned on the quarters all three statements cover
+        by_date = []
+        for model in (BalanceSheet, IncomeStatement, CashFlow):
+            records = model.query.filter_by(ticker=ticker).filter(model.period.in_(QUARTERLY_PERIODS)) \
+                .order_by(model.date, model.id).all()
+            by_date.append({record.date: record for record in records})
+        dates = sorted(set(by_date[0]) & set(by_date[1]) & set(by_date[2]))
+        return [[records[quarter] for quarter in dates] for records in by_date]
+
+    def period_label(self, record, basis='annual'):
+        # Annual frames are keyed by year, quarterly and TTM frames by quarter-end month
+        return record.date[:4] if basis == 'annual' else record.date[:7]
+
+    # Rows back to the same period a year earlier: quarterly and TTM frames have a row per quarter
+    YOY_PERIODS = {'annual': 1, 'quarter': 4, 'ttm': 4}
+
+    # What the analyses' messages put in front of a period label
+    PERIOD_PREFIXES = {'annual': 'FY', 'quarter': 'Q', 'ttm': 'TTM'}
+
+    def rolling_ttm(self, frame, columns, dates, groups=None):
+        # Sum of each flow over the current and three prior quarters, computed for the whole
+        # panel at once; windows with a gap or a missing value are left empty
+        values = frame[columns].astype(float)
+        if groups is None:
+            sums = values.rolling(self.WINDOW, min_periods=self.WINDOW).sum()
+            window_start = dates.shift(self.WINDOW - 1)
+        else:
+            sums = values.groupby(groups).rolling(self.WINDOW, min_periods=self.WINDOW).sum()
+            sums = sums.reset_index(level=0, drop=True).reindex(frame.index)
+            window_start = dates.groupby(groups).shift(self.WINDOW - 1)
+
+        span = (dates - window_start).dt.days
+        contiguous = span.between(self.MIN_SPAN_DAYS, self.MAX_SPAN_DAYS)
+        return sums.where(contiguous, np.nan)
+
+    def apply_basis(self, data, basis):
+        # Turns a quarterly analysis frame into a trailing-twelve-month one
+        if basis != 'ttm' or data.empty:
+            return data
+        data = data.sort_values('calendarYear', kind='stable').reset_index(drop=True)
+        columns = [column for column in self.FLOW_COLUMNS if column in data.columns]
+        data[columns] = self.rolling_ttm(data, columns, pd.to_datetime(data['calendarYear']))
+        # The first three quarters have no full year behind them
+        return data.dropna(subset=columns, how='all').reset_index(drop=True)
+
+    def load_quarter_panel(self, tickers=None, since=None):
+        panel = None
+        for model in (IncomeStatement, CashFlow):
+            columns = {name: column for name, (source, column) in self.TTM_COLUMNS.items() if source is model}
+            query = select(
+                model.id.label('id'),
+                model.ticker.label('ticker'),
+                model.date.label('date'),
+                model.calendar_year.label('calendarYear'),
+                model.period.label('period'),
+                *[getattr(model, column).label(name) for name, column in columns.items()]
+            ).where(model.period.in_(QUARTERLY_PERIODS))
+            if tickers is not None:
+                query = query.where(model.ticker.in_(tickers))
+            if since is not None:
+                query = query.where(model.date >= since)
+            frame = pd.read_sql(query, db.session.connection())
+
+            # Keep the latest filing when a quarter appears twice
+            frame = frame.sort_values('id').drop_duplicates(['ticker', 'date'], keep='last').drop(columns='id')
+            if panel is None:
+                panel = frame
+            else:
+                panel = panel.merge(frame.drop(columns=['calendarYear', 'period']), on=['ticker', 'date'], how='outer')
+
+        for name in self.TTM_COLUMNS:
+            panel[name] = pd.to_numeric(panel[name], errors='coerce')
+        panel['quarterEnd'] = pd.to_datetime(panel['date'], errors='coerce')
+        panel = panel.dropna(subset=['quarterEnd'])
+        return panel.sort_values(['ticker', 'quarterEnd']).reset_index(drop=True)
+
+    def refresh_ttm(self, tickers=None, since=None):
+        # Incremental when since is given: only TTM rows ending on or after that quarter are
+        # recomputed, reading just the three quarters before it for the window
+        lookback = None
+        if since is not None:
+            lookback = (date.fromisoformat(since[:10]) - timedelta(days=self.MAX_SPAN_DAYS + 92)).isoformat()
+        panel = self.load_quarter_panel(tickers, lookback)
+
+        columns = list(self.TTM_COLUMNS)
+        sums = self.rolling_ttm(panel, columns, panel['quarterEnd'], groups=panel['ticker'])
+        rows = panel[['ticker', 'date', 'calendarYear', 'period']].rename(columns={'calendarYear': 'calendar_year'})
+        for name, (model, column) in self.TTM_COLUMNS.items():
+            rows[column] = sums[name]
+        rows = rows[sums.notna().any(axis=1)]
+        if since is not None:
+            rows = rows[rows['date'] >= since]
+        rows = rows.astype(object).where(rows.notna(), None)
+        records = rows.to_dict(orient='records')
+
+        # Replace the affected TTM rows in bulk
+        clear = delete(TTMFlow)
+        if tickers is not None:
+            clear = clear.where(TTMFlow.ticker.in_(tickers))
+        if since is not None:
+            clear = clear.where(TTMFlow.date >= since)
+        db.session.execute(clear)
+        if records:
+            bulk_insert(TTMFlow, records)
+        bump_data_versions(tickers if tickers is not None else panel['ticker'].unique())
+        log_changes(TTMFlow.__tablename__, [(record['ticker'], record['date'], record['period']) for record in records], 'refresh')
+        db.session.commit()
+
+        return len(records)
+
+    def get_ttm_data(self, ticker):
+        records = TTMFlow.query.filter_by(ticker=ticker).order_by(TTMFlow.date).all()
+        if not records:
+            return None
+        return [
+            {
+                "date": record.date,
+                "calendarYear": record.calendar_year,
+                "period": record.period,
+                "revenue": record.revenue,
+                "netIncome": record.net_income,
+                "operatingCashFlow": record.operating_cash_flow,
+                "capitalExpenditure": record.capital_expenditure,
+                "freeCashFlow": record.free_cash_flow
+            } for record in records
+        ]
@@ -0,0 +1,28 @@
+import argparse
+import json
+from app import create_app
+from app.batch_service import BatchAnalysisService
+from app.point_in_time_service import PointInTimeService
+
+app = create_app()
+
+if __name__ == "__main__":
+    # Score the whole universe (or the given tickers) across all cores
+    parser = argparse.ArgumentParser(description="Run red flag and positive indicator analysis in batch.")
+    parser.add_argument("tickers", nargs="*", help="Tickers to analyze (default: every stored company)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Tickers per worker task")
+    parser.add_argument("--as-of", default=None, help="Analyze the statements known on this date (YYYY-MM-DD) "
+                                                      "and print the results as JSON lines instead of storing them")
+    args = parser.parse_args()
+
+    if args.as_of:
+        # One vectorized pass over the universe, without look-ahead
+        with app.app_context():
+            for result in PointInTimeService().analyze_as_of(args.as_of, args.tickers or None):
+                print(json.dumps(result))
+    else:
+        with app.app_context():
+            service = BatchAnalysisService(workers=args.workers, chunk_size=args.chunk_size)
+            summary = service.run(args.tickers or None, on_progress=lambda progress: print(progress))
+        print(summary)
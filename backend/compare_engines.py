@@ -0,0 +1,37 @@
+import argparse
+import json
+from app import create_app
+from app.engine_harness import EngineHarness
+
+app = create_app()
+
+if __name__ == "__main__":
+    # Check that red flag engines agree on which fiscal years they flag, and how fast each is
+    parser = argparse.ArgumentParser(description="Compare red flag engines on real and generated panels.")
+    parser.add_argument("tickers", nargs="*", help="Stored tickers for the real panel (default: every stored company)")
+    parser.add_argument("--engines", default="methods,rules,rules-panel,rd", help="Comma-separated engines to compare")
+    parser.add_argument("--baseline", default="methods", help="Engine the others are diffed against")
+    parser.add_argument("--generated", type=int, default=0, help="Also run on a generated panel of this many tickers")
+    parser.add_argument("--years", type=int, default=8, help="Years per generated ticker")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated panel")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per engine; the fastest is reported")
+    parser.add_argument("--no-real", action="store_true", help="Skip the stored companies")
+    args = parser.parse_args()
+
+    harness = EngineHarness(baseline=args.baseline)
+    engines = args.engines.split(',')
+    reports = {}
+    with app.app_context():
+        if not args.no_real:
+            reports["real"] = harness.run(harness.real_panel(args.tickers or None), engines, args.repeat)
+    if args.generated:
+        panel = harness.generated_panel(args.generated, args.years, args.seed)
+        reports["generated"] = harness.run(panel, engines, args.repeat)
+
+    for name, report in reports.items():
+        print(f"{name}: {report['tickers']} tickers, {report['rows']} rows, baseline {report['baseline']}")
+        for engine, result in report["engines"].items():
+            differing = {rule_id: rule for rule_id, rule in result["rules"].items() if rule["mismatched"] or rule["errors"]}
+            print(f"  {engine}: {result['seconds']}s, {result['speedup']}x, {len(differing)} rules differ")
+            for rule_id, rule in differing.items():
+                print(f"    {rule_id}: {rule['mismatched']} mismatched, {rule['errors']} errors {json.dumps(rule['examples'])}")
@@ -642,42 +642,43 @@ def analyze_short_term_debt(data, caution_threshold=0.10, red_flag_threshold=0.1
 
 ################################################################################################## Dataframe ##################################################################################################
 
-# Sample dataset to trigger all functions (replace with actual data):
-data = pd.DataFrame({
-    'calendarYear': [2020, 2021, 2022, 2023, 2024],
+if __name__ == "__main__":
+    # Sample dataset to trigger all functions (replace with actual data):
+    data = pd.DataFrame({
+        'calendarYear': [2020, 2021, 2022, 2023, 2024],
     
-    # Balance Sheet
-    'totalCurrentAssets': [500, 550, 580, np.nan, 600],  # Current assets showing an overall increase
-    'cashAndCashEquivalents': [100, 150, 120, 130, np.nan],  # Increasing cash levels
-    'netReceivables': [200, 220, 230, 240, 250],  # Increasing receivables
-    'inventory': [150, 160, 170, 180, 190],  # Gradual increases in inventory levels
-    'goodwill': [100, 120, np.nan, 140, 160],  # Goodwill values showing potential acquisition activity
-    'intangibleAssets': [50, 60, 65, np.nan, 70],  # Increasing intangible assets reflecting investments in intellectual property
-    'totalAssets': [1000, 1100, 1200, 1250, 1300],  # Steady increase in total assets
-    'totalCurrentLiabilities': [300, 320, 340, 360, 380],  # Current liabilities increasing slightly
-    'accountPayables': [150, 160, 170, np.nan, 180],  # Increasing accounts payable
-    'shortTermDebt': [50, 55, 60, 65, 70],  # Short-term debt levels increasing gradually
-    'totalDebt': [500, 600, 900, 1200, 1500],  # Total debt increasing, which may require monitoring
-    'deferredRevenue': [30, 35, 40, 45, np.nan],  # Increasing deferred revenue reflecting future sales commitments
-    'totalStockholdersEquity': [1000, 1100, 950, 800, 700], # Decreasing equity indicating weak retained earnings
-
-    # Income Statement
-    'Revenue': [1000, 1100, 1200, 1150, 1050],  # 2023 and 2024 show declining revenue, indicating potential sales challenges
-    'Cost of Revenue': [600, 650, 700, 680, 720],  # Cost of revenue increasing, suggesting higher input costs
-    'Gross Profit': [400, 450, 500, 470, 330],  # Fluctuations in gross profit
-    'Operating Expenses': [200, 220, 250, 240, 260],  # Operating expenses increasing
-    'EBIT': [200, 230, 250, 230, 70],  # Earnings Before Interest and Taxes showing variability
-    'Interest Expense': [50, 55, 60, 65, 70],  # Increasing interest expense due to higher debt levels
-    'Net Income': [300, 500, 600, 500, 800],  # Increasing net income
-    'weightedAverageShsOut': [5000000, 5250000, 6000000, 7000000, 7000000],  # Shares outstanding increasing slightly
-
-    # Cash Flow Statement
-    'operatingCashFlow': [150, 280, 200, 350, 300],  # Cash flow from operations increasing
-    'capitalExpenditure': [70, 80, 90, 85, 100],  # Increasing capital expenditures indicating investment in growth
-    'freeCashFlow': [180, 190, 210, -205, np.nan],  # Free cash flow increasing
-    'dividendsPaid': [200, 300, 250, 400, 450]  # Increasing dividends
-})
-
-# Run the analysis
-results = analyze_red_flags(data)
-print(results)
+        # Balance Sheet
+        'totalCurrentAssets': [500, 550, 580, np.nan, 600],  # Current assets showing an overall increase
+        'cashAndCashEquivalents': [100, 150, 120, 130, np.nan],  # Increasing cash levels
+        'netReceivables': [200, 220, 230, 240, 250],  # Increasing receivables
+        'inventory': [150, 160, 170, 180, 190],  # Gradual increases in inventory levels
+        'goodwill': [100, 120, np.nan, 140, 160],  # Goodwill values showing potential acquisition activity
+        'intangibleAssets': [50, 60, 65, np.nan, 70],  # Increasing intangible assets reflecting investments in intellectual property
+        'totalAssets': [1000, 1100, 1200, 1250, 1300],  # Steady increase in total assets
+        'totalCurrentLiabilities': [300, 320, 340, 360, 380],  # Current liabilities increasing slightly
+        'accountPayables': [150, 160, 170, np.nan, 180],  # Increasing accounts payable
+        'shortTermDebt': [50, 55, 60, 65, 70],  # Short-term debt levels increasing gradually
+        'totalDebt': [500, 600, 900, 1200, 1500],  # Total debt increasing, which may require monitoring
+        'deferredRevenue': [30, 35, 40, 45, np.nan],  # Increasing deferred revenue reflecting future sales commitments
+        'totalStockholdersEquity': [1000, 1100, 950, 800, 700], # Decreasing equity indicating weak retained earnings
+
+        # Income Statement
+        'Revenue': [1000, 1100, 1200, 1150, 1050],  # 2023 and 2024 show declining revenue, indicating potential sales challenges
+        'Cost of Revenue': [600, 650, 700, 680, 720],  # Cost of revenue increasing, suggesting higher input costs
+        'Gross Profit': [400, 450, 500, 470, 330],  # Fluctuations in gross profit
+        'Operating Expenses': [200, 220, 250, 240, 260],  # Operating expenses increasing
+        'EBIT': [200, 230, 250, 230, 70],  # Earnings Before Interest and Taxes showing variability
+        'Interest Expense': [50, 55, 60, 65, 70],  # Increasing interest expense due to higher debt levels
+        'Net Income': [300, 500, 600, 500, 800],  # Increasing net income
+        'weightedAverageShsOut': [5000000, 5250000, 6000000, 7000000, 7000000],  # Shares outstanding increasing slightly
+
+        # Cash Flow Statement
+        'operatingCashFlow': [150, 280, 200, 350, 300],  # Cash flow from operations increasing
+        'capitalExpenditure': [70, 80, 90, 85, 100],  # Increasing capital expenditures indicating investment in growth
+        'freeCashFlow': [180, 190, 210, -205, np.nan],  # Free cash flow increasing
+        'dividendsPaid': [200, 300, 250, 400, 450]  # Increasing dividends
+    })
+
+    # Run the analysis
+    results = analyze_red_flags(data)
+    print(results)
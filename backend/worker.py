@@ -0,0 +1,23 @@
+import argparse
+from app import create_app
+from app.job_service import start_workers
+
+app = create_app()
+
+if __name__ == "__main__":
+    # Run queued /jobs work (ingestion, batch analysis) in background processes
+    parser = argparse.ArgumentParser(description="Run job queue workers.")
+    parser.add_argument("--processes", type=int, default=2, help="Worker processes")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between polls of an empty queue")
+    parser.add_argument("--drain", action="store_true", help="Exit once the queue is empty")
+    args = parser.parse_args()
+
+    with app.app_context():
+        workers = start_workers(args.processes, args.poll_interval, args.drain)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # Jobs left running are requeued once their heartbeat goes stale
+        for worker in workers:
+            worker.terminate()